@@ -1,12 +1,27 @@
+import hashlib
 import os
+import time
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Sequence
 
 from dotenv import load_dotenv
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 
+from app.internal.cache import TTLCache
+from app.internal.database import Database
+from app.internal.health import HealthMonitor
+from app.internal.identity import identity_cache
+from app.internal.images import ImagePipeline
+from app.internal.pagination import DEFAULT_PAGE_LIMIT, Page
+from app.internal.passwords import PasswordHasher
+from app.internal.profiling import span
+from app.internal.response_cache import ResponseCache
+from app.internal.storj import StorjClient
+from app.internal.supadb import SupabaseClient
+from app.internal.users import UserQueries
+
 load_dotenv()
 
 SECRET_KEY = os.environ.get("SECRET_KEY")
@@ -14,8 +29,20 @@ ALGORITHM = "HS256"
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", 10000))
+TOKEN_CACHE_TTL = float(os.environ.get("TOKEN_CACHE_TTL", 900.0))
+
+# Payloads of tokens that already passed verification, keyed by a digest of
+# the token and dropped when the token expires.
+verified_tokens = TTLCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+
 
 def create_jwt_token(data: dict, expires_delta: Optional[timedelta] = None):
+    with span("auth"):
+        return _create_jwt_token(data, expires_delta)
+
+
+def _create_jwt_token(data: dict, expires_delta: Optional[timedelta]):
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -27,9 +54,18 @@ def create_jwt_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 
 def decode_jwt_token(token: str):
+    with span("auth"):
+        return _decode_jwt_token(token)
+
+
+def _decode_jwt_token(token: str):
+    token_digest = hashlib.sha256(token.encode("utf-8")).digest()
+    payload = verified_tokens.get(token_digest)
+    if payload is not None:
+        return payload
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except JWTError as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -37,6 +73,65 @@ def decode_jwt_token(token: str):
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    expires_in = TOKEN_CACHE_TTL
+    if "exp" in payload:
+        expires_in = min(expires_in, payload["exp"] - time.time())
+    verified_tokens.set(token_digest, payload, expires_in)
+    return payload
+
 
 def get_current_user(token: str = Depends(oauth2_scheme)):
     return decode_jwt_token(token)
+
+
+def get_supabase_client(request: Request) -> Optional[SupabaseClient]:
+    # None with DATABASE_BACKEND=postgres.
+    return request.app.state.supabase_client
+
+
+def get_database(request: Request) -> Database:
+    return request.app.state.database
+
+
+def get_storj_client(request: Request) -> StorjClient:
+    return request.app.state.storj_client
+
+
+def get_image_pipeline(request: Request) -> ImagePipeline:
+    return request.app.state.image_pipeline
+
+
+def get_response_cache(request: Request) -> ResponseCache:
+    return request.app.state.response_cache
+
+
+def get_password_hasher(request: Request) -> PasswordHasher:
+    return request.app.state.password_hasher
+
+
+def get_health_monitor(request: Request) -> HealthMonitor:
+    return request.app.state.health_monitor
+
+
+async def get_current_identity(
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_database),
+) -> dict:
+    identity = await identity_cache.resolve(current_user, UserQueries(db))
+    if identity is None:
+        raise HTTPException(status_code=400, detail="Error fetching user by email")
+    return identity
+
+
+def get_page(columns: Sequence[str], keys: Sequence[str]):
+    def page_params(
+        limit: int = DEFAULT_PAGE_LIMIT,
+        after: Optional[str] = None,
+        fields: Optional[str] = None,
+    ) -> Page:
+        try:
+            return Page(columns, keys, limit, after, fields)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    return page_params
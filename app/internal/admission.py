@@ -0,0 +1,179 @@
+import asyncio
+import os
+import re
+from collections import deque
+from typing import Deque, Dict, List, Optional, Pattern, Tuple
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", 2.0))
+ADMISSION_RETRY_AFTER = int(os.environ.get("ADMISSION_RETRY_AFTER", 1))
+
+# group -> (default concurrency, default queue size); both can be overridden
+# with ADMISSION_<GROUP>_CONCURRENCY and ADMISSION_<GROUP>_QUEUE.
+ROUTE_GROUP_LIMITS = {
+    "auth": (32, 64),
+    "trips": (64, 128),
+    "bookings": (64, 128),
+    "uploads": (8, 16),
+}
+
+# First match wins; paths that match no pattern are not limited.
+ROUTE_GROUPS: List[Tuple[Pattern, str]] = [
+    (re.compile(r"^/api/v1/(signup|token|refresh-token)$"), "auth"),
+    (re.compile(r"^/api/v1/protected/(upload-profile|profile-image)$"), "uploads"),
+    (re.compile(r"^/api/v1/protected/trips(/|$)"), "trips"),
+    (
+        re.compile(
+            r"^/api/v1/protected/[^/]+/(itinerary|hotel-bookings|flight-bookings)"
+        ),
+        "bookings",
+    ),
+]
+
+
+class Overloaded(Exception):
+    pass
+
+
+class ConcurrencyLimiter:
+    """Admits ``concurrency`` requests at once and queues ``queue_size`` more.
+
+    Queued requests are admitted first in, first out, and give up after
+    ``queue_timeout`` seconds. A request that finds the queue full, or that
+    times out in it, raises Overloaded.
+    """
+
+    def __init__(self, concurrency: int, queue_size: int, queue_timeout: float):
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.counters = {"admitted": 0, "rejected": 0, "timed_out": 0}
+
+    async def acquire(self):
+        if self.in_flight < self.concurrency and not self._waiters:
+            self.in_flight += 1
+            self.counters["admitted"] += 1
+            return
+
+        if len(self._waiters) >= self.queue_size:
+            self.counters["rejected"] += 1
+            raise Overloaded()
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.counters["timed_out"] += 1
+            raise Overloaded()
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the client went away.
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        self.counters["admitted"] += 1
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # Hand the slot straight to the next request in the queue.
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            **self.counters,
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+        }
+
+
+class AdmissionController:
+    """One ConcurrencyLimiter per route group."""
+
+    def __init__(self, queue_timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        self.limiters = {}
+        for group, (concurrency, queue_size) in ROUTE_GROUP_LIMITS.items():
+            prefix = f"ADMISSION_{group.upper()}"
+            self.limiters[group] = ConcurrencyLimiter(
+                int(os.environ.get(f"{prefix}_CONCURRENCY", concurrency)),
+                int(os.environ.get(f"{prefix}_QUEUE", queue_size)),
+                queue_timeout,
+            )
+
+    def limiter_for(self, path: str) -> Optional[ConcurrencyLimiter]:
+        for pattern, group in ROUTE_GROUPS:
+            if pattern.match(path):
+                return self.limiters[group]
+        return None
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {group: limiter.stats() for group, limiter in self.limiters.items()}
+
+
+class AdmissionMiddleware:
+    """Sheds load with 503 + Retry-After once a route group is saturated.
+
+    A request holds its group's slot until its response, streamed bodies
+    included, has been sent. Background tasks that run afterwards do not
+    hold it.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        controller: AdmissionController,
+        retry_after: int = ADMISSION_RETRY_AFTER,
+    ):
+        self.app = app
+        self.controller = controller
+        self.retry_after = retry_after
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        limiter = None
+        if scope["type"] == "http" and scope["method"] != "OPTIONS":
+            limiter = self.controller.limiter_for(scope["path"])
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await limiter.acquire()
+        except Overloaded:
+            response = JSONResponse(
+                {"detail": "Server is overloaded, try again later"},
+                status_code=503,
+                headers={"Retry-After": str(self.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                limiter.release()
+
+        async def send_wrapper(message: Message):
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get(
+                "more_body", False
+            ):
+                release()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The response was never completed (an error or a disconnect).
+            release()
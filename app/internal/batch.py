@@ -0,0 +1,68 @@
+import os
+from typing import Any, Callable, Dict, List, Sequence, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+
+from app.internal.database import Database
+
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", 500))
+
+
+class BatchError(BaseModel):
+    index: int
+    detail: str
+
+
+class BatchResult(BaseModel):
+    errors: List[BatchError]
+    message: str
+
+
+class BatchTooLarge(Exception):
+    def __init__(self, max_items: int):
+        super().__init__(f"Batch has more than {max_items} items")
+        self.max_items = max_items
+
+
+def build_rows(
+    items: Any,
+    model: Type[BaseModel],
+    to_row: Callable[[BaseModel], dict],
+    max_items: int = BATCH_MAX_ITEMS,
+) -> Tuple[List[int], List[dict], List[dict]]:
+    """Validates every item of a batch in one pass.
+
+    Returns the input positions of the valid items, their rows ready for
+    insertion, and one ``{"index", "detail"}`` error per invalid item.
+    """
+    if not isinstance(items, list):
+        raise ValueError("Batch body must be a JSON array")
+    if len(items) > max_items:
+        raise BatchTooLarge(max_items)
+
+    positions, rows, errors = [], [], []
+    for index, item in enumerate(items):
+        try:
+            rows.append(to_row(model.model_validate(item)))
+            positions.append(index)
+        except (ValidationError, ValueError) as e:
+            errors.append({"index": index, "detail": str(e)})
+    return positions, rows, errors
+
+
+async def insert_rows(db: Database, table: str, rows: Sequence[dict]) -> List[dict]:
+    """Inserts ``rows`` with one multi-row statement.
+
+    The inserted rows are returned in input order. A single statement is a
+    single transaction, so a batch is either stored whole or not at all and
+    a client can safely retry one that failed.
+    """
+    return await db.insert(table, rows)
+
+
+def batch_ids(
+    size: int, positions: Sequence[int], inserted: Sequence[dict]
+) -> List[Any]:
+    """Lays the inserted ids out by input position, None for rejected items."""
+    ids: Dict[int, Any] = {index: row["id"] for index, row in zip(positions, inserted)}
+    return [ids.get(index) for index in range(size)]
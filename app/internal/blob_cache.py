@@ -0,0 +1,190 @@
+import hashlib
+import itertools
+import mmap
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple, Union
+
+from starlette.concurrency import run_in_threadpool
+
+BLOB_CACHE_MEMORY_BYTES = int(os.environ.get("BLOB_CACHE_MEMORY_BYTES", 64 * 1024**2))
+BLOB_CACHE_DISK_BYTES = int(os.environ.get("BLOB_CACHE_DISK_BYTES", 1024**3))
+BLOB_CACHE_DIR = os.environ.get(
+    "BLOB_CACHE_DIR", os.path.join(tempfile.gettempdir(), "travel-planning-blobs")
+)
+
+Blob = Union[bytes, mmap.mmap]
+
+
+def _map_file(path: str) -> Optional[mmap.mmap]:
+    try:
+        with open(path, "rb") as file:
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_file(path: str, data: bytes) -> bool:
+    try:
+        with open(path, "wb") as file:
+            file.write(data)
+        return True
+    except OSError as e:
+        print(f"Error writing blob cache file: {e}")
+        return False
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class BlobCache:
+    """Read-through byte cache with a memory tier and a disk tier.
+
+    The memory tier is an LRU bounded by ``memory_bytes``. Entries it evicts
+    spill to files in ``directory``, an LRU bounded by ``disk_bytes``, and
+    disk hits are returned memory-mapped instead of being read into memory.
+    Each process keeps its own subdirectory, so workers never evict each
+    other's files.
+
+    Memory hits are answered on the event loop; files are written, opened
+    and mapped on the thread pool. Every write goes to a new file, so an
+    entry that is invalidated while it is being written or read never
+    clobbers or serves the file of a newer one.
+    """
+
+    def __init__(
+        self,
+        memory_bytes: int = BLOB_CACHE_MEMORY_BYTES,
+        disk_bytes: int = BLOB_CACHE_DISK_BYTES,
+        directory: str = BLOB_CACHE_DIR,
+    ):
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.directory = os.path.join(directory, str(os.getpid()))
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_used = 0
+        # key -> (file, size)
+        self._disk: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self._disk_used = 0
+        # key -> the file it is being written to.
+        self._spilling: Dict[str, str] = {}
+        self._files = itertools.count()
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+
+    def _new_path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.directory, f"{digest}.{next(self._files)}")
+
+    async def get(self, key: str) -> Optional[Blob]:
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            self.counters["memory_hits"] += 1
+            return data
+
+        entry = self._disk.get(key)
+        if entry is not None:
+            blob = await run_in_threadpool(_map_file, entry[0])
+            if self._disk.get(key) is entry:
+                if blob is not None:
+                    self._disk.move_to_end(key)
+                    self.counters["disk_hits"] += 1
+                    return blob
+                self._drop_from_disk(key)
+            elif blob is not None:
+                # Invalidated while it was being mapped.
+                blob.close()
+
+        self.counters["misses"] += 1
+        return None
+
+    async def set(self, key: str, data: bytes):
+        self.invalidate(key)
+        if len(data) > self.memory_bytes:
+            await self._spill(key, data)
+            return
+
+        self._memory[key] = data
+        self._memory_used += len(data)
+        evicted = []
+        while self._memory_used > self.memory_bytes:
+            evicted_key, evicted_data = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted_data)
+            self.counters["memory_evictions"] += 1
+            evicted.append((evicted_key, evicted_data))
+        for evicted_key, evicted_data in evicted:
+            await self._spill(evicted_key, evicted_data)
+
+    async def _spill(self, key: str, data: bytes):
+        if len(data) > self.disk_bytes:
+            return
+
+        path = self._new_path(key)
+        self._spilling[key] = path
+        written = await run_in_threadpool(_write_file, path, data)
+        if self._spilling.get(key) != path:
+            # Invalidated, or set again, while it was being written.
+            if written:
+                await run_in_threadpool(_remove_file, path)
+            return
+        del self._spilling[key]
+        if not written:
+            return
+
+        self._disk[key] = (path, len(data))
+        self._disk_used += len(data)
+        while self._disk_used > self.disk_bytes:
+            evicted_key = next(iter(self._disk))
+            self._drop_from_disk(evicted_key)
+            self.counters["disk_evictions"] += 1
+
+    def _drop_from_disk(self, key: str):
+        entry = self._disk.pop(key, None)
+        if entry is not None:
+            path, size = entry
+            self._disk_used -= size
+            _remove_file(path)
+
+    def invalidate(self, key: str):
+        data = self._memory.pop(key, None)
+        if data is not None:
+            self._memory_used -= len(data)
+        self._drop_from_disk(key)
+        self._spilling.pop(key, None)
+
+    def invalidate_prefix(self, prefix: str):
+        for key in [
+            key
+            for key in (*self._memory, *self._disk, *self._spilling)
+            if key.startswith(prefix)
+        ]:
+            self.invalidate(key)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            **self.counters,
+            "memory_bytes": self._memory_used,
+            "disk_bytes": self._disk_used,
+            "entries": len(self._memory) + len(self._disk),
+        }
+
+    def close(self):
+        self._memory.clear()
+        self._disk.clear()
+        self._spilling.clear()
+        self._memory_used = self._disk_used = 0
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,57 @@
+import os
+from typing import Any, Dict, List, Optional, Protocol, Sequence
+
+from app.internal.blob_cache import BlobCache
+from app.internal.pagination import Page
+from app.internal.postgres import PostgresClient
+from app.internal.supadb import SupabaseClient
+
+# "postgrest" goes through Supabase's PostgREST API; "postgres" connects to
+# the database itself, at DATABASE_URL.
+DATABASE_BACKEND = os.environ.get("DATABASE_BACKEND", "postgrest")
+
+
+class Database(Protocol):
+    """What the *Queries classes need from a storage backend."""
+
+    health_error: Optional[str]
+
+    async def insert_row(self, table: str, row: dict) -> dict:
+        ...
+
+    async def insert(self, table: str, rows: Sequence[dict]) -> List[dict]:
+        ...
+
+    async def select(
+        self,
+        table: str,
+        columns: Sequence[str],
+        filters: Dict[str, Any],
+        page: Optional[Page] = None,
+        limit: Optional[int] = None,
+    ) -> List[dict]:
+        ...
+
+    async def update(
+        self, table: str, values: dict, filters: Dict[str, Any]
+    ) -> List[dict]:
+        ...
+
+    async def check_health(self) -> bool:
+        ...
+
+    def pool_stats(self) -> dict:
+        ...
+
+    async def aclose(self):
+        ...
+
+
+def create_database(
+    backend: str = DATABASE_BACKEND, blob_cache: Optional[BlobCache] = None
+) -> Database:
+    if backend == "postgrest":
+        return SupabaseClient(blob_cache=blob_cache)
+    if backend == "postgres":
+        return PostgresClient()
+    raise ValueError(f"Unknown DATABASE_BACKEND: {backend}")
@@ -1,8 +1,22 @@
 from datetime import datetime
+from typing import List, Optional
 
 from pydantic import BaseModel
 
-from app.internal.supadb import SupabaseClient
+from app.internal.batch import insert_rows
+from app.internal.database import Database
+from app.internal.pagination import Page
+from app.internal.resilience import BackendUnavailable
+
+FLIGHT_BOOKING_COLUMNS = (
+    "id",
+    "trip_id",
+    "airline",
+    "flight_number",
+    "departure_date",
+    "arrival_date",
+)
+FLIGHT_BOOKING_PAGE_KEYS = ("departure_date", "id")
 
 
 class FlightBookings(BaseModel):
@@ -12,40 +26,61 @@ class FlightBookings(BaseModel):
     arrival_date: str
 
 
+def flight_booking_row(fb: FlightBookings, trip_id: int) -> dict:
+    return {
+        "trip_id": trip_id,
+        "airline": fb.airline,
+        "flight_number": fb.flight_number,
+        "departure_date": fb.departure_date,
+        "arrival_date": fb.arrival_date,
+    }
+
+
+class FlightBookingRow(BaseModel):
+    """A ``flight_bookings`` row; a ``fields`` projection leaves the rest None."""
+
+    id: Optional[int] = None
+    trip_id: Optional[int] = None
+    airline: Optional[str] = None
+    flight_number: Optional[str] = None
+    departure_date: Optional[str] = None
+    arrival_date: Optional[str] = None
+
+
 class FlightBookingQueries:
-    def __init__(self, supabase_client: SupabaseClient):
-        self.supabase_client = supabase_client
+    def __init__(self, db: Database):
+        self.db = db
 
-    def create_trip_flight_booking(self, fb: FlightBookings, trip_id: int) -> dict:
+    async def create_trip_flight_booking(
+        self, fb: FlightBookings, trip_id: int
+    ) -> dict:
         try:
-            data, count = (
-                self.supabase_client.client.table("flight_bookings")
-                .insert(
-                    [
-                        {
-                            "trip_id": trip_id,
-                            "airline": fb.airline,
-                            "flight_number": fb.flight_number,
-                            "departure_date": fb.departure_date,
-                            "arrival_date": fb.arrival_date,
-                        }
-                    ]
-                )
-                .execute()
+            row = await self.db.insert_row(
+                "flight_bookings", flight_booking_row(fb, trip_id)
             )
+            return {"data": row, "error": None}
+        except BackendUnavailable:
+            raise
+        except Exception as e:
+            return {"data": None, "error": str(e)}
 
-            return {"data": data, "error": None}
+    async def create_trip_flight_bookings(self, rows: List[dict]) -> dict:
+        try:
+            inserted = await insert_rows(self.db, "flight_bookings", rows)
+            return {"data": inserted, "error": None}
+        except BackendUnavailable:
+            raise
         except Exception as e:
             return {"data": None, "error": str(e)}
 
-    def get_trip_flight_bookings(self, trip_id: int):
+    async def get_trip_flight_bookings(self, trip_id: int, page: Optional[Page] = None):
+        page = page or Page(FLIGHT_BOOKING_COLUMNS, FLIGHT_BOOKING_PAGE_KEYS)
         try:
-            response = (
-                self.supabase_client.client.table("flight_bookings")
-                .select("*")
-                .eq("trip_id", trip_id)
-                .execute()
+            rows = await self.db.select(
+                "flight_bookings", page.columns, {"trip_id": trip_id}, page=page
             )
-            return {"data": response, "error": None}
+            return {"data": page.result(rows), "error": None}
+        except BackendUnavailable:
+            raise
         except Exception as e:
             return {"data": None, "error": e}
@@ -0,0 +1,89 @@
+import asyncio
+import os
+import time
+from typing import Optional
+
+# Connections opened on the database pool before a worker takes traffic.
+WARMUP_CONNECTIONS = int(os.environ.get("WARMUP_CONNECTIONS", 4))
+WARMUP_TIMEOUT = float(os.environ.get("WARMUP_TIMEOUT", 10.0))
+# How long a readiness result is reused, so probes do not hit the backends
+# on every call.
+HEALTH_CHECK_TTL = float(os.environ.get("HEALTH_CHECK_TTL", 5.0))
+
+
+async def warm_up(
+    state,
+    connections: int = WARMUP_CONNECTIONS,
+    timeout: float = WARMUP_TIMEOUT,
+):
+    """Opens backend connections so the first requests do not pay for them.
+
+    Runs ``connections`` database checks at once, which fills that many
+    pooled connections, and one storage check. Failures are logged and do
+    not stop the worker from starting; readiness reports them instead.
+    """
+    checks = [state.database.check_health() for _ in range(max(1, connections))]
+    checks.append(state.storj_client.check_health())
+    try:
+        results = await asyncio.wait_for(asyncio.gather(*checks), timeout)
+    except asyncio.TimeoutError:
+        print(f"Warm-up did not finish within {timeout}s")
+        return
+    if not all(results[:-1]):
+        print("Warm-up could not reach the database")
+    if not results[-1]:
+        print("Warm-up could not reach storage")
+
+
+class HealthMonitor:
+    """Checks the backends for the readiness endpoint.
+
+    The database is required: a worker whose database checks fail, or whose
+    breaker is open, is not ready. Storage is reported but only degrades
+    the profile image endpoints, so it does not take the worker out of
+    rotation. Results are cached for ``ttl`` seconds and concurrent probes
+    share one round of checks.
+    """
+
+    def __init__(self, state, ttl: float = HEALTH_CHECK_TTL):
+        self.state = state
+        self.ttl = ttl
+        self._report: Optional[dict] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _fresh(self) -> bool:
+        return (
+            self._report is not None and time.monotonic() - self._checked_at < self.ttl
+        )
+
+    async def report(self) -> dict:
+        if self._fresh():
+            return self._report
+        async with self._lock:
+            if not self._fresh():
+                self._report = await self._check()
+                self._checked_at = time.monotonic()
+        return self._report
+
+    async def _check(self) -> dict:
+        database, storj_client = self.state.database, self.state.storj_client
+        database_ok, storage_ok = await asyncio.gather(
+            database.check_health(), storj_client.check_health()
+        )
+        return {
+            "ready": database_ok,
+            "checks": {
+                "database": {
+                    "healthy": database_ok,
+                    "error": database.health_error,
+                    "breaker": database.breaker.state,
+                    "pool": database.pool_stats(),
+                },
+                "storage": {
+                    "healthy": storage_ok,
+                    "error": storj_client.health_error,
+                    "breaker": storj_client.breaker.state,
+                },
+            },
+        }
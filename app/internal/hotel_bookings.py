@@ -1,8 +1,21 @@
 from datetime import datetime
+from typing import List, Optional
 
 from pydantic import BaseModel
 
-from app.internal.supadb import SupabaseClient
+from app.internal.batch import insert_rows
+from app.internal.database import Database
+from app.internal.pagination import Page
+from app.internal.resilience import BackendUnavailable
+
+HOTEL_BOOKING_COLUMNS = (
+    "id",
+    "trip_id",
+    "hotel_name",
+    "check_in_date",
+    "check_out_date",
+)
+HOTEL_BOOKING_PAGE_KEYS = ("check_in_date", "id")
 
 
 class HotelBookings(BaseModel):
@@ -11,39 +24,57 @@ class HotelBookings(BaseModel):
     check_out_date: str
 
 
+def hotel_booking_row(hb: HotelBookings, trip_id: int) -> dict:
+    return {
+        "trip_id": trip_id,
+        "hotel_name": hb.hotel_name,
+        "check_in_date": hb.check_in_date,
+        "check_out_date": hb.check_out_date,
+    }
+
+
+class HotelBookingRow(BaseModel):
+    """A ``hotel_bookings`` row; a ``fields`` projection leaves the rest None."""
+
+    id: Optional[int] = None
+    trip_id: Optional[int] = None
+    hotel_name: Optional[str] = None
+    check_in_date: Optional[str] = None
+    check_out_date: Optional[str] = None
+
+
 class HotelBookingQueries:
-    def __init__(self, supabase_client: SupabaseClient):
-        self.supabase_client = supabase_client
+    def __init__(self, db: Database):
+        self.db = db
 
-    def create_trip_hotel_booking(self, hb: HotelBookings, trip_id: int) -> dict:
+    async def create_trip_hotel_booking(self, hb: HotelBookings, trip_id: int) -> dict:
         try:
-            data, count = (
-                self.supabase_client.client.table("hotel_bookings")
-                .insert(
-                    [
-                        {
-                            "trip_id": trip_id,
-                            "hotel_name": hb.hotel_name,
-                            "check_in_date": hb.check_in_date,
-                            "check_out_date": hb.check_out_date,
-                        }
-                    ]
-                )
-                .execute()
+            row = await self.db.insert_row(
+                "hotel_bookings", hotel_booking_row(hb, trip_id)
             )
+            return {"data": row, "error": None}
+        except BackendUnavailable:
+            raise
+        except Exception as e:
+            return {"data": None, "error": str(e)}
 
-            return {"data": data, "error": None}
+    async def create_trip_hotel_bookings(self, rows: List[dict]) -> dict:
+        try:
+            inserted = await insert_rows(self.db, "hotel_bookings", rows)
+            return {"data": inserted, "error": None}
+        except BackendUnavailable:
+            raise
         except Exception as e:
             return {"data": None, "error": str(e)}
 
-    def get_trip_hotel_bookings(self, trip_id: int):
+    async def get_trip_hotel_bookings(self, trip_id: int, page: Optional[Page] = None):
+        page = page or Page(HOTEL_BOOKING_COLUMNS, HOTEL_BOOKING_PAGE_KEYS)
         try:
-            response = (
-                self.supabase_client.client.table("hotel_bookings")
-                .select("*")
-                .eq("trip_id", trip_id)
-                .execute()
+            rows = await self.db.select(
+                "hotel_bookings", page.columns, {"trip_id": trip_id}, page=page
             )
-            return {"data": response, "error": None}
+            return {"data": page.result(rows), "error": None}
+        except BackendUnavailable:
+            raise
         except Exception as e:
             return {"data": None, "error": e}
@@ -0,0 +1,39 @@
+import hashlib
+from typing import Any, Optional
+
+import orjson
+from fastapi import Request, Response
+
+from app.internal.profiling import TimedORJSONResponse
+
+
+def _opaque_tag(etag: str) -> str:
+    etag = etag.strip()
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of ``etag`` against an ``If-None-Match`` header."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    return any(
+        _opaque_tag(candidate) == _opaque_tag(etag)
+        for candidate in if_none_match.split(",")
+    )
+
+
+def collection_etag(data: Any) -> str:
+    """A strong validator for a JSON payload: a hash of its canonical form."""
+    raw = orjson.dumps(data, option=orjson.OPT_SORT_KEYS, default=str)
+    return f'"{hashlib.sha256(raw).hexdigest()[:32]}"'
+
+
+def conditional_response(request: Request, data: Any, etag: str) -> Response:
+    """Answers 304 when the client already holds ``etag``, else sends ``data``."""
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return TimedORJSONResponse(content=data, headers=headers)
@@ -0,0 +1,48 @@
+import os
+from typing import Optional
+
+from app.internal.cache import TTLCache
+from app.internal.users import UserQueries
+
+IDENTITY_CACHE_SIZE = int(os.environ.get("IDENTITY_CACHE_SIZE", 10000))
+IDENTITY_CACHE_TTL = float(os.environ.get("IDENTITY_CACHE_TTL", 300.0))
+
+
+class IdentityCache:
+    """Resolves a token subject (the user's email) to ``{id, username}``.
+
+    Resolution tries the cache, then the ``user_id``/``username`` claims that
+    tokens issued by this service carry, and only then the ``users`` table.
+    """
+
+    def __init__(
+        self, maxsize: int = IDENTITY_CACHE_SIZE, ttl: float = IDENTITY_CACHE_TTL
+    ):
+        self._cache = TTLCache(maxsize, ttl)
+
+    def remember(self, subject: str, user_id: int, username: str) -> dict:
+        identity = {"id": user_id, "username": username}
+        self._cache.set(subject, identity)
+        return identity
+
+    def invalidate(self, subject: str):
+        self._cache.pop(subject)
+
+    async def resolve(self, claims: dict, user_queries: UserQueries) -> Optional[dict]:
+        subject = claims.get("sub")
+        identity = self._cache.get(subject)
+        if identity is not None:
+            return identity
+
+        if "user_id" in claims and "username" in claims:
+            return self.remember(subject, claims["user_id"], claims["username"])
+
+        result = await user_queries.get_identity(subject)
+        if result["error"] or not result["data"]:
+            return None
+
+        row = result["data"][0]
+        return self.remember(subject, row["id"], row["username"])
+
+
+identity_cache = IdentityCache()
@@ -0,0 +1,103 @@
+import asyncio
+import io
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Sequence
+
+from fastapi import UploadFile
+from PIL import Image, ImageOps
+from starlette.concurrency import run_in_threadpool
+
+IMAGE_SIZES = tuple(
+    int(size) for size in os.environ.get("PROFILE_IMAGE_SIZES", "64,256").split(",")
+)
+IMAGE_QUALITY = int(os.environ.get("PROFILE_IMAGE_QUALITY", 80))
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", 2))
+IMAGE_QUEUE_SIZE = int(os.environ.get("IMAGE_QUEUE_SIZE", 16))
+SPOOL_CHUNK_SIZE = 64 * 1024
+
+DERIVATIVE_FORMAT = "webp"
+ORIGINAL = "original"
+# Names callers can ask for: each thumbnail size plus the full-size re-encode.
+DERIVATIVE_NAMES = (*(str(size) for size in IMAGE_SIZES), ORIGINAL)
+
+
+def _encode(image: Image.Image, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=DERIVATIVE_FORMAT, quality=quality, method=4)
+    return buffer.getvalue()
+
+
+def render_derivatives(
+    path: str, sizes: Sequence[int] = IMAGE_SIZES, quality: int = IMAGE_QUALITY
+) -> Dict[str, bytes]:
+    """Decodes the image at ``path`` once and encodes every derivative as WebP.
+
+    Runs in a worker process, so it must stay a picklable module-level
+    function.
+    """
+    with Image.open(path) as opened:
+        image = ImageOps.exif_transpose(opened)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+
+        derivatives = {ORIGINAL: _encode(image, quality)}
+        for size in sizes:
+            thumbnail = image.copy()
+            thumbnail.thumbnail((size, size))
+            derivatives[str(size)] = _encode(thumbnail, quality)
+        return derivatives
+
+
+class ImagePipeline:
+    """Renders image derivatives on a bounded process pool.
+
+    At most ``queue_size`` images are rendering or waiting at once; beyond
+    that new work is dropped rather than queued, and callers keep serving the
+    original image.
+    """
+
+    def __init__(
+        self, workers: int = IMAGE_WORKERS, queue_size: int = IMAGE_QUEUE_SIZE
+    ):
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+        self._slots = asyncio.Semaphore(queue_size)
+
+    def busy(self) -> bool:
+        return self._slots.locked()
+
+    async def render(self, path: str) -> Optional[Dict[str, bytes]]:
+        if self.busy():
+            return None
+
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, render_derivatives, path)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+async def spool_upload(file: UploadFile, chunk_size: int = SPOOL_CHUNK_SIZE) -> str:
+    """Copies ``file`` to a named temporary file one chunk at a time.
+
+    The worker processes read the image from the returned path; the caller
+    deletes it once they are done.
+    """
+    await file.seek(0)
+    spooled = await run_in_threadpool(
+        tempfile.NamedTemporaryFile, prefix="profile-", delete=False
+    )
+    try:
+        while True:
+            chunk = await file.read(chunk_size)
+            if not chunk:
+                break
+            await run_in_threadpool(spooled.write, chunk)
+    except BaseException:
+        spooled.close()
+        os.unlink(spooled.name)
+        raise
+    spooled.close()
+    return spooled.name
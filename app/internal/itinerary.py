@@ -1,8 +1,15 @@
 from datetime import datetime
+from typing import List, Optional
 
 from pydantic import BaseModel
 
-from app.internal.supadb import SupabaseClient
+from app.internal.batch import insert_rows
+from app.internal.database import Database
+from app.internal.pagination import Page
+from app.internal.resilience import BackendUnavailable
+
+ITINERARY_COLUMNS = ("id", "trip_id", "date", "description", "location", "activity")
+ITINERARY_PAGE_KEYS = ("date", "id")
 
 
 class Itinerary(BaseModel):
@@ -12,42 +19,60 @@ class Itinerary(BaseModel):
     activity: str
 
 
+def itinerary_row(itinerary: Itinerary, trip_id: int) -> dict:
+    date = datetime.strptime(itinerary.date, "%Y-%m-%d").date()
+    return {
+        "trip_id": trip_id,
+        "date": date.isoformat(),
+        "description": itinerary.description,
+        "location": itinerary.location,
+        "activity": itinerary.activity,
+    }
+
+
+class ItineraryRow(BaseModel):
+    """An ``itinerary`` row; a ``fields`` projection leaves the rest None."""
+
+    id: Optional[int] = None
+    trip_id: Optional[int] = None
+    date: Optional[str] = None
+    description: Optional[str] = None
+    location: Optional[str] = None
+    activity: Optional[str] = None
+
+
 class ItineraryQueries:
-    def __init__(self, supabase_client: SupabaseClient):
-        self.supabase_client = supabase_client
+    def __init__(self, db: Database):
+        self.db = db
 
-    def create_itinerary(self, itinerary: Itinerary, trip_id: int) -> dict:
+    async def create_itinerary(self, itinerary: Itinerary, trip_id: int) -> dict:
         try:
-            date = datetime.strptime(itinerary.date, "%Y-%m-%d").date()
-
-            data, count = (
-                self.supabase_client.client.table("itinerary")
-                .insert(
-                    [
-                        {
-                            "trip_id": trip_id,
-                            "date": date.isoformat(),
-                            "description": itinerary.description,
-                            "location": itinerary.location,
-                            "activity": itinerary.activity,
-                        }
-                    ]
-                )
-                .execute()
+            row = await self.db.insert_row(
+                "itinerary", itinerary_row(itinerary, trip_id)
             )
+            return {"data": row, "error": None}
+        except BackendUnavailable:
+            raise
+        except Exception as e:
+            return {"data": None, "error": str(e)}
 
-            return {"data": data, "error": None}
+    async def create_itineraries(self, rows: List[dict]) -> dict:
+        try:
+            inserted = await insert_rows(self.db, "itinerary", rows)
+            return {"data": inserted, "error": None}
+        except BackendUnavailable:
+            raise
         except Exception as e:
             return {"data": None, "error": str(e)}
 
-    def get_trip_itineraries(self, trip_id: int):
+    async def get_trip_itineraries(self, trip_id: int, page: Optional[Page] = None):
+        page = page or Page(ITINERARY_COLUMNS, ITINERARY_PAGE_KEYS)
         try:
-            response = (
-                self.supabase_client.client.table("itinerary")
-                .select("*")
-                .eq("trip_id", trip_id)
-                .execute()
+            rows = await self.db.select(
+                "itinerary", page.columns, {"trip_id": trip_id}, page=page
             )
-            return {"data": response, "error": None}
+            return {"data": page.result(rows), "error": None}
+        except BackendUnavailable:
+            raise
         except Exception as e:
             return {"data": None, "error": e}
@@ -0,0 +1,275 @@
+import os
+import time
+from typing import Iterator, List
+
+from prometheus_client import (REGISTRY, CollectorRegistry, Counter, Gauge,
+                               Histogram, generate_latest, multiprocess)
+from prometheus_client.core import (CounterMetricFamily, GaugeMetricFamily,
+                                    Metric)
+from prometheus_client.registry import Collector
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.internal.profiling import BACKEND_SPANS, add_span
+
+# Requests are labelled with the route template, not the raw path, so that
+# ids in the path do not create a series per trip.
+UNMATCHED_ROUTE = "<unmatched>"
+# Set by app.serve when it runs several workers; each worker then writes its
+# metrics to files here and /metrics adds them all up.
+PROMETHEUS_MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request until its response was sent.",
+    ["method", "route", "status"],
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Requests currently being handled.",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+BACKEND_CALL_LATENCY = Histogram(
+    "backend_call_duration_seconds",
+    "Time spent in calls to PostgREST and Storj, retries included.",
+    ["backend", "target", "operation"],
+)
+BACKEND_CALL_ERRORS = Counter(
+    "backend_call_errors_total",
+    "Backend calls that raised, by exception type.",
+    ["backend", "target", "operation", "error"],
+)
+STORAGE_BYTES = Counter(
+    "storage_transferred_bytes_total",
+    "Object bytes sent to or read from the storage backend.",
+    ["backend", "direction"],
+)
+STORAGE_TRANSFER_LATENCY = Histogram(
+    "storage_transfer_duration_seconds",
+    "Time taken by whole object uploads and downloads.",
+    ["backend", "direction"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+
+
+class BackendTimer:
+    """Times one backend call and counts it as an error if it raises.
+
+    The time is also added to the request's db or storage Server-Timing span.
+
+    Used as ``with BackendTimer("supabase", table, "select"): ...``.
+    """
+
+    __slots__ = ("labels", "start")
+
+    def __init__(self, backend: str, target: str, operation: str):
+        self.labels = (backend, target, operation)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        BACKEND_CALL_LATENCY.labels(*self.labels).observe(elapsed)
+        add_span(BACKEND_SPANS.get(self.labels[0], self.labels[0]), elapsed)
+        if exc_type is not None:
+            BACKEND_CALL_ERRORS.labels(*self.labels, exc_type.__name__).inc()
+        return False
+
+
+def record_transfer(backend: str, direction: str, size: int, elapsed: float):
+    STORAGE_BYTES.labels(backend, direction).inc(size)
+    STORAGE_TRANSFER_LATENCY.labels(backend, direction).observe(elapsed)
+
+
+class MetricsMiddleware:
+    """Records latency, status and in-flight count of every HTTP request.
+
+    A request counts as finished once the last chunk of its body has been
+    sent, so streamed downloads are measured in full and background tasks
+    that run afterwards are not.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = "500"
+        start = time.perf_counter()
+        in_flight = REQUESTS_IN_FLIGHT.labels(method)
+        finished = False
+
+        def finish():
+            nonlocal finished
+            if finished:
+                return
+            finished = True
+            in_flight.dec()
+            # The router stores the matched route in the scope it was given.
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                method, getattr(route, "path", UNMATCHED_ROUTE), status
+            ).observe(time.perf_counter() - start)
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get(
+                "more_body", False
+            ):
+                finish()
+
+        in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The response was never completed (an error or a disconnect).
+            finish()
+
+
+class AppStateCollector(Collector):
+    """Reads the counters kept by the caches, limiters and breakers.
+
+    They are only read when /metrics is scraped, so keeping them costs
+    nothing on the request path.
+    """
+
+    def __init__(self, state):
+        self.state = state
+
+    def collect(self) -> Iterator[Metric]:
+        yield from self._blob_cache()
+        yield from self._admission()
+        yield from self._breakers()
+
+    def _blob_cache(self) -> Iterator[Metric]:
+        blob_cache = getattr(self.state, "blob_cache", None)
+        if blob_cache is None:
+            return
+        stats = blob_cache.stats()
+
+        lookups = CounterMetricFamily(
+            "blob_cache_lookups", "Blob cache lookups by result.", labels=["result"]
+        )
+        for result in ("memory_hits", "disk_hits", "misses"):
+            lookups.add_metric([result], stats[result])
+        evictions = CounterMetricFamily(
+            "blob_cache_evictions", "Blobs evicted from each tier.", labels=["tier"]
+        )
+        evictions.add_metric(["memory"], stats["memory_evictions"])
+        evictions.add_metric(["disk"], stats["disk_evictions"])
+        size = GaugeMetricFamily(
+            "blob_cache_bytes", "Bytes held in each tier.", labels=["tier"]
+        )
+        size.add_metric(["memory"], stats["memory_bytes"])
+        size.add_metric(["disk"], stats["disk_bytes"])
+
+        yield lookups
+        yield evictions
+        yield size
+        yield GaugeMetricFamily(
+            "blob_cache_entries", "Blobs held in the cache.", value=stats["entries"]
+        )
+
+    def _admission(self) -> Iterator[Metric]:
+        admission = getattr(self.state, "admission", None)
+        if admission is None:
+            return
+
+        decisions = CounterMetricFamily(
+            "admission_decisions",
+            "Requests admitted, rejected on a full queue or timed out queueing.",
+            labels=["group", "outcome"],
+        )
+        in_flight = GaugeMetricFamily(
+            "admission_in_flight",
+            "Admitted requests still running, per route group.",
+            labels=["group"],
+        )
+        queued = GaugeMetricFamily(
+            "admission_queued",
+            "Requests waiting for a slot, per route group.",
+            labels=["group"],
+        )
+        for group, stats in admission.stats().items():
+            for outcome in ("admitted", "rejected", "timed_out"):
+                decisions.add_metric([group, outcome], stats[outcome])
+            in_flight.add_metric([group], stats["in_flight"])
+            queued.add_metric([group], stats["queued"])
+
+        yield decisions
+        yield in_flight
+        yield queued
+
+    def _breakers(self) -> Iterator[Metric]:
+        clients = {
+            id(client): client
+            for client in (
+                getattr(self.state, "supabase_client", None),
+                getattr(self.state, "database", None),
+                getattr(self.state, "storj_client", None),
+            )
+            if client is not None
+        }
+        breakers = [client.breaker for client in clients.values()]
+        if not breakers:
+            return
+
+        state = GaugeMetricFamily(
+            "circuit_breaker_state",
+            "1 for the state each backend's circuit breaker is in.",
+            labels=["backend", "state"],
+        )
+        events = CounterMetricFamily(
+            "circuit_breaker_events",
+            "Failures recorded, calls short-circuited and times opened.",
+            labels=["backend", "event"],
+        )
+        for breaker in breakers:
+            current = breaker.state
+            for name in ("closed", "open", "half_open"):
+                state.add_metric([breaker.name, name], int(name == current))
+            for event, count in breaker.counters.items():
+                events.add_metric([breaker.name, event], count)
+
+        yield state
+        yield events
+
+
+_state_collectors: List[AppStateCollector] = []
+
+
+def register_app_state(state) -> AppStateCollector:
+    collector = AppStateCollector(state)
+    REGISTRY.register(collector)
+    _state_collectors.append(collector)
+    return collector
+
+
+def unregister_app_state(collector: AppStateCollector):
+    REGISTRY.unregister(collector)
+    _state_collectors.remove(collector)
+
+
+def exposition() -> bytes:
+    """The metrics in the text exposition format.
+
+    With several workers the request and backend metrics are summed over
+    all of them, but the cache, admission and breaker state is that of the
+    worker answering the scrape.
+    """
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, PROMETHEUS_MULTIPROC_DIR)
+    for collector in _state_collectors:
+        registry.register(collector)
+    return generate_latest(registry)
@@ -0,0 +1,105 @@
+import base64
+import json
+import os
+from typing import Any, Generic, List, Optional, Sequence, TypeVar
+
+from postgrest.utils import sanitize_param
+from pydantic import BaseModel
+
+DEFAULT_PAGE_LIMIT = int(os.environ.get("DEFAULT_PAGE_LIMIT", 50))
+MAX_PAGE_LIMIT = int(os.environ.get("MAX_PAGE_LIMIT", 200))
+
+Row = TypeVar("Row")
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps(list(values), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except ValueError:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    # sanitize_param quotes values but does not escape quotes or backslashes
+    # in them, so such a value could add conditions to the filter.
+    if not all(
+        isinstance(value, (int, float))
+        or (isinstance(value, str) and '"' not in value and "\\" not in value)
+        for value in values
+    ):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+class Page:
+    """A keyset page over ``keys``, projected to the requested ``fields``.
+
+    ``keys`` is the sort order of the listing, ending with a unique column
+    (``("date", "id")`` or ``("id",)``). The cursor returned with a page
+    holds the keys of its last row, so the next page is a range scan that
+    costs the same however deep into the listing it is.
+    """
+
+    def __init__(
+        self,
+        columns: Sequence[str],
+        keys: Sequence[str],
+        limit: int = DEFAULT_PAGE_LIMIT,
+        after: Optional[str] = None,
+        fields: Optional[str] = None,
+    ):
+        self.keys = tuple(keys)
+        self.limit = max(1, min(limit, MAX_PAGE_LIMIT))
+        self.after = decode_cursor(after, len(self.keys)) if after else None
+        self.columns = self._project(columns, fields)
+
+    def _project(self, columns: Sequence[str], fields: Optional[str]) -> List[str]:
+        if not fields:
+            return list(columns)
+
+        requested = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in requested if field not in columns]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        # The sort keys are always selected so the next cursor can be built.
+        return list(dict.fromkeys([*requested, *self.keys]))
+
+    def cache_key(self) -> str:
+        return json.dumps([self.columns, self.limit, self.after], separators=(",", ":"))
+
+    def apply(self, query):
+        if self.after is not None:
+            if len(self.keys) == 1:
+                query = query.gt(self.keys[0], self.after[0])
+            else:
+                query.params = query.params.add("or", f"({self._after_filter(0)})")
+        # One extra row tells us whether there is a next page.
+        return query.order(",".join(self.keys)).limit(self.limit + 1)
+
+    def _after_filter(self, index: int) -> str:
+        key = self.keys[index]
+        value = sanitize_param(self.after[index])
+        if index == len(self.keys) - 1:
+            return f"{key}.gt.{value}"
+
+        rest = self._after_filter(index + 1)
+        if index + 1 < len(self.keys) - 1:
+            rest = f"or({rest})"
+        return f"{key}.gt.{value},and({key}.eq.{value},{rest})"
+
+    def result(self, rows: List[dict]) -> dict:
+        next_cursor = None
+        if len(rows) > self.limit:
+            rows = rows[: self.limit]
+            next_cursor = encode_cursor([rows[-1][key] for key in self.keys])
+        return {"data": rows, "next_cursor": next_cursor}
+
+
+class PageResponse(BaseModel, Generic[Row]):
+    data: List[Row]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,123 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from app.internal.profiling import span
+
+PASSWORD_SCRYPT_N = int(os.environ.get("PASSWORD_SCRYPT_N", 2**14))
+PASSWORD_SCRYPT_R = int(os.environ.get("PASSWORD_SCRYPT_R", 8))
+PASSWORD_SCRYPT_P = int(os.environ.get("PASSWORD_SCRYPT_P", 1))
+PASSWORD_HASH_WORKERS = int(
+    os.environ.get("PASSWORD_HASH_WORKERS", os.cpu_count() or 1)
+)
+PASSWORD_HASH_QUEUE_SIZE = int(os.environ.get("PASSWORD_HASH_QUEUE_SIZE", 64))
+
+SCHEME = "scrypt"
+SALT_SIZE = 16
+KEY_SIZE = 32
+
+
+class PasswordHasherBusy(Exception):
+    def __init__(self, queue_size: int):
+        super().__init__(f"More than {queue_size} password hashes are pending")
+        self.queue_size = queue_size
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii").rstrip("=")
+
+
+def _unb64(data: str) -> bytes:
+    return base64.b64decode(data + "=" * (-len(data) % 4))
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        password.encode("utf-8"),
+        salt=salt,
+        n=n,
+        r=r,
+        p=p,
+        maxmem=128 * n * r * p + 1024**2,
+        dklen=KEY_SIZE,
+    )
+
+
+def hash_password(
+    password: str,
+    n: int = PASSWORD_SCRYPT_N,
+    r: int = PASSWORD_SCRYPT_R,
+    p: int = PASSWORD_SCRYPT_P,
+) -> str:
+    """Returns ``scrypt$n$r$p$salt$key`` for ``password`` with a fresh salt."""
+    salt = os.urandom(SALT_SIZE)
+    key = _scrypt(password, salt, n, r, p)
+    return f"{SCHEME}${n}${r}${p}${_b64(salt)}${_b64(key)}"
+
+
+def verify_password(password: str, stored: str) -> bool:
+    """Checks ``password`` against an scrypt hash or a legacy SHA-256 one."""
+    if not stored.startswith(f"{SCHEME}$"):
+        legacy = hashlib.sha256(password.encode("utf-8")).hexdigest()
+        return hmac.compare_digest(legacy, stored)
+
+    try:
+        _, n, r, p, salt, key = stored.split("$")
+        expected = _unb64(key)
+        actual = _scrypt(password, _unb64(salt), int(n), int(r), int(p))
+    except ValueError:
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+class PasswordHasher:
+    """Runs the password KDF on a bounded thread pool.
+
+    ``hashlib.scrypt`` releases the GIL, so hashes run in parallel on the
+    pool while the event loop keeps serving requests. At most
+    ``queue_size`` hashes are running or waiting at once; beyond that
+    callers get PasswordHasherBusy instead of queueing without bound.
+    """
+
+    def __init__(
+        self,
+        workers: int = PASSWORD_HASH_WORKERS,
+        queue_size: int = PASSWORD_HASH_QUEUE_SIZE,
+        n: int = PASSWORD_SCRYPT_N,
+        r: int = PASSWORD_SCRYPT_R,
+        p: int = PASSWORD_SCRYPT_P,
+    ):
+        self.params = (n, r, p)
+        self.queue_size = queue_size
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password-hash"
+        )
+        self._slots = asyncio.Semaphore(queue_size)
+
+    async def _run(self, fn, *args):
+        if self._slots.locked():
+            raise PasswordHasherBusy(self.queue_size)
+
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            with span("auth"):
+                return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password, *self.params)
+
+    async def verify(self, password: str, stored: str) -> bool:
+        return await self._run(verify_password, password, stored)
+
+    def needs_rehash(self, stored: str) -> bool:
+        """True for legacy hashes and for hashes made with other parameters."""
+        parts = stored.split("$")
+        if len(parts) != 6 or parts[0] != SCHEME:
+            return True
+        return tuple(parts[1:4]) != tuple(str(param) for param in self.params)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
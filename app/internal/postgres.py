@@ -0,0 +1,291 @@
+import asyncio
+import datetime
+import decimal
+import itertools
+import os
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import orjson
+from dotenv import load_dotenv
+
+from app.internal.metrics import BackendTimer
+from app.internal.pagination import Page
+from app.internal.resilience import CircuitBreaker, guarded_call
+
+try:
+    import asyncpg
+except ImportError:  # asyncpg is only needed for DATABASE_BACKEND=postgres
+    asyncpg = None
+
+load_dotenv()
+
+DATABASE_URL = os.environ.get("DATABASE_URL")
+DATABASE_POOL_MIN_SIZE = int(os.environ.get("DATABASE_POOL_MIN_SIZE", 1))
+DATABASE_POOL_MAX_SIZE = int(os.environ.get("DATABASE_POOL_MAX_SIZE", 20))
+# Prepared statements kept per connection. Set it to 0 behind a pooler in
+# transaction mode (e.g. Supabase's port 6543), which cannot keep them.
+DATABASE_STATEMENT_CACHE_SIZE = int(
+    os.environ.get("DATABASE_STATEMENT_CACHE_SIZE", 100)
+)
+DATABASE_CALL_TIMEOUT = float(os.environ.get("DATABASE_CALL_TIMEOUT", 5.0))
+DATABASE_READ_RETRIES = int(os.environ.get("DATABASE_READ_RETRIES", 2))
+DATABASE_TRANSIENT_ERRORS: Tuple[type, ...] = (OSError,)
+if asyncpg is not None:
+    DATABASE_TRANSIENT_ERRORS += (
+        asyncpg.PostgresConnectionError,
+        asyncpg.CannotConnectNowError,
+        asyncpg.TooManyConnectionsError,
+    )
+
+INTEGER_TYPES = {"int2", "int4", "int8"}
+FLOAT_TYPES = {"float4", "float8"}
+TIMESTAMP_TYPES = {"timestamp", "timestamptz"}
+# The type of every column of a table, to convert values compared with or
+# assigned to them.
+COLUMN_TYPES_SQL = """
+SELECT a.attname, t.typname
+FROM pg_attribute a JOIN pg_type t ON t.oid = a.atttypid
+WHERE a.attrelid = $1::regclass AND a.attnum > 0 AND NOT a.attisdropped
+"""
+
+
+def quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def select_list(columns: Sequence[str]) -> str:
+    return "*" if list(columns) == ["*"] else ", ".join(map(quote, columns))
+
+
+def coerce(value: Any, type_name: str) -> Any:
+    """Converts a path or cursor value, which may be a string, to ``type_name``.
+
+    Values without a ``type_name`` are left as they are.
+
+    PostgREST casts filter values itself; asyncpg wants them typed.
+    """
+    if not isinstance(value, str):
+        return value
+    if type_name in INTEGER_TYPES:
+        return int(value)
+    if type_name in FLOAT_TYPES:
+        return float(value)
+    if type_name == "numeric":
+        return decimal.Decimal(value)
+    if type_name == "date":
+        return datetime.date.fromisoformat(value)
+    if type_name in TIMESTAMP_TYPES:
+        return datetime.datetime.fromisoformat(value)
+    if type_name == "bool":
+        return value.lower() == "true"
+    return value
+
+
+def to_json(value: Any) -> Any:
+    """Renders a column value the way PostgREST's JSON would."""
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+class PostgresClient:
+    """Talks to Postgres directly, bypassing PostgREST.
+
+    Offers the same ``insert``/``select``/``update`` methods as
+    SupabaseClient. Every query is a fixed SQL text per table and column
+    set, with the values as parameters, so asyncpg prepares it once per
+    connection and reuses the server-side statement afterwards; with a
+    statement cache size of 0 nothing is kept between queries. Inserts of
+    any number of rows share one statement: the rows are passed as a single
+    JSON array and expanded with ``jsonb_populate_recordset``.
+
+    The pool is opened on first use. Calls go through the request deadline
+    and a circuit breaker like the other backends, and reads are retried.
+    """
+
+    def __init__(
+        self,
+        dsn: Optional[str] = DATABASE_URL,
+        min_size: int = DATABASE_POOL_MIN_SIZE,
+        max_size: int = DATABASE_POOL_MAX_SIZE,
+        statement_cache_size: int = DATABASE_STATEMENT_CACHE_SIZE,
+    ):
+        if asyncpg is None:
+            raise RuntimeError("DATABASE_BACKEND=postgres needs the asyncpg package")
+        if not dsn:
+            raise RuntimeError("DATABASE_BACKEND=postgres needs DATABASE_URL")
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.statement_cache_size = statement_cache_size
+        self.pool: Optional["asyncpg.Pool"] = None
+        self._pool_lock = asyncio.Lock()
+        # table -> column -> type name, learnt once per table.
+        self._column_types: Dict[str, Dict[str, str]] = {}
+        self.breaker = CircuitBreaker("postgres")
+        # Why the last health check failed, or None if it passed.
+        self.health_error: Optional[str] = None
+
+    async def _get_pool(self) -> "asyncpg.Pool":
+        if self.pool is None:
+            async with self._pool_lock:
+                if self.pool is None:
+                    self.pool = await asyncpg.create_pool(
+                        self.dsn,
+                        min_size=self.min_size,
+                        max_size=self.max_size,
+                        statement_cache_size=self.statement_cache_size,
+                    )
+        return self.pool
+
+    async def _types_of(self, connection, table: str) -> Dict[str, str]:
+        types = self._column_types.get(table)
+        if types is None:
+            rows = await connection.fetch(COLUMN_TYPES_SQL, quote(table))
+            types = {row["attname"]: row["typname"] for row in rows}
+            self._column_types[table] = types
+        return types
+
+    async def fetch(
+        self,
+        table: str,
+        operation: str,
+        sql: str,
+        args: Sequence[Any] = (),
+        columns: Sequence[Optional[str]] = (),
+        idempotent: bool = False,
+    ) -> List[dict]:
+        """Runs ``sql`` and returns its rows as PostgREST would.
+
+        ``columns`` names the column of ``table`` that each argument is
+        compared with or assigned to, None for arguments passed as they are.
+        """
+
+        async def call():
+            pool = await self._get_pool()
+            async with pool.acquire() as connection:
+                types = {}
+                if any(columns):
+                    types = await self._types_of(connection, table)
+                values = [
+                    coerce(value, types.get(column))
+                    for value, column in itertools.zip_longest(args, columns)
+                ]
+                return await connection.fetch(sql, *values)
+
+        with BackendTimer("postgres", table, operation):
+            records = await guarded_call(
+                self.breaker,
+                call,
+                DATABASE_CALL_TIMEOUT,
+                DATABASE_TRANSIENT_ERRORS,
+                idempotent=idempotent,
+                retries=DATABASE_READ_RETRIES,
+            )
+        return [
+            {column: to_json(value) for column, value in record.items()}
+            for record in records
+        ]
+
+    async def insert_row(self, table: str, row: dict) -> dict:
+        return (await self.insert(table, [row]))[0]
+
+    async def insert(self, table: str, rows: Sequence[dict]) -> List[dict]:
+        columns = list(dict.fromkeys(column for row in rows for column in row))
+        names = select_list(columns)
+        sql = (
+            f"INSERT INTO {quote(table)} ({names}) SELECT {names} "
+            f"FROM jsonb_populate_recordset(NULL::{quote(table)}, $1::jsonb) "
+            "RETURNING *"
+        )
+        payload = orjson.dumps(list(rows), default=str).decode()
+        return await self.fetch(table, "insert", sql, [payload], [None])
+
+    async def select(
+        self,
+        table: str,
+        columns: Sequence[str],
+        filters: Dict[str, Any],
+        page: Optional[Page] = None,
+        limit: Optional[int] = None,
+    ) -> List[dict]:
+        """Rows of ``table`` whose columns equal ``filters``; see SupabaseClient."""
+        args = list(filters.values())
+        arg_columns: List[Optional[str]] = list(filters)
+        conditions = [
+            f"{quote(column)} = ${index}"
+            for index, column in enumerate(filters, start=1)
+        ]
+        order = ""
+        if page:
+            if page.after is not None:
+                # A row comparison is the keyset condition and can use the
+                # index on the sort keys.
+                keys = ", ".join(map(quote, page.keys))
+                placeholders = ", ".join(
+                    f"${index}"
+                    for index in range(len(args) + 1, len(args) + len(page.keys) + 1)
+                )
+                conditions.append(f"({keys}) > ({placeholders})")
+                args.extend(page.after)
+                arg_columns.extend(page.keys)
+            order = " ORDER BY " + ", ".join(map(quote, page.keys))
+            # One extra row tells whether there is a next page.
+            limit = page.limit + 1
+
+        sql = f"SELECT {select_list(columns)} FROM {quote(table)}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += order
+        if limit:
+            args.append(limit)
+            arg_columns.append(None)
+            sql += f" LIMIT ${len(args)}"
+        return await self.fetch(
+            table, "select", sql, args, arg_columns, idempotent=True
+        )
+
+    async def update(
+        self, table: str, values: dict, filters: Dict[str, Any]
+    ) -> List[dict]:
+        assignments = [
+            f"{quote(column)} = ${index}" for index, column in enumerate(values, 1)
+        ]
+        conditions = [
+            f"{quote(column)} = ${index}"
+            for index, column in enumerate(filters, start=len(values) + 1)
+        ]
+        sql = (
+            f"UPDATE {quote(table)} SET {', '.join(assignments)} "
+            f"WHERE {' AND '.join(conditions)} RETURNING *"
+        )
+        args = [*values.values(), *filters.values()]
+        return await self.fetch(table, "update", sql, args, [*values, *filters])
+
+    async def check_health(self) -> bool:
+        """Opens the pool if it is not open yet and runs a trivial query."""
+        try:
+            await self.fetch("", "ping", "SELECT 1", idempotent=True)
+            self.health_error = None
+            return True
+        except Exception as e:
+            self.health_error = f"{type(e).__name__}: {e}"
+            return False
+
+    def pool_stats(self) -> dict:
+        if self.pool is None:
+            return {"size": 0, "idle": 0, "max_size": self.max_size}
+        return {
+            "size": self.pool.get_size(),
+            "idle": self.pool.get_idle_size(),
+            "max_size": self.pool.get_max_size(),
+        }
+
+    async def aclose(self):
+        if self.pool is not None:
+            await self.pool.close()
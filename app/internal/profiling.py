@@ -0,0 +1,183 @@
+import argparse
+import contextvars
+import os
+import re
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, Optional
+
+from dotenv import load_dotenv
+from fastapi.responses import ORJSONResponse
+from jose import JWTError, jwt
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # pyinstrument is only needed to profile requests
+    Profiler = None
+
+load_dotenv()
+
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "false").lower() == "true"
+# Profile tokens are signed with their own key so that user tokens, signed
+# with SECRET_KEY, can never turn profiling on.
+PROFILING_SECRET = os.environ.get("PROFILING_SECRET")
+PROFILING_INTERVAL = float(os.environ.get("PROFILING_INTERVAL", 0.001))
+PROFILING_DIR = os.environ.get(
+    "PROFILING_DIR", os.path.join(tempfile.gettempdir(), "travel-planning-profiles")
+)
+PROFILE_TOKEN_HEADER = "x-profile-token"
+PROFILE_REPORT_HEADER = "x-profile-report"
+ALGORITHM = "HS256"
+
+# Backend -> the Server-Timing span its calls are counted in.
+BACKEND_SPANS = {"supabase": "db", "postgres": "db", "storj": "storage"}
+
+# Seconds spent per span by the current request, while one is running.
+_spans: "contextvars.ContextVar[Optional[Dict[str, float]]]" = contextvars.ContextVar(
+    "request_spans", default=None
+)
+
+
+def add_span(name: str, elapsed: float):
+    spans = _spans.get()
+    if spans is not None:
+        spans[name] = spans.get(name, 0.0) + elapsed
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_span(name, time.perf_counter() - start)
+
+
+def server_timing(spans: Dict[str, float], total: float) -> str:
+    entries = [f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in spans.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+class TimedORJSONResponse(ORJSONResponse):
+    """ORJSONResponse that counts its encoding in the serialization span."""
+
+    def render(self, content) -> bytes:
+        with span("serialization"):
+            return super().render(content)
+
+
+def create_profile_token(expires_delta: timedelta) -> str:
+    if not PROFILING_SECRET:
+        raise RuntimeError("PROFILING_SECRET is not set")
+    return jwt.encode(
+        {"profile": True, "exp": datetime.utcnow() + expires_delta},
+        PROFILING_SECRET,
+        algorithm=ALGORITHM,
+    )
+
+
+def profile_requested(token: Optional[str]) -> bool:
+    if not (PROFILING_ENABLED and PROFILING_SECRET and token):
+        return False
+    try:
+        payload = jwt.decode(token, PROFILING_SECRET, algorithms=[ALGORITHM])
+    except JWTError:
+        return False
+    return payload.get("profile") is True
+
+
+def report_name(method: str, path: str) -> str:
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", path).strip("-") or "root"
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    return f"{stamp}-{method}-{slug[:80]}-{uuid.uuid4().hex[:8]}.txt"
+
+
+class ProfilingMiddleware:
+    """Reports where each request's time went.
+
+    Every response gets a Server-Timing header with the time spent in auth,
+    db, storage and serialization, as far as they happened before the
+    headers were sent. Spans are sums, so calls made concurrently can add up
+    to more than the total.
+
+    With PROFILING_ENABLED, a request carrying a valid profile token in the
+    X-Profile-Token header also runs under pyinstrument's sampling profiler.
+    The call tree is written to PROFILING_DIR once the response is sent, and
+    the report's file name is returned in the X-Profile-Report header. Only
+    this request's task is sampled; work it hands to the threadpool shows up
+    as the await that waited for it.
+    """
+
+    def __init__(self, app: ASGIApp, report_dir: str = PROFILING_DIR):
+        if PROFILING_ENABLED and Profiler is None:
+            raise RuntimeError("PROFILING_ENABLED needs the pyinstrument package")
+        self.app = app
+        self.report_dir = report_dir
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        spans: Dict[str, float] = {}
+        token = _spans.set(spans)
+        start = time.perf_counter()
+
+        profiler = report = None
+        if Profiler is not None:
+            headers = dict(scope["headers"])
+            raw_token = headers.get(PROFILE_TOKEN_HEADER.encode())
+            if raw_token and profile_requested(raw_token.decode("latin-1")):
+                profiler = Profiler(interval=PROFILING_INTERVAL, async_mode="enabled")
+                report = report_name(scope["method"], scope["path"])
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                timing = server_timing(spans, time.perf_counter() - start)
+                headers.append((b"server-timing", timing.encode()))
+                if report:
+                    headers.append((PROFILE_REPORT_HEADER.encode(), report.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            if profiler is None:
+                await self.app(scope, receive, send_wrapper)
+                return
+
+            profiler.start()
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                profiler.stop()
+                self._write_report(report, profiler)
+        finally:
+            _spans.reset(token)
+
+    def _write_report(self, name: str, profiler):
+        try:
+            os.makedirs(self.report_dir, exist_ok=True)
+            with open(os.path.join(self.report_dir, name), "w") as f:
+                f.write(profiler.output_text(unicode=True, color=False))
+        except Exception as e:
+            print(e)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Prints a token that turns on profiling for the requests "
+        "that send it in the X-Profile-Token header."
+    )
+    parser.add_argument("--minutes", type=float, default=15.0)
+    args = parser.parse_args()
+    print(create_profile_token(timedelta(minutes=args.minutes)))
+
+
+if __name__ == "__main__":
+    main()
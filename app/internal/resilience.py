@@ -0,0 +1,200 @@
+import asyncio
+import contextvars
+import math
+import os
+import random
+import time
+from typing import Awaitable, Callable, Optional, Tuple, Type, TypeVar
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+REQUEST_BUDGET = float(os.environ.get("REQUEST_BUDGET", 30.0))
+RETRY_BASE_DELAY = float(os.environ.get("RETRY_BASE_DELAY", 0.05))
+RETRY_MAX_DELAY = float(os.environ.get("RETRY_MAX_DELAY", 1.0))
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("BREAKER_FAILURE_THRESHOLD", 5))
+BREAKER_RESET_TIMEOUT = float(os.environ.get("BREAKER_RESET_TIMEOUT", 10.0))
+
+T = TypeVar("T")
+
+# Monotonic time by which the current request has to be answered.
+_deadline: "contextvars.ContextVar[Optional[float]]" = contextvars.ContextVar(
+    "request_deadline", default=None
+)
+
+
+class BackendUnavailable(Exception):
+    # Seconds a client is told to wait before retrying.
+    retry_after = 1
+
+
+class CircuitOpen(BackendUnavailable):
+    def __init__(self, name: str, retry_after: float = 1):
+        super().__init__(f"{name} is unavailable, failing fast")
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class DeadlineExceeded(BackendUnavailable, asyncio.TimeoutError):
+    def __init__(self, name: str):
+        super().__init__(f"Request deadline exceeded waiting for {name}")
+
+
+class BackendTimeout(BackendUnavailable, asyncio.TimeoutError):
+    def __init__(self, name: str):
+        super().__init__(f"{name} did not answer in time")
+
+
+def remaining_budget() -> Optional[float]:
+    """Seconds left before the current request's deadline, if it has one."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class DeadlineMiddleware:
+    """Gives every request REQUEST_BUDGET seconds for its backend calls.
+
+    The deadline is lifted once the response body has been sent, so
+    background tasks that run afterwards are not cut short by it.
+    """
+
+    def __init__(self, app: ASGIApp, budget: float = REQUEST_BUDGET):
+        self.app = app
+        self.budget = budget
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = _deadline.set(time.monotonic() + self.budget)
+
+        async def send_wrapper(message: Message):
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get(
+                "more_body", False
+            ):
+                _deadline.set(None)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _deadline.reset(token)
+
+
+class CircuitBreaker:
+    """Fails calls fast while a backend keeps failing.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls raise CircuitOpen for ``reset_timeout`` seconds. Then a single
+    trial call is let through; its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_TIMEOUT,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+        self.counters = {"failures": 0, "short_circuited": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return
+        if state == "half_open" and not self._trial_running:
+            self._trial_running = True
+            return
+        self.counters["short_circuited"] += 1
+        # Until the trial call can be made; a trial already running is
+        # answered within a call timeout, so 1s is a fair guess then.
+        raise CircuitOpen(
+            self.name, self.opened_at + self.reset_timeout - time.monotonic()
+        )
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.counters["failures"] += 1
+        if self._trial_running or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self._trial_running:
+                self.counters["opened"] += 1
+            self.opened_at = time.monotonic()
+        self._trial_running = False
+
+    def record_ignored(self):
+        # The call was cancelled before the backend answered; release the
+        # trial slot if it held one.
+        self._trial_running = False
+
+
+async def guarded_call(
+    breaker: CircuitBreaker,
+    fn: Callable[[], Awaitable[T]],
+    timeout: float,
+    transient: Tuple[Type[BaseException], ...],
+    idempotent: bool = False,
+    retries: int = 0,
+) -> T:
+    """Runs ``fn`` under a deadline, the breaker and, if idempotent, retries.
+
+    Each attempt gets ``timeout`` seconds, less if the request budget has
+    less left. Only timeouts and ``transient`` errors count against the
+    breaker, and only those are retried, with full-jitter exponential
+    backoff. When the last attempt fails with one of them, it is raised as
+    a BackendUnavailable, so that callers answer 503 rather than treating
+    it as an error of the query.
+    """
+    attempts = retries + 1 if idempotent else 1
+    for attempt in range(attempts):
+        budget = remaining_budget()
+        if budget is not None and budget <= 0:
+            raise DeadlineExceeded(breaker.name)
+        breaker.allow()
+
+        try:
+            result = await asyncio.wait_for(
+                fn(), timeout if budget is None else min(timeout, budget)
+            )
+        except (asyncio.TimeoutError, *transient) as e:
+            breaker.record_failure()
+            if attempt == attempts - 1:
+                if not isinstance(e, asyncio.TimeoutError):
+                    raise BackendUnavailable(
+                        f"{breaker.name} is unavailable: {e}"
+                    ) from e
+                if budget is not None and budget < timeout:
+                    raise DeadlineExceeded(breaker.name) from e
+                raise BackendTimeout(breaker.name) from e
+        except Exception:
+            # Any other error is an answer from a backend that is up.
+            breaker.record_success()
+            raise
+        except BaseException:
+            breaker.record_ignored()
+            raise
+        else:
+            breaker.record_success()
+            return result
+
+        delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2**attempt))
+        budget = remaining_budget()
+        if budget is not None and budget <= delay:
+            raise DeadlineExceeded(breaker.name)
+        await asyncio.sleep(delay)
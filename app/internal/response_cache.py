@@ -0,0 +1,240 @@
+import asyncio
+import itertools
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from app.internal.cache import TTLCache
+from app.internal.http_cache import collection_etag
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # redis is only needed for a shared cache
+    redis = None
+
+RESPONSE_CACHE_URL = os.environ.get("RESPONSE_CACHE_URL", "")
+# Cached results (one per resource, owner and query parameters) kept in memory.
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", 10000))
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", 30.0))
+RESPONSE_CACHE_STALE_TTL = float(os.environ.get("RESPONSE_CACHE_STALE_TTL", 300.0))
+
+Loader = Callable[[], Awaitable[dict]]
+
+
+class MemoryBackend:
+    """In-process backend: one LRU/TTL entry per ``(namespace, field)``.
+
+    Each field expires on its own, and ``maxsize`` bounds the number of
+    fields, however many distinct query parameters clients send. Dropping a
+    namespace records the generation it was dropped at; fields written
+    before that are ignored and age out of the LRU.
+    """
+
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE):
+        self._fields = TTLCache(maxsize, RESPONSE_CACHE_TTL)
+        # namespace -> generation it was last dropped at. Kept as long as a
+        # field written before the drop can live, then no longer needed.
+        self._generations = TTLCache(maxsize, RESPONSE_CACHE_TTL)
+        self._counter = itertools.count(1)
+        # Fields written before this generation are ignored; raised when a
+        # drop has to be forgotten early to stay within maxsize.
+        self._floor = 0
+        self._max_ttl = 0.0
+
+    async def get(self, namespace: str, field: str) -> Optional[tuple]:
+        stored = self._fields.get((namespace, field))
+        if stored is None:
+            return None
+        generation, entry = stored
+        if generation < max(self._floor, self._generations.get(namespace, 0)):
+            self._fields.pop((namespace, field))
+            return None
+        return entry
+
+    async def set(self, namespace: str, field: str, entry: tuple, ttl):
+        self._max_ttl = max(self._max_ttl, ttl)
+        self._fields.set((namespace, field), (next(self._counter), entry), ttl)
+
+    async def delete(self, namespace: str):
+        generation = next(self._counter)
+        if (
+            self._generations.get(namespace) is None
+            and len(self._generations) >= self._generations.maxsize
+        ):
+            # Recording it would evict another drop; ignore everything
+            # written so far instead.
+            self._floor = generation
+        self._generations.set(namespace, generation, self._max_ttl)
+
+
+class RedisBackend:
+    """Shared backend: one Redis hash per namespace.
+
+    Entries are stored as JSON, so every worker sees the same cache and an
+    invalidation on one of them applies to all.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisBackend":
+        if redis is None:
+            raise RuntimeError("RESPONSE_CACHE_URL needs the redis package")
+        return cls(redis.from_url(url))
+
+    async def get(self, namespace: str, field: str) -> Optional[tuple]:
+        raw = await self.client.hget(namespace, field)
+        return tuple(json.loads(raw)) if raw is not None else None
+
+    async def set(self, namespace: str, field: str, entry: tuple, ttl):
+        await self.client.hset(namespace, field, json.dumps(entry, default=str))
+        await self.client.expire(namespace, max(1, int(ttl)))
+
+    async def delete(self, namespace: str):
+        await self.client.delete(namespace)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class LocalRedis:
+    """In-process stand-in for the few Redis commands RedisBackend uses."""
+
+    def __init__(self):
+        self._hashes: Dict[str, Dict[str, str]] = {}
+        self._expires: Dict[str, float] = {}
+
+    def _live(self, name: str) -> Dict[str, str]:
+        if self._expires.get(name, float("inf")) <= time.monotonic():
+            self._hashes.pop(name, None)
+            self._expires.pop(name, None)
+        return self._hashes.get(name, {})
+
+    async def hget(self, name: str, key: str) -> Optional[str]:
+        return self._live(name).get(key)
+
+    async def hset(self, name: str, key: str, value: str):
+        self._live(name)
+        self._hashes.setdefault(name, {})[key] = value
+
+    async def expire(self, name: str, seconds: int):
+        if name in self._hashes:
+            self._expires[name] = time.monotonic() + seconds
+
+    async def delete(self, name: str):
+        self._hashes.pop(name, None)
+        self._expires.pop(name, None)
+
+    async def aclose(self):
+        pass
+
+
+def get_backend(url: str = RESPONSE_CACHE_URL):
+    if not url:
+        return MemoryBackend()
+    if url == "local://":
+        return RedisBackend(LocalRedis())
+    return RedisBackend.from_url(url)
+
+
+class ResponseCache:
+    """Read-through cache of query results with stale-while-revalidate.
+
+    Results are grouped in namespaces of ``(resource, owner)``, e.g. a
+    trip's itinerary, with one field per set of query parameters; writes
+    drop the whole namespace. A result is fresh for ``ttl`` seconds, and for
+    ``stale_ttl`` seconds more it is still served while a background load
+    refreshes it. Concurrent loads of the same field share one query.
+
+    Each result carries an ``etag`` computed once when it is loaded, so
+    conditional requests are answered without serializing the result again.
+    """
+
+    def __init__(
+        self,
+        backend=None,
+        ttl: float = RESPONSE_CACHE_TTL,
+        stale_ttl: float = RESPONSE_CACHE_STALE_TTL,
+    ):
+        self.backend = backend or get_backend()
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._loading: Dict[Tuple[str, str], asyncio.Future] = {}
+        # Loads that were in flight when their namespace was invalidated;
+        # what they read may predate the write, so it is not stored.
+        self._discarded: Set[asyncio.Future] = set()
+
+    @staticmethod
+    def namespace(resource: str, owner: Any) -> str:
+        return f"{resource}:{owner}"
+
+    async def get_or_load(
+        self, resource: str, owner: Any, params: str, loader: Loader
+    ) -> dict:
+        namespace = self.namespace(resource, owner)
+        try:
+            entry = await self.backend.get(namespace, params)
+        except Exception as e:
+            print(f"Error reading response cache: {e}")
+            entry = None
+
+        if entry is not None:
+            value, stored_at, etag = entry
+            age = time.time() - stored_at
+            if age < self.ttl:
+                return {"data": value, "error": None, "etag": etag}
+            if age < self.ttl + self.stale_ttl:
+                self._load(namespace, params, loader)
+                return {"data": value, "error": None, "etag": etag}
+
+        return await asyncio.shield(self._load(namespace, params, loader))
+
+    def _load(self, namespace: str, params: str, loader: Loader) -> asyncio.Future:
+        key = (namespace, params)
+        future = self._loading.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._fill(namespace, params, loader))
+            self._loading[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+        return future
+
+    def _forget(self, key: Tuple[str, str], future: asyncio.Future):
+        if self._loading.get(key) is future:
+            del self._loading[key]
+        self._discarded.discard(future)
+        if not future.cancelled():
+            # A background refresh that raised (e.g. with the circuit open)
+            # has nobody awaiting it; the next request loads again.
+            future.exception()
+
+    async def _fill(self, namespace: str, params: str, loader: Loader) -> dict:
+        result = await loader()
+        if result["error"]:
+            return result
+
+        result = {**result, "etag": collection_etag(result["data"])}
+        if asyncio.current_task() in self._discarded:
+            return result
+
+        try:
+            await self.backend.set(
+                namespace,
+                params,
+                (result["data"], time.time(), result["etag"]),
+                self.ttl + self.stale_ttl,
+            )
+        except Exception as e:
+            print(f"Error writing response cache: {e}")
+        return result
+
+    async def invalidate(self, resource: str, owner: Any):
+        namespace = self.namespace(resource, owner)
+        for key in [key for key in self._loading if key[0] == namespace]:
+            self._discarded.add(self._loading.pop(key))
+        await self.backend.delete(namespace)
+
+    async def aclose(self):
+        if hasattr(self.backend, "aclose"):
+            await self.backend.aclose()
@@ -1,18 +1,81 @@
-import base64
+import asyncio
+import hashlib
 import io
+import mimetypes
+import mmap
 import os
-from typing import Union
+import time
+from typing import AsyncIterator, Callable, Dict, Optional, Protocol, Union
 
-from uplink_python.errors import StorjException
+from starlette.concurrency import run_in_threadpool
+from uplink_python.errors import (InternalError, ObjectNotFoundError,
+                                  StorjException, TooManyRequestsError)
 from uplink_python.module_classes import ListObjectsOptions
 from uplink_python.project import Project
 from uplink_python.uplink import Uplink
 
+from app.internal.blob_cache import BlobCache
+from app.internal.cache import TTLCache
+from app.internal.images import DERIVATIVE_FORMAT
+from app.internal.metrics import BackendTimer, record_transfer
+from app.internal.resilience import (BackendUnavailable, CircuitBreaker,
+                                     guarded_call)
+
+PROFILE_INDEX_SIZE = int(os.environ.get("PROFILE_INDEX_SIZE", 10000))
+PROFILE_INDEX_TTL = float(os.environ.get("PROFILE_INDEX_TTL", 300.0))
+DOWNLOAD_CHUNK_SIZE = int(os.environ.get("STORJ_DOWNLOAD_CHUNK_SIZE", 64 * 1024))
+UPLOAD_CHUNK_SIZE = int(os.environ.get("STORJ_UPLOAD_CHUNK_SIZE", 64 * 1024))
+MAX_PROFILE_IMAGE_SIZE = int(os.environ.get("MAX_PROFILE_IMAGE_SIZE", 5 * 1024 * 1024))
+STORJ_MAX_CONCURRENCY = int(os.environ.get("STORJ_MAX_CONCURRENCY", 8))
+STORJ_REOPEN_INTERVAL = float(os.environ.get("STORJ_REOPEN_INTERVAL", 5.0))
+STORJ_CALL_TIMEOUT = float(os.environ.get("STORJ_CALL_TIMEOUT", 10.0))
+STORJ_READ_RETRIES = int(os.environ.get("STORJ_READ_RETRIES", 2))
+STORJ_TRANSIENT_ERRORS = (InternalError, TooManyRequestsError)
+BLOB_CACHE_MAX_OBJECT_BYTES = int(
+    os.environ.get("BLOB_CACHE_MAX_OBJECT_BYTES", MAX_PROFILE_IMAGE_SIZE)
+)
+
+# user id -> the user's current profile image ({} when they have none).
+# Uploads on this process update it directly; the TTL bounds how long an
+# upload made by another worker can go unnoticed.
+profile_image_index = TTLCache(PROFILE_INDEX_SIZE, PROFILE_INDEX_TTL)
+
+
+class AsyncReadable(Protocol):
+    async def read(self, size: int = -1) -> bytes:
+        ...
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, max_size: int):
+        super().__init__(f"Profile image is larger than {max_size} bytes")
+        self.max_size = max_size
+
 
 class StorjClient:
-    def __init__(self):
-        self.storj = self._get_storj_client()
+    """Process-wide handle on the Storj project.
+
+    The project is opened on first use and shared by every request. Uplink
+    calls are blocking native calls, so they run in the threadpool, at most
+    ``max_concurrency`` at a time. When a call fails, a health probe decides
+    whether the project is broken; if so it is closed and transparently
+    reopened by the next call.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = STORJ_MAX_CONCURRENCY,
+        blob_cache: Optional[BlobCache] = None,
+    ):
+        self.storj: Optional[Project] = None
         self.bucket_name = "profile"
+        self.blob_cache = blob_cache
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._open_lock = asyncio.Lock()
+        self._last_open_failure = 0.0
+        self.breaker = CircuitBreaker("storj")
+        # Why the last health check failed, or None if it passed.
+        self.health_error: Optional[str] = None
 
     @staticmethod
     def _get_storj_client() -> Project:
@@ -26,61 +89,301 @@ class StorjClient:
         except Exception as e:
             print(e)
 
+    async def _call(
+        self, fn: Callable, *args, idempotent: bool = False, guard: bool = True
+    ):
+        """Runs a blocking uplink call in the threadpool.
+
+        Guarded calls are subject to the request deadline and the circuit
+        breaker, and idempotent ones are retried on transient errors.
+        Cleanup calls (close, abort) pass ``guard=False`` so they still run
+        while the circuit is open. A call that times out keeps its thread
+        until uplink returns, and its concurrency slot along with it; only the
+        waiting request is released.
+        """
+
+        async def call():
+            await self._semaphore.acquire()
+            thread = asyncio.ensure_future(run_in_threadpool(fn, *args))
+            thread.add_done_callback(self._release)
+            # Shielded so that a timeout stops the wait, not the task that
+            # frees the slot when the thread returns.
+            return await asyncio.shield(thread)
+
+        with BackendTimer("storj", self.bucket_name, fn.__name__.lstrip("_")):
+            if not guard:
+                return await call()
+            return await guarded_call(
+                self.breaker,
+                call,
+                STORJ_CALL_TIMEOUT,
+                STORJ_TRANSIENT_ERRORS,
+                idempotent=idempotent,
+                retries=STORJ_READ_RETRIES,
+            )
+
+    def _release(self, thread: asyncio.Future):
+        self._semaphore.release()
+        if not thread.cancelled():
+            # Retrieved so that calls nobody waits for any more do not log
+            # "exception was never retrieved".
+            thread.exception()
+
+    async def _get_project(self) -> Project:
+        if self.storj is None:
+            async with self._open_lock:
+                recently_failed = (
+                    time.monotonic() - self._last_open_failure < STORJ_REOPEN_INTERVAL
+                )
+                if self.storj is None and not recently_failed:
+                    self.storj = await self._call(self._get_storj_client, guard=False)
+                    if self.storj is None:
+                        self._last_open_failure = time.monotonic()
+
+        if self.storj is None:
+            raise StorjException(
+                "Failed to initialize Storj", 500, "storj not initialized"
+            )
+        return self.storj
+
+    async def check_health(self) -> bool:
+        try:
+            project = await self._get_project()
+            await self._call(project.stat_bucket, self.bucket_name, idempotent=True)
+            self.health_error = None
+            return True
+        except Exception as e:
+            self.health_error = f"{type(e).__name__}: {e}"
+            await self._reset()
+            return False
+
+    async def _recover(self):
+        # Errors like a missing object leave the project usable; only drop it
+        # when it can no longer reach the bucket.
+        if self.storj is not None:
+            await self.check_health()
+
+    async def _reset(self):
+        project, self.storj = self.storj, None
+        if project is not None:
+            try:
+                await self._call(project.close, guard=False)
+            except Exception as e:
+                print(e)
+
+    async def aclose(self):
+        await self._reset()
+
     async def upload_user_profile(
-        self, user_id: str, file_path: str, file_content: bytes
-    ) -> str:
+        self,
+        user_id: str,
+        file_path: str,
+        file: AsyncReadable,
+        max_size: int = MAX_PROFILE_IMAGE_SIZE,
+        chunk_size: int = UPLOAD_CHUNK_SIZE,
+    ) -> dict:
+        """Streams ``file`` to Storj one chunk at a time.
+
+        At most one chunk is held in memory. Raises UploadTooLarge, after
+        aborting the upload, as soon as more than ``max_size`` bytes are read.
+        On success ``data`` describes the stored image, version included.
+        """
         uploaded = None
+        start = time.perf_counter()
         try:
-            if self.storj:
-                object_name = f"{user_id}/{os.path.basename(file_path)}"
-                uploaded = self.storj.upload_object(self.bucket_name, object_name)
+            project = await self._get_project()
+            object_name = f"{user_id}/{os.path.basename(file_path)}"
+            uploaded = await self._call(
+                project.upload_object, self.bucket_name, object_name
+            )
 
-                uploaded.write(file_content, len(file_content))
-                uploaded.commit()
+            size = 0
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    await self._call(uploaded.abort, guard=False)
+                    uploaded = None
+                    raise UploadTooLarge(max_size)
+                await self._call(uploaded.write, chunk, len(chunk))
 
-                return ""
-            return "Failed to initialize Storj"
-        except StorjException as e:
-            if uploaded:
-                uploaded.abort()
-            return str(e)
+            await self._call(uploaded.commit)
+            record_transfer("storj", "upload", size, time.perf_counter() - start)
+            info = await self._call(uploaded.info)
+            image = describe_image(info.get_dict())
+            profile_image_index.set(str(user_id), image)
+            if self.blob_cache:
+                self.blob_cache.invalidate_prefix(f"storj:{user_id}/")
 
-    async def get_user_profile_image(self) -> Union[str, None]:
-        try:
-            if not self.storj:
-                raise StorjException(
-                    "Failed to initialize Storj", 500, "storj not initialized"
-                )
+            return {"data": image, "error": None}
+        except (StorjException, BackendUnavailable, asyncio.TimeoutError) as e:
+            if uploaded:
+                try:
+                    await self._call(uploaded.abort, guard=False)
+                except StorjException:
+                    pass
+            await self._recover()
+            return {"data": None, "error": str(e)}
 
-            objects_list = self.storj.list_objects(
-                self.bucket_name, ListObjectsOptions(recursive=True, system=True)
-            )
+    async def _find_user_profile_image(self, user_id: str) -> dict:
+        image = profile_image_index.get(user_id)
+        if image is not None:
+            return image
 
-            # Find the image with the most recent creation time
-            most_recent_image = None
-            max_creation_time = 0
+        # Only the user's own prefix is listed, never the whole bucket, and
+        # not recursively so the derived/ images are left out.
+        project = await self._get_project()
+        objects_list = await self._call(
+            project.list_objects,
+            self.bucket_name,
+            ListObjectsOptions(prefix=f"{user_id}/", system=True),
+            idempotent=True,
+        )
 
-            for obj in objects_list:
-                creation_time = obj.get_dict().get("system", {}).get("created", 0)
-                if creation_time > max_creation_time:
-                    max_creation_time = creation_time
-                    most_recent_image = obj.get_dict()
+        # Find the image with the most recent creation time
+        image = {}
+        max_creation_time = 0
 
-            if most_recent_image:
-                image_key = most_recent_image["key"]
-                object_name = f"{image_key}"
-                print(f"object {object_name}")
+        for obj in objects_list:
+            obj_dict = obj.get_dict()
+            if obj_dict.get("is_prefix"):
+                continue
+            creation_time = obj_dict.get("system", {}).get("created", 0)
+            if creation_time > max_creation_time:
+                max_creation_time = creation_time
+                image = describe_image(obj_dict)
 
-                download = self.storj.download_object(self.bucket_name, object_name)
-                image_data_in_bytes = download.read(download.file_size())
-                image_data = base64.b64encode(image_data_in_bytes[0]).decode()
+        profile_image_index.set(user_id, image)
+        return image
 
-                return image_data
+    async def _find_derivative(self, user_id: str, image: dict, size: str) -> dict:
+        derivatives = image.setdefault("derivatives", {})
+        if size not in derivatives:
+            project = await self._get_project()
+            object_name = derivative_key(user_id, image["version"], size)
+            try:
+                obj = await self._call(
+                    project.stat_object, self.bucket_name, object_name, idempotent=True
+                )
+                derivatives[size] = describe_image(obj.get_dict(), size)
+            except ObjectNotFoundError:
+                # Not rendered (yet); serve the original meanwhile. Its
+                # variant is None, so it is not cached as the derivative.
+                derivatives[size] = {}
+        return derivatives[size] or image
 
-            return None  # Return None if no image found
+    async def get_user_profile_image(
+        self, user_id: str, size: Optional[str] = None
+    ) -> Union[dict, None]:
+        try:
+            image = await self._find_user_profile_image(str(user_id))
+            if image and size:
+                image = await self._find_derivative(str(user_id), image, size)
+            return image or None  # Return None if no image found
         except StorjException as storj_error:
+            await self._recover()
             raise storj_error
+        except BackendUnavailable:
+            await self._recover()
+            raise
         except Exception as e:
             raise StorjException(
                 f"An unexpected error occurred: {e}", 500, "unexpected error"
             )
+
+    async def upload_user_profile_derivatives(
+        self, user_id: str, version: str, derivatives: Dict[str, bytes]
+    ):
+        """Stores rendered derivatives next to the original image."""
+        project = await self._get_project()
+        described = {}
+        for size, data in derivatives.items():
+            object_name = derivative_key(user_id, version, size)
+            uploaded = await self._call(
+                project.upload_object, self.bucket_name, object_name
+            )
+            start = time.perf_counter()
+            try:
+                await self._call(uploaded.write, data, len(data))
+                await self._call(uploaded.commit)
+            except StorjException:
+                await self._call(uploaded.abort, guard=False)
+                raise
+            record_transfer("storj", "upload", len(data), time.perf_counter() - start)
+            info = await self._call(uploaded.info)
+            described[size] = describe_image(info.get_dict(), size)
+
+        image = profile_image_index.get(str(user_id))
+        if image and image["version"] == version:
+            image.setdefault("derivatives", {}).update(described)
+
+    async def stream_object(
+        self, user_id: str, image: dict, chunk_size: int = DOWNLOAD_CHUNK_SIZE
+    ) -> AsyncIterator[bytes]:
+        cache_key = f"storj:{image['key']}:{image['version']}"
+        blob = await self.blob_cache.get(cache_key) if self.blob_cache else None
+        if blob is not None:
+            try:
+                for start in range(0, len(blob), chunk_size):
+                    yield blob[start : start + chunk_size]
+            finally:
+                if isinstance(blob, mmap.mmap):
+                    blob.close()
+            return
+
+        try:
+            start = time.perf_counter()
+            project = await self._get_project()
+            download = await self._call(
+                project.download_object, self.bucket_name, image["key"], idempotent=True
+            )
+            try:
+                remaining = size = await self._call(download.file_size)
+                cacheable = self.blob_cache and remaining <= BLOB_CACHE_MAX_OBJECT_BYTES
+                chunks = []
+                while remaining > 0:
+                    chunk, read = await self._call(
+                        download.read, min(chunk_size, remaining)
+                    )
+                    if read == 0:
+                        break
+                    remaining -= read
+                    if cacheable:
+                        chunks.append(chunk)
+                    yield chunk
+            finally:
+                await self._call(download.close, guard=False)
+            # Includes the time the client took to take the chunks.
+            record_transfer(
+                "storj", "download", size - remaining, time.perf_counter() - start
+            )
+            if cacheable and remaining == 0:
+                await self.blob_cache.set(cache_key, b"".join(chunks))
+        except (StorjException, BackendUnavailable):
+            # The indexed key may be stale (e.g. deleted); relist next time.
+            profile_image_index.pop(str(user_id))
+            await self._recover()
+            raise
+
+
+def derivative_key(user_id: str, version: str, size: str) -> str:
+    return f"{user_id}/derived/{version}/{size}.{DERIVATIVE_FORMAT}"
+
+
+def describe_image(obj_dict: dict, variant: Optional[str] = None) -> dict:
+    # variant is the derivative size the object was rendered at; None for an
+    # original image.
+    key = obj_dict["key"]
+    system = obj_dict.get("system", {})
+    # Keys are overwritten in place on re-upload, so the version has to
+    # include the creation time to change with the content.
+    version = hashlib.sha256(f"{key}:{system.get('created', 0)}".encode()).hexdigest()
+    return {
+        "key": key,
+        "version": version[:32],
+        "size": system.get("content_length"),
+        "content_type": mimetypes.guess_type(key)[0] or "application/octet-stream",
+        "variant": variant,
+    }
@@ -1,15 +1,108 @@
+import mmap
 import os
+from typing import Any, Dict, List, Optional, Sequence, Union
 
+import httpx
 from dotenv import load_dotenv
+from postgrest import AsyncPostgrestClient
+from postgrest.utils import AsyncClient
 from supabase import Client, create_client
 
+from app.internal.blob_cache import BlobCache
+from app.internal.metrics import BackendTimer
+from app.internal.pagination import Page
+from app.internal.resilience import CircuitBreaker, guarded_call
+from app.internal.write_batcher import WRITE_BATCHING, WriteBatcher
+
 load_dotenv()
 
+SUPABASE_MAX_CONNECTIONS = int(os.environ.get("SUPABASE_MAX_CONNECTIONS", 100))
+SUPABASE_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.environ.get("SUPABASE_MAX_KEEPALIVE_CONNECTIONS", 20)
+)
+SUPABASE_KEEPALIVE_EXPIRY = float(os.environ.get("SUPABASE_KEEPALIVE_EXPIRY", 30.0))
+SUPABASE_TIMEOUT = float(os.environ.get("SUPABASE_TIMEOUT", 10.0))
+SUPABASE_CALL_TIMEOUT = float(os.environ.get("SUPABASE_CALL_TIMEOUT", 5.0))
+SUPABASE_READ_RETRIES = int(os.environ.get("SUPABASE_READ_RETRIES", 2))
+
+
+class PostgrestUnavailable(Exception):
+    """PostgREST, or a proxy in front of it, answered with a 5xx status."""
+
+    def __init__(self, status_code: int, body: str):
+        super().__init__(f"PostgREST answered {status_code}: {body[:200]}")
+        self.status_code = status_code
+
+
+# Errors that say PostgREST could not be reached, could not reach the
+# database or did not answer in time. Other error responses come back as
+# APIError and are not retried.
+SUPABASE_TRANSIENT_ERRORS = (httpx.TransportError, PostgrestUnavailable)
+# PostgREST request method -> operation label of the backend call metrics.
+POSTGREST_OPERATIONS = {
+    "GET": "select",
+    "POST": "insert",
+    "PATCH": "update",
+    "DELETE": "delete",
+}
+
+
+def get_pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=SUPABASE_MAX_CONNECTIONS,
+        max_keepalive_connections=SUPABASE_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=SUPABASE_KEEPALIVE_EXPIRY,
+    )
+
+
+async def raise_for_server_error(response: httpx.Response):
+    # postgrest raises APIError for every error status, and for JSON bodies
+    # the status is lost; tell server errors apart before it reads them.
+    if response.status_code >= 500:
+        await response.aread()
+        raise PostgrestUnavailable(response.status_code, response.text)
+
+
+class PooledPostgrestClient(AsyncPostgrestClient):
+    """Async PostgREST client whose session keeps a bounded keep-alive pool."""
+
+    def __init__(self, base_url: str, limits: httpx.Limits, **kwargs):
+        self.limits = limits
+        super().__init__(base_url, **kwargs)
+
+    def create_session(
+        self,
+        base_url: str,
+        headers: Dict[str, str],
+        timeout: Union[int, float, httpx.Timeout],
+    ) -> AsyncClient:
+        return AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            limits=self.limits,
+            event_hooks={"response": [raise_for_server_error]},
+        )
+
 
 class SupabaseClient:
-    def __init__(self):
+    def __init__(
+        self,
+        limits: Optional[httpx.Limits] = None,
+        blob_cache: Optional[BlobCache] = None,
+        write_batching: bool = WRITE_BATCHING,
+    ):
+        self.limits = limits or get_pool_limits()
         self.client = self.get_supabase_client()
+        self.postgrest = self.get_postgrest_client(self.limits)
         self.bucket_name = "profile"
+        self.blob_cache = blob_cache
+        self.breaker = CircuitBreaker("supabase")
+        # Why the last health check failed, or None if it passed.
+        self.health_error: Optional[str] = None
+        self.write_batcher = (
+            WriteBatcher(self.postgrest, self.execute) if write_batching else None
+        )
 
     @staticmethod
     def get_supabase_client() -> Client:
@@ -19,11 +112,119 @@ class SupabaseClient:
         supabase: Client = create_client(url, key)
         return supabase
 
+    @staticmethod
+    def get_postgrest_client(limits: httpx.Limits) -> PooledPostgrestClient:
+        url: str = os.environ.get("SUPABASE_URL")
+        key: str = os.environ.get("SUPABASE_KEY")
+
+        return PooledPostgrestClient(
+            f"{url}/rest/v1",
+            limits=limits,
+            headers={"apiKey": key, "Authorization": f"Bearer {key}"},
+            timeout=SUPABASE_TIMEOUT,
+        )
+
+    async def execute(self, query, idempotent: bool = False):
+        """Executes a postgrest request under the deadline and the breaker.
+
+        Reads should pass ``idempotent=True`` so that transient failures
+        are retried; writes are never retried.
+        """
+        table = query.path.lstrip("/")
+        operation = POSTGREST_OPERATIONS.get(query.http_method, query.http_method)
+        with BackendTimer("supabase", table, operation):
+            return await guarded_call(
+                self.breaker,
+                query.execute,
+                SUPABASE_CALL_TIMEOUT,
+                SUPABASE_TRANSIENT_ERRORS,
+                idempotent=idempotent,
+                retries=SUPABASE_READ_RETRIES,
+            )
+
+    async def insert_row(self, table: str, row: dict) -> dict:
+        """Inserts one row and returns it as stored.
+
+        With write batching on, the row may share a statement with rows that
+        concurrent requests insert into the same table.
+        """
+        if self.write_batcher:
+            return await self.write_batcher.insert(table, row)
+
+        return (await self.insert(table, [row]))[0]
+
+    async def insert(self, table: str, rows: Sequence[dict]) -> List[dict]:
+        response = await self.execute(self.postgrest.table(table).insert(list(rows)))
+        return response.data
+
+    async def select(
+        self,
+        table: str,
+        columns: Sequence[str],
+        filters: Dict[str, Any],
+        page: Optional[Page] = None,
+        limit: Optional[int] = None,
+    ) -> List[dict]:
+        """Rows of ``table`` whose columns equal ``filters``.
+
+        With a ``page``, its keyset range, order and limit are applied; the
+        caller turns the rows into a page with ``page.result``.
+        """
+        query = self.postgrest.table(table).select(*columns)
+        for column, value in filters.items():
+            query = query.eq(column, value)
+        if page:
+            query = page.apply(query)
+        elif limit:
+            query = query.limit(limit)
+        response = await self.execute(query, idempotent=True)
+        return response.data
+
+    async def update(
+        self, table: str, values: dict, filters: Dict[str, Any]
+    ) -> List[dict]:
+        query = self.postgrest.table(table).update(values)
+        for column, value in filters.items():
+            query = query.eq(column, value)
+        response = await self.execute(query)
+        return response.data
+
+    async def check_health(self) -> bool:
+        """Reads one user id, which also opens a pooled connection."""
+        try:
+            await self.select("users", ["id"], {}, limit=1)
+            self.health_error = None
+            return True
+        except Exception as e:
+            self.health_error = f"{type(e).__name__}: {e}"
+            return False
+
+    def pool_stats(self) -> dict:
+        # httpx does not expose its pool; httpcore's connection list is public.
+        pool = getattr(
+            getattr(self.postgrest.session, "_transport", None), "_pool", None
+        )
+        connections = list(getattr(pool, "connections", []))
+        return {
+            "size": len(connections),
+            "idle": sum(connection.is_idle() for connection in connections),
+            "max_size": self.limits.max_connections,
+        }
+
+    async def aclose(self):
+        if self.write_batcher:
+            await self.write_batcher.aclose()
+        await self.postgrest.aclose()
+        if self.client._storage is not None:
+            self.client._storage.aclose()
+
     async def upload_image_to_storage(
         self, user_id: str, file_data: bytes, file_format: str
     ):
         file_name = f"{user_id}.{file_format}"
         file_path = f"{user_id}/{file_name}"
+        if self.blob_cache:
+            self.blob_cache.invalidate_prefix(f"supabase:{user_id}/")
 
         try:
             content_type = (
@@ -63,8 +264,18 @@ class SupabaseClient:
     ) -> (bytes, None) or (None, str):
         try:
             file_path = f"{user_id}/{user_id}.png"
+            cache_key = f"supabase:{file_path}"
+
+            cached = await self.blob_cache.get(cache_key) if self.blob_cache else None
+            if cached is not None:
+                data = bytes(cached)
+                if isinstance(cached, mmap.mmap):
+                    cached.close()
+                return data, None
 
             response = self.client.storage.from_(self.bucket_name).download(file_path)
+            if self.blob_cache:
+                await self.blob_cache.set(cache_key, response)
 
             return response, None
         except Exception as e:
@@ -1,8 +1,14 @@
 from datetime import datetime
+from typing import Optional
 
 from pydantic import BaseModel
 
-from app.internal.supadb import SupabaseClient
+from app.internal.database import Database
+from app.internal.pagination import Page
+from app.internal.resilience import BackendUnavailable
+
+TRIP_COLUMNS = ("id", "user_id", "title", "start_date", "end_date")
+TRIP_PAGE_KEYS = ("start_date", "id")
 
 
 class Trip(BaseModel):
@@ -11,42 +17,51 @@ class Trip(BaseModel):
     end_date: str
 
 
+class TripRow(BaseModel):
+    """A ``trips`` row; a ``fields`` projection leaves the rest None."""
+
+    id: Optional[int] = None
+    user_id: Optional[int] = None
+    title: Optional[str] = None
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+
+
 class TripQueries:
-    def __init__(self, supabase_client: SupabaseClient):
-        self.supabase_client = supabase_client
+    def __init__(self, db: Database):
+        self.db = db
 
-    def create_trip(self, trip: Trip, user_id: int) -> dict:
+    async def create_trip(self, trip: Trip, user_id: int) -> dict:
         try:
             start_date = datetime.strptime(trip.start_date, "%Y-%m-%d").date()
             end_date = datetime.strptime(trip.end_date, "%Y-%m-%d").date()
 
-            data, count = (
-                self.supabase_client.client.table("trips")
-                .insert(
-                    [
-                        {
-                            "user_id": user_id,
-                            "title": trip.title,
-                            "start_date": start_date.isoformat(),
-                            "end_date": end_date.isoformat(),
-                        }
-                    ]
-                )
-                .execute()
+            data = await self.db.insert(
+                "trips",
+                [
+                    {
+                        "user_id": user_id,
+                        "title": trip.title,
+                        "start_date": start_date.isoformat(),
+                        "end_date": end_date.isoformat(),
+                    }
+                ],
             )
 
             return {"data": data, "error": None}
+        except BackendUnavailable:
+            raise
         except Exception as e:
             return {"data": None, "error": str(e)}
 
-    def get_user_trips(self, user_id: int):
+    async def get_user_trips(self, user_id: int, page: Optional[Page] = None):
+        page = page or Page(TRIP_COLUMNS, TRIP_PAGE_KEYS)
         try:
-            response = (
-                self.supabase_client.client.table("trips")
-                .select("*")
-                .eq("user_id", user_id)
-                .execute()
+            rows = await self.db.select(
+                "trips", page.columns, {"user_id": user_id}, page=page
             )
-            return {"data": response, "error": None}
+            return {"data": page.result(rows), "error": None}
+        except BackendUnavailable:
+            raise
         except Exception as e:
             return {"data": None, "error": e}
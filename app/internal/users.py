@@ -1,7 +1,14 @@
-import hashlib
+from typing import Optional
 
 from pydantic import BaseModel
-from app.internal.supadb import SupabaseClient
+
+from app.internal.database import Database
+from app.internal.pagination import Page
+from app.internal.resilience import BackendUnavailable
+
+# The password hash is deliberately not listable.
+USER_COLUMNS = ("id", "username", "email")
+USER_PAGE_KEYS = ("id",)
 
 
 class User(BaseModel):
@@ -11,56 +18,65 @@ class User(BaseModel):
 
 
 class UserQueries:
-    def __init__(self, supabase_client: SupabaseClient):
-        self.supabase_client = supabase_client
-
-    def _hash_password(self, password: str) -> str:
-        return hashlib.sha256(password.encode("utf-8")).hexdigest()
+    def __init__(self, db: Database):
+        self.db = db
 
-    def verify_password(
-        self, entered_password: str, stored_hashed_password: str
-    ) -> bool:
-        return self._hash_password(entered_password) == stored_hashed_password
-
-    def register_user(self, user: User) -> dict:
+    async def register_user(self, user: User, password_hash: str) -> dict:
         try:
-            data, count = (
-                self.supabase_client.client.table("users")
-                .insert(
-                    [
-                        {
-                            "username": user.username,
-                            "email": user.email,
-                            "password": self._hash_password(user.password),
-                        }
-                    ]
-                )
-                .execute()
+            data = await self.db.insert(
+                "users",
+                [
+                    {
+                        "username": user.username,
+                        "email": user.email,
+                        "password": password_hash,
+                    }
+                ],
             )
 
             return {"data": data, "error": None}
+        except BackendUnavailable:
+            raise
         except Exception as e:
             return {"data": None, "error": str(e)}
 
-    def get_users(self):
+    async def get_users(self, page: Optional[Page] = None):
+        page = page or Page(USER_COLUMNS, USER_PAGE_KEYS)
+        try:
+            rows = await self.db.select("users", page.columns, {}, page=page)
+            return {"data": page.result(rows), "error": None}
+        except BackendUnavailable:
+            raise
+        except Exception as e:
+            return {"data": None, "error": e}
+
+    async def get_user(self, email: str):
+        try:
+            rows = await self.db.select("users", ["*"], {"email": email})
+            return {"data": rows, "error": None}
+        except BackendUnavailable:
+            raise
+        except Exception as e:
+            return {"data": None, "error": e}
+
+    async def get_identity(self, email: str):
         try:
-            response = (
-                self.supabase_client.client.table("users")
-                .select("username", "email")
-                .execute()
+            rows = await self.db.select(
+                "users", ["id", "username"], {"email": email}, limit=1
             )
-            return {"data": response, "error": None}
+            return {"data": rows, "error": None}
+        except BackendUnavailable:
+            raise
         except Exception as e:
             return {"data": None, "error": e}
 
-    def get_user(self, email: str):
+    async def update_password_hash(self, user_id: int, password_hash: str):
         try:
-            response = (
-                self.supabase_client.client.table("users")
-                .select("*")
-                .eq("email", email)
-                .execute()
+            rows = await self.db.update(
+                "users", {"password": password_hash}, {"id": user_id}
             )
-            return {"data": response, "error": None}
+            return {"data": rows, "error": None}
+        except BackendUnavailable:
+            raise
         except Exception as e:
             return {"data": None, "error": e}
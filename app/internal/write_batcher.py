@@ -0,0 +1,109 @@
+import asyncio
+import contextvars
+import os
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from postgrest import AsyncPostgrestClient
+from postgrest.exceptions import APIError
+
+WRITE_BATCHING = os.environ.get("WRITE_BATCHING", "false").lower() == "true"
+WRITE_BATCH_MAX_DELAY = float(os.environ.get("WRITE_BATCH_MAX_DELAY", 0.005))
+WRITE_BATCH_MAX_SIZE = int(os.environ.get("WRITE_BATCH_MAX_SIZE", 100))
+
+Pending = List[Tuple[dict, asyncio.Future]]
+
+
+class IncompleteInsert(Exception):
+    def __init__(self, table: str, sent: int, returned: int):
+        super().__init__(
+            f"Insert into {table} returned {returned} of {sent} rows; "
+            "the missing ones may or may not be stored"
+        )
+
+
+class WriteBatcher:
+    """Coalesces concurrent single-row inserts into multi-row inserts.
+
+    Rows for the same table are held for at most ``max_delay`` seconds, or
+    until ``max_size`` of them are waiting, and then sent as one statement.
+    Every caller gets back its own inserted row. When PostgREST rejects the
+    statement, the rows are retried one by one so that only the callers
+    whose rows are rejected see an error; any other failure is passed to
+    every caller, since the statement may have been applied.
+    """
+
+    def __init__(
+        self,
+        postgrest: AsyncPostgrestClient,
+        execute: Optional[Callable[..., Awaitable]] = None,
+        max_delay: float = WRITE_BATCH_MAX_DELAY,
+        max_size: int = WRITE_BATCH_MAX_SIZE,
+    ):
+        self.postgrest = postgrest
+        self.execute = execute or (lambda query: query.execute())
+        self.max_delay = max_delay
+        self.max_size = max_size
+        self._pending: Dict[str, Pending] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._sending: Set[asyncio.Task] = set()
+
+    async def insert(self, table: str, row: dict) -> dict:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(table, [])
+        pending.append((row, future))
+
+        if len(pending) >= self.max_size:
+            self._flush(table)
+        elif len(pending) == 1:
+            self._timers[table] = loop.call_later(self.max_delay, self._flush, table)
+        return await future
+
+    def _flush(self, table: str):
+        timer = self._timers.pop(table, None)
+        if timer:
+            timer.cancel()
+
+        batch = self._pending.pop(table, None)
+        if batch:
+            # In an empty context, so that the statement is not held to the
+            # deadline of whichever request filled the batch. Tasks only
+            # take a context argument from Python 3.11 on.
+            task = contextvars.Context().run(
+                asyncio.ensure_future, self._send(table, batch)
+            )
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(self, table: str, batch: Pending):
+        try:
+            response = await self.execute(
+                self.postgrest.table(table).insert([row for row, _ in batch])
+            )
+        except APIError as e:
+            if len(batch) > 1:
+                await asyncio.gather(*(self._send(table, [item]) for item in batch))
+            elif not batch[0][1].done():
+                batch[0][1].set_exception(e)
+            return
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        # PostgREST returns the inserted rows in the order they were sent.
+        for (_, future), inserted in zip(batch, response.data):
+            if not future.done():
+                future.set_result(inserted)
+        # Callers left without a row would otherwise wait until their deadline.
+        missing = IncompleteInsert(table, len(batch), len(response.data))
+        for _, future in batch[len(response.data) :]:
+            if not future.done():
+                future.set_exception(missing)
+
+    async def aclose(self):
+        for table in list(self._pending):
+            self._flush(table)
+        if self._sending:
+            await asyncio.gather(*self._sending, return_exceptions=True)
@@ -1,10 +1,71 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+
+from app.internal.admission import AdmissionController, AdmissionMiddleware
+from app.internal.blob_cache import BlobCache
+from app.internal.database import create_database
+from app.internal.health import HealthMonitor, warm_up
+from app.internal.images import ImagePipeline
+from app.internal.metrics import (MetricsMiddleware, register_app_state,
+                                  unregister_app_state)
+from app.internal.passwords import PasswordHasher
+from app.internal.profiling import ProfilingMiddleware, TimedORJSONResponse
+from app.internal.resilience import BackendUnavailable, DeadlineMiddleware
+from app.internal.response_cache import ResponseCache
+from app.internal.storj import StorjClient
+from app.internal.supadb import SupabaseClient
+from app.routers import (flight_bookings, health, hotel_bookings, itinerary,
+                         metrics, trips, users)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.blob_cache = BlobCache()
+    app.state.database = create_database(blob_cache=app.state.blob_cache)
+    # Only the PostgREST backend talks to Supabase.
+    app.state.supabase_client = (
+        app.state.database if isinstance(app.state.database, SupabaseClient) else None
+    )
+    app.state.storj_client = StorjClient(blob_cache=app.state.blob_cache)
+    app.state.image_pipeline = ImagePipeline()
+    app.state.response_cache = ResponseCache()
+    app.state.password_hasher = PasswordHasher()
+    app.state.health_monitor = HealthMonitor(app.state)
+    metrics_collector = register_app_state(app.state)
+    # The server accepts connections only once startup has finished.
+    await warm_up(app.state)
+    yield
+    unregister_app_state(metrics_collector)
+    app.state.password_hasher.close()
+    await app.state.response_cache.aclose()
+    app.state.image_pipeline.close()
+    await app.state.storj_client.aclose()
+    await app.state.database.aclose()
+    app.state.blob_cache.close()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=TimedORJSONResponse)
+
+
+@app.exception_handler(BackendUnavailable)
+async def backend_unavailable(request: Request, exc: BackendUnavailable):
+    # Open circuits and spent deadlines are answered fast, so clients back
+    # off rather than treating them as server bugs.
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
-from app.routers import (flight_bookings, hotel_bookings, itinerary, trips,
-                         users)
 
-app = FastAPI()
+# Added before CORS so that CORS wraps it and 503s still carry CORS headers.
+app.state.admission = AdmissionController()
+app.add_middleware(AdmissionMiddleware, controller=app.state.admission)
+# Outside admission control, so time spent queued counts against the budget.
+app.add_middleware(DeadlineMiddleware)
 
 origins = [
     "http://localhost",
@@ -18,9 +79,14 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so requests shed by admission control are measured too.
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(users.router)
 app.include_router(trips.router)
 app.include_router(itinerary.router)
 app.include_router(hotel_bookings.router)
 app.include_router(flight_bookings.router)
+app.include_router(metrics.router)
+app.include_router(health.router)
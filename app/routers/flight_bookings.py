@@ -1,13 +1,25 @@
-import json
+import functools
+from typing import List, Optional
 
+import orjson
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.requests import Request
 from fastapi.responses import JSONResponse
-from pydantic import ValidationError
+from pydantic import BaseModel, ValidationError
 
-from app.dependencies import get_current_user
-from app.internal.flight_bookings import FlightBookingQueries, FlightBookings
-from app.internal.supadb import SupabaseClient
+from app.dependencies import (get_current_user, get_database, get_page,
+                              get_response_cache)
+from app.internal.batch import (BatchResult, BatchTooLarge, batch_ids,
+                                build_rows)
+from app.internal.database import Database
+from app.internal.flight_bookings import (FLIGHT_BOOKING_COLUMNS,
+                                          FLIGHT_BOOKING_PAGE_KEYS,
+                                          FlightBookingQueries,
+                                          FlightBookingRow, FlightBookings,
+                                          flight_booking_row)
+from app.internal.http_cache import conditional_response
+from app.internal.pagination import Page, PageResponse
+from app.internal.response_cache import ResponseCache
 
 router = APIRouter(
     prefix="/api/v1",
@@ -17,27 +29,38 @@ router = APIRouter(
 )
 
 
-def get_fb_queries() -> FlightBookingQueries:
-    return FlightBookingQueries(SupabaseClient())
+def get_fb_queries(
+    db: Database = Depends(get_database),
+) -> FlightBookingQueries:
+    return FlightBookingQueries(db)
 
 
-@router.post("/protected/{trip_id}/flight-bookings")
+class FlightBookingCreated(BaseModel):
+    flight_booking_id: int
+    message: str
+
+
+class FlightBookingBatchCreated(BatchResult):
+    flight_booking_ids: List[Optional[int]]
+
+
+@router.post(
+    "/protected/{trip_id}/flight-bookings", response_model=FlightBookingCreated
+)
 async def create_trip_flight_booking(
     request: Request,
     trip_id,
     hb_queries: FlightBookingQueries = Depends(get_fb_queries),
+    cache: ResponseCache = Depends(get_response_cache),
 ):
     try:
-        request_body = await request.body()
-        request_data = request_body.decode("utf-8")
-
-        fb_data = json.loads(request_data)
-        validated_fb = FlightBookings.model_validate(fb_data)
+        validated_fb = FlightBookings.model_validate_json(await request.body())
 
-        result = hb_queries.create_trip_flight_booking(validated_fb, trip_id)
+        result = await hb_queries.create_trip_flight_booking(validated_fb, trip_id)
         if result["error"]:
             handle_error(result["error"], "error creating flight booking for trip")
-        fb_id = result["data"][1][0]["id"]
+        await cache.invalidate("flight_bookings", trip_id)
+        fb_id = result["data"]["id"]
         return {
             "flight_booking_id": fb_id,
             "message": "Flight Booking created successfully",
@@ -46,14 +69,66 @@ async def create_trip_flight_booking(
         return JSONResponse(content={"detail": str(e)}, status_code=400)
 
 
-@router.get("/protected/{trip_id}/flight-bookings")
+@router.post(
+    "/protected/{trip_id}/flight-bookings:batch",
+    response_model=FlightBookingBatchCreated,
+)
+async def create_trip_flight_bookings(
+    request: Request,
+    trip_id,
+    hb_queries: FlightBookingQueries = Depends(get_fb_queries),
+    cache: ResponseCache = Depends(get_response_cache),
+):
+    try:
+        items = orjson.loads(await request.body())
+        positions, rows, errors = build_rows(
+            items,
+            FlightBookings,
+            functools.partial(flight_booking_row, trip_id=trip_id),
+        )
+    except BatchTooLarge as e:
+        return JSONResponse(content={"detail": str(e)}, status_code=413)
+    except ValueError as e:
+        return JSONResponse(content={"detail": str(e)}, status_code=400)
+
+    if not rows:
+        return JSONResponse(content={"detail": errors}, status_code=400)
+
+    try:
+        result = await hb_queries.create_trip_flight_bookings(rows)
+        if result["error"]:
+            handle_error(result["error"], "error creating flight bookings for trip")
+    finally:
+        # Also after an error: the write may have committed even though its
+        # response was lost.
+        await cache.invalidate("flight_bookings", trip_id)
+    return {
+        "flight_booking_ids": batch_ids(len(items), positions, result["data"]),
+        "errors": errors,
+        "message": f"{len(rows)} Flight Bookings created successfully",
+    }
+
+
+@router.get(
+    "/protected/{trip_id}/flight-bookings",
+    response_model=PageResponse[FlightBookingRow],
+)
 async def get_trip_flight_bookings(
-    trip_id, fb_queries: FlightBookingQueries = Depends(get_fb_queries)
+    request: Request,
+    trip_id,
+    page: Page = Depends(get_page(FLIGHT_BOOKING_COLUMNS, FLIGHT_BOOKING_PAGE_KEYS)),
+    fb_queries: FlightBookingQueries = Depends(get_fb_queries),
+    cache: ResponseCache = Depends(get_response_cache),
 ):
-    result = fb_queries.get_trip_flight_bookings(trip_id)
+    result = await cache.get_or_load(
+        "flight_bookings",
+        trip_id,
+        page.cache_key(),
+        lambda: fb_queries.get_trip_flight_bookings(trip_id, page),
+    )
     if result["error"]:
         handle_error(result["error"], "error getting trip's flight bookings")
-    return result["data"]
+    return conditional_response(request, result["data"], result["etag"])
 
 
 def handle_error(error, error_message):
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends, Response, status
+
+from app.dependencies import get_health_monitor
+from app.internal.health import HealthMonitor
+
+router = APIRouter(prefix="/health", tags=["health"])
+
+
+@router.get("/live", include_in_schema=False)
+async def live():
+    # Answering at all shows the worker's event loop is running.
+    return {"status": "alive"}
+
+
+@router.get("/ready", include_in_schema=False)
+async def ready(
+    response: Response, monitor: HealthMonitor = Depends(get_health_monitor)
+):
+    report = await monitor.report()
+    if not report["ready"]:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return report
@@ -1,13 +1,24 @@
-import json
+import functools
+from typing import List, Optional
 
+import orjson
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.requests import Request
 from fastapi.responses import JSONResponse
-from pydantic import ValidationError
+from pydantic import BaseModel, ValidationError
 
-from app.dependencies import get_current_user
-from app.internal.hotel_bookings import HotelBookingQueries, HotelBookings
-from app.internal.supadb import SupabaseClient
+from app.dependencies import (get_current_user, get_database, get_page,
+                              get_response_cache)
+from app.internal.batch import (BatchResult, BatchTooLarge, batch_ids,
+                                build_rows)
+from app.internal.database import Database
+from app.internal.hotel_bookings import (HOTEL_BOOKING_COLUMNS,
+                                         HOTEL_BOOKING_PAGE_KEYS,
+                                         HotelBookingQueries, HotelBookingRow,
+                                         HotelBookings, hotel_booking_row)
+from app.internal.http_cache import conditional_response
+from app.internal.pagination import Page, PageResponse
+from app.internal.response_cache import ResponseCache
 
 router = APIRouter(
     prefix="/api/v1",
@@ -17,27 +28,36 @@ router = APIRouter(
 )
 
 
-def get_hb_queries() -> HotelBookingQueries:
-    return HotelBookingQueries(SupabaseClient())
+def get_hb_queries(
+    db: Database = Depends(get_database),
+) -> HotelBookingQueries:
+    return HotelBookingQueries(db)
 
 
-@router.post("/protected/{trip_id}/hotel-bookings")
+class HotelBookingCreated(BaseModel):
+    hotel_booking_id: int
+    message: str
+
+
+class HotelBookingBatchCreated(BatchResult):
+    hotel_booking_ids: List[Optional[int]]
+
+
+@router.post("/protected/{trip_id}/hotel-bookings", response_model=HotelBookingCreated)
 async def create_trip_hotel_booking(
     request: Request,
     trip_id,
     hb_queries: HotelBookingQueries = Depends(get_hb_queries),
+    cache: ResponseCache = Depends(get_response_cache),
 ):
     try:
-        request_body = await request.body()
-        request_data = request_body.decode("utf-8")
-
-        hb_data = json.loads(request_data)
-        validated_hb = HotelBookings.model_validate(hb_data)
+        validated_hb = HotelBookings.model_validate_json(await request.body())
 
-        result = hb_queries.create_trip_hotel_booking(validated_hb, trip_id)
+        result = await hb_queries.create_trip_hotel_booking(validated_hb, trip_id)
         if result["error"]:
             handle_error(result["error"], "error creating hotel booking")
-        hb_id = result["data"][1][0]["id"]
+        await cache.invalidate("hotel_bookings", trip_id)
+        hb_id = result["data"]["id"]
         return {
             "hotel_booking_id": hb_id,
             "message": "Hotel Booking created successfully",
@@ -46,14 +66,62 @@ async def create_trip_hotel_booking(
         return JSONResponse(content={"detail": str(e)}, status_code=400)
 
 
-@router.get("/protected/{trip_id}/hotel-bookings")
+@router.post(
+    "/protected/{trip_id}/hotel-bookings:batch", response_model=HotelBookingBatchCreated
+)
+async def create_trip_hotel_bookings(
+    request: Request,
+    trip_id,
+    hb_queries: HotelBookingQueries = Depends(get_hb_queries),
+    cache: ResponseCache = Depends(get_response_cache),
+):
+    try:
+        items = orjson.loads(await request.body())
+        positions, rows, errors = build_rows(
+            items, HotelBookings, functools.partial(hotel_booking_row, trip_id=trip_id)
+        )
+    except BatchTooLarge as e:
+        return JSONResponse(content={"detail": str(e)}, status_code=413)
+    except ValueError as e:
+        return JSONResponse(content={"detail": str(e)}, status_code=400)
+
+    if not rows:
+        return JSONResponse(content={"detail": errors}, status_code=400)
+
+    try:
+        result = await hb_queries.create_trip_hotel_bookings(rows)
+        if result["error"]:
+            handle_error(result["error"], "error creating hotel bookings")
+    finally:
+        # Also after an error: the write may have committed even though its
+        # response was lost.
+        await cache.invalidate("hotel_bookings", trip_id)
+    return {
+        "hotel_booking_ids": batch_ids(len(items), positions, result["data"]),
+        "errors": errors,
+        "message": f"{len(rows)} Hotel Bookings created successfully",
+    }
+
+
+@router.get(
+    "/protected/{trip_id}/hotel-bookings", response_model=PageResponse[HotelBookingRow]
+)
 async def get_trip_hotel_bookings(
-    trip_id, hb_queries: HotelBookingQueries = Depends(get_hb_queries)
+    request: Request,
+    trip_id,
+    page: Page = Depends(get_page(HOTEL_BOOKING_COLUMNS, HOTEL_BOOKING_PAGE_KEYS)),
+    hb_queries: HotelBookingQueries = Depends(get_hb_queries),
+    cache: ResponseCache = Depends(get_response_cache),
 ):
-    result = hb_queries.get_trip_hotel_bookings(trip_id)
+    result = await cache.get_or_load(
+        "hotel_bookings",
+        trip_id,
+        page.cache_key(),
+        lambda: hb_queries.get_trip_hotel_bookings(trip_id, page),
+    )
     if result["error"]:
         handle_error(result["error"], "error getting trip's hotel bookings")
-    return result["data"]
+    return conditional_response(request, result["data"], result["etag"])
 
 
 def handle_error(error, error_message):
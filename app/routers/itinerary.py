@@ -1,13 +1,23 @@
-import json
+import functools
+from typing import List, Optional
 
+import orjson
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.requests import Request
 from fastapi.responses import JSONResponse
-from pydantic import ValidationError
+from pydantic import BaseModel, ValidationError
 
-from app.dependencies import get_current_user
-from app.internal.itinerary import Itinerary, ItineraryQueries
-from app.internal.supadb import SupabaseClient
+from app.dependencies import (get_current_user, get_database, get_page,
+                              get_response_cache)
+from app.internal.batch import (BatchResult, BatchTooLarge, batch_ids,
+                                build_rows)
+from app.internal.database import Database
+from app.internal.http_cache import conditional_response
+from app.internal.itinerary import (ITINERARY_COLUMNS, ITINERARY_PAGE_KEYS,
+                                    Itinerary, ItineraryQueries, ItineraryRow,
+                                    itinerary_row)
+from app.internal.pagination import Page, PageResponse
+from app.internal.response_cache import ResponseCache
 
 router = APIRouter(
     prefix="/api/v1",
@@ -17,41 +27,95 @@ router = APIRouter(
 )
 
 
-def get_itinerary_queries() -> ItineraryQueries:
-    return ItineraryQueries(SupabaseClient())
+def get_itinerary_queries(
+    db: Database = Depends(get_database),
+) -> ItineraryQueries:
+    return ItineraryQueries(db)
 
 
-@router.post("/protected/{trip_id}/itinerary")
+class ItineraryCreated(BaseModel):
+    itinerary_id: int
+    message: str
+
+
+class ItineraryBatchCreated(BatchResult):
+    itinerary_ids: List[Optional[int]]
+
+
+@router.post("/protected/{trip_id}/itinerary", response_model=ItineraryCreated)
 async def create_itinerary(
     request: Request,
     trip_id,
     it_queries: ItineraryQueries = Depends(get_itinerary_queries),
+    cache: ResponseCache = Depends(get_response_cache),
 ):
     try:
-        request_body = await request.body()
-        request_data = request_body.decode("utf-8")
-
-        itinerary_data = json.loads(request_data)
-
-        validated_itinerary = Itinerary.model_validate(itinerary_data)
+        validated_itinerary = Itinerary.model_validate_json(await request.body())
 
-        result = it_queries.create_itinerary(validated_itinerary, trip_id)
+        result = await it_queries.create_itinerary(validated_itinerary, trip_id)
         if result["error"]:
             handle_error(result["error"], "error creating itinerary")
-        it_id = result["data"][1][0]["id"]
+        await cache.invalidate("itinerary", trip_id)
+        it_id = result["data"]["id"]
         return {"itinerary_id": it_id, "message": "Itinerary created successfully"}
     except ValidationError as e:
         return JSONResponse(content={"detail": str(e)}, status_code=400)
 
 
-@router.get("/protected/{trip_id}/itinerary")
+@router.post(
+    "/protected/{trip_id}/itinerary:batch", response_model=ItineraryBatchCreated
+)
+async def create_itineraries(
+    request: Request,
+    trip_id,
+    it_queries: ItineraryQueries = Depends(get_itinerary_queries),
+    cache: ResponseCache = Depends(get_response_cache),
+):
+    try:
+        items = orjson.loads(await request.body())
+        positions, rows, errors = build_rows(
+            items, Itinerary, functools.partial(itinerary_row, trip_id=trip_id)
+        )
+    except BatchTooLarge as e:
+        return JSONResponse(content={"detail": str(e)}, status_code=413)
+    except ValueError as e:
+        return JSONResponse(content={"detail": str(e)}, status_code=400)
+
+    if not rows:
+        return JSONResponse(content={"detail": errors}, status_code=400)
+
+    try:
+        result = await it_queries.create_itineraries(rows)
+        if result["error"]:
+            handle_error(result["error"], "error creating itineraries")
+    finally:
+        # Also after an error: the write may have committed even though its
+        # response was lost.
+        await cache.invalidate("itinerary", trip_id)
+    return {
+        "itinerary_ids": batch_ids(len(items), positions, result["data"]),
+        "errors": errors,
+        "message": f"{len(rows)} Itinerary items created successfully",
+    }
+
+
+@router.get("/protected/{trip_id}/itinerary", response_model=PageResponse[ItineraryRow])
 async def get_trip_itineraries(
-    trip_id, it_queries: ItineraryQueries = Depends(get_itinerary_queries)
+    request: Request,
+    trip_id,
+    page: Page = Depends(get_page(ITINERARY_COLUMNS, ITINERARY_PAGE_KEYS)),
+    it_queries: ItineraryQueries = Depends(get_itinerary_queries),
+    cache: ResponseCache = Depends(get_response_cache),
 ):
-    result = it_queries.get_trip_itineraries(trip_id)
+    result = await cache.get_or_load(
+        "itinerary",
+        trip_id,
+        page.cache_key(),
+        lambda: it_queries.get_trip_itineraries(trip_id, page),
+    )
     if result["error"]:
         handle_error(result["error"], "error getting itinerary")
-    return result["data"]
+    return conditional_response(request, result["data"], result["etag"])
 
 
 def handle_error(error, error_message):
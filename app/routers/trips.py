@@ -1,14 +1,28 @@
-import json
+import asyncio
+from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.requests import Request
 from fastapi.responses import JSONResponse
-from pydantic import ValidationError
-
-from app.dependencies import get_current_user
-from app.internal.supadb import SupabaseClient
-from app.internal.trips import Trip, TripQueries
-from app.internal.users import UserQueries
+from pydantic import BaseModel, ValidationError
+
+from app.dependencies import (get_current_identity, get_current_user,
+                              get_database, get_page, get_response_cache)
+from app.internal.database import Database
+from app.internal.flight_bookings import (FLIGHT_BOOKING_COLUMNS,
+                                          FLIGHT_BOOKING_PAGE_KEYS,
+                                          FlightBookingQueries,
+                                          FlightBookingRow)
+from app.internal.hotel_bookings import (HOTEL_BOOKING_COLUMNS,
+                                         HOTEL_BOOKING_PAGE_KEYS,
+                                         HotelBookingQueries, HotelBookingRow)
+from app.internal.http_cache import conditional_response
+from app.internal.itinerary import (ITINERARY_COLUMNS, ITINERARY_PAGE_KEYS,
+                                    ItineraryQueries, ItineraryRow)
+from app.internal.pagination import Page, PageResponse
+from app.internal.response_cache import ResponseCache
+from app.internal.trips import (TRIP_COLUMNS, TRIP_PAGE_KEYS, Trip,
+                                TripQueries, TripRow)
 
 router = APIRouter(
     prefix="/api/v1",
@@ -18,61 +32,149 @@ router = APIRouter(
 
 
 class QueryDependencies:
-    def __init__(self, trip_queries: TripQueries, user_queries: UserQueries):
+    def __init__(self, trip_queries: TripQueries):
         self.trip_queries = trip_queries
-        self.user_queries = user_queries
 
 
-def get_queries() -> QueryDependencies:
-    supabase_client = SupabaseClient()
-    return QueryDependencies(TripQueries(supabase_client), UserQueries(supabase_client))
+def get_queries(
+    db: Database = Depends(get_database),
+) -> QueryDependencies:
+    return QueryDependencies(TripQueries(db))
+
+
+class TripDetailDependencies:
+    def __init__(
+        self,
+        itinerary_queries: ItineraryQueries,
+        hotel_booking_queries: HotelBookingQueries,
+        flight_booking_queries: FlightBookingQueries,
+    ):
+        self.itinerary_queries = itinerary_queries
+        self.hotel_booking_queries = hotel_booking_queries
+        self.flight_booking_queries = flight_booking_queries
+
+
+def get_trip_detail_queries(
+    db: Database = Depends(get_database),
+) -> TripDetailDependencies:
+    return TripDetailDependencies(
+        ItineraryQueries(db),
+        HotelBookingQueries(db),
+        FlightBookingQueries(db),
+    )
+
 
+TRIP_DETAIL_SECTIONS = ("itinerary", "hotel_bookings", "flight_bookings")
+TRIP_DETAIL_PAGES = {
+    "itinerary": (ITINERARY_COLUMNS, ITINERARY_PAGE_KEYS),
+    "hotel_bookings": (HOTEL_BOOKING_COLUMNS, HOTEL_BOOKING_PAGE_KEYS),
+    "flight_bookings": (FLIGHT_BOOKING_COLUMNS, FLIGHT_BOOKING_PAGE_KEYS),
+}
 
-@router.post("/protected/trips")
+
+class TripCreated(BaseModel):
+    trip_id: int
+    message: str
+
+
+class TripDetail(BaseModel):
+    trip_id: str
+    itinerary: Optional[PageResponse[ItineraryRow]] = None
+    hotel_bookings: Optional[PageResponse[HotelBookingRow]] = None
+    flight_bookings: Optional[PageResponse[FlightBookingRow]] = None
+
+
+@router.post("/protected/trips", response_model=TripCreated)
 async def create_trip(
     request: Request,
     queries: QueryDependencies = Depends(get_queries),
-    current_user: dict = Depends(get_current_user),
+    identity: dict = Depends(get_current_identity),
+    cache: ResponseCache = Depends(get_response_cache),
 ):
     try:
-        request_body = await request.body()
-        request_data = request_body.decode("utf-8")
+        # Parse and validate the Trip model straight from the raw body
+        validated_trip = Trip.model_validate_json(await request.body())
 
-        # Parse the JSON string into a dictionary
-        trip_data = json.loads(request_data)
-
-        # Validate the Trip model
-        validated_trip = Trip.model_validate(trip_data)
-
-        user_info = queries.user_queries.get_user(current_user.get("sub"))
-        if not user_info:
-            raise HTTPException(status_code=400, detail="Error fetching user by email")
-
-        user_id = user_info["data"].data[0]["id"]
-        result = queries.trip_queries.create_trip(validated_trip, user_id)
+        user_id = identity["id"]
+        result = await queries.trip_queries.create_trip(validated_trip, user_id)
         if result["error"]:
             handle_error(result["error"], "error creating trip")
+        await cache.invalidate("trips", user_id)
 
-        trip_id = result["data"][1][0]["id"]
+        trip_id = result["data"][0]["id"]
         return {"trip_id": trip_id, "message": "Trip created successfully"}
     except ValidationError as e:
         return JSONResponse(content={"detail": str(e)}, status_code=400)
 
 
-@router.get("/protected/trips")
+@router.get("/protected/trips", response_model=PageResponse[TripRow])
 async def get_user_trips(
+    request: Request,
+    page: Page = Depends(get_page(TRIP_COLUMNS, TRIP_PAGE_KEYS)),
     queries: QueryDependencies = Depends(get_queries),
-    current_user: dict = Depends(get_current_user),
+    identity: dict = Depends(get_current_identity),
+    cache: ResponseCache = Depends(get_response_cache),
 ):
-    user_info = queries.user_queries.get_user(current_user.get("sub"))
-    if not user_info:
-        raise HTTPException(status_code=400, detail="Error fetching user by email")
-
-    user_id = user_info["data"].data[0]["id"]
-    result = queries.trip_queries.get_user_trips(user_id)
+    user_id = identity["id"]
+    result = await cache.get_or_load(
+        "trips",
+        user_id,
+        page.cache_key(),
+        lambda: queries.trip_queries.get_user_trips(user_id, page),
+    )
     if result["error"]:
         handle_error(result["error"], "error fetching user trips")
-    return result["data"]
+    return conditional_response(request, result["data"], result["etag"])
+
+
+@router.get(
+    "/protected/trips/{trip_id}/full",
+    response_model=TripDetail,
+    response_model_exclude_unset=True,
+)
+async def get_trip_details(
+    trip_id,
+    include: Optional[str] = None,
+    queries: TripDetailDependencies = Depends(get_trip_detail_queries),
+    current_user: dict = Depends(get_current_user),
+    cache: ResponseCache = Depends(get_response_cache),
+):
+    sections = parse_include(include)
+    lookups = {
+        "itinerary": queries.itinerary_queries.get_trip_itineraries,
+        "hotel_bookings": queries.hotel_booking_queries.get_trip_hotel_bookings,
+        "flight_bookings": queries.flight_booking_queries.get_trip_flight_bookings,
+    }
+
+    def load(section: str):
+        # Same cache entries as the first page of the section's own listing.
+        page = Page(*TRIP_DETAIL_PAGES[section])
+        return cache.get_or_load(
+            section, trip_id, page.cache_key(), lambda: lookups[section](trip_id, page)
+        )
+
+    results = await asyncio.gather(*(load(section) for section in sections))
+
+    trip = {"trip_id": trip_id}
+    for section, result in zip(sections, results):
+        if result["error"]:
+            handle_error(result["error"], f"error getting trip's {section}")
+        trip[section] = result["data"]
+    return trip
+
+
+def parse_include(include: Optional[str]) -> list:
+    if not include:
+        return list(TRIP_DETAIL_SECTIONS)
+
+    sections = [section.strip() for section in include.split(",") if section.strip()]
+    unknown = [section for section in sections if section not in TRIP_DETAIL_SECTIONS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown include sections: {', '.join(unknown)}",
+        )
+    return list(dict.fromkeys(sections))
 
 
 def handle_error(error, error_message):
@@ -1,14 +1,23 @@
 import os
 from datetime import timedelta
+from typing import Optional
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
-from fastapi.responses import JSONResponse
+from fastapi import (APIRouter, BackgroundTasks, Depends, File, HTTPException,
+                     Request, UploadFile)
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from uplink_python.errors import StorjException
 
-from app.dependencies import create_jwt_token, decode_jwt_token, get_current_user
-from app.internal.storj import StorjClient
-from app.internal.supadb import SupabaseClient
+from app.dependencies import (create_jwt_token, decode_jwt_token,
+                              get_current_identity, get_current_user,
+                              get_database, get_image_pipeline,
+                              get_password_hasher, get_storj_client)
+from app.internal.database import Database
+from app.internal.http_cache import etag_matches
+from app.internal.identity import identity_cache
+from app.internal.images import DERIVATIVE_NAMES, ImagePipeline, spool_upload
+from app.internal.passwords import PasswordHasher, PasswordHasherBusy
+from app.internal.storj import StorjClient, UploadTooLarge
 from app.internal.users import User, UserQueries
 
 router = APIRouter(
@@ -18,35 +27,57 @@ router = APIRouter(
 )
 
 
-def get_user_queries() -> UserQueries:
-    return UserQueries(SupabaseClient())
+def get_user_queries(
+    db: Database = Depends(get_database),
+) -> UserQueries:
+    return UserQueries(db)
 
 
-def get_storj_client() -> StorjClient:
-    return StorjClient()
+ACCESS_TOKEN_EXPIRE_MINUTES = float(os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES", 15.0))
+PROFILE_IMAGE_PATH = "/api/v1/protected/profile-image"
 
 
-ACCESS_TOKEN_EXPIRE_MINUTES = float(os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES", 15.0))
+class TokenResponse(BaseModel):
+    user_id: int
+    username: str
+    token: str
+
+
+class LoginResponse(TokenResponse):
+    profile_image: Optional[str] = None
 
 
-@router.post("/signup")
-async def signup(user: User, user_queries: UserQueries = Depends(get_user_queries)):
-    result = user_queries.register_user(user)
+class UploadResponse(BaseModel):
+    data: str
+
+
+@router.post("/signup", response_model=TokenResponse)
+async def signup(
+    user: User,
+    user_queries: UserQueries = Depends(get_user_queries),
+    password_hasher: PasswordHasher = Depends(get_password_hasher),
+):
+    try:
+        password_hash = await password_hasher.hash(user.password)
+    except PasswordHasherBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    result = await user_queries.register_user(user, password_hash)
     if result["error"]:
         handle_error(result["error"], "error adding a user to the database")
 
-    user_data = user_queries.get_user(user.email)
-    if user_data["error"]:
-        raise HTTPException(status_code=400, detail="Error fetching user by email")
-
-    user_id = user_data["data"].data[0]["id"]
-    username = user_data["data"].data[0]["username"]
-    email = user_data["data"].data[0]["email"]
+    # The insert returns the new row, so there is no need to read it back.
+    user_id = result["data"][0]["id"]
+    username = result["data"][0]["username"]
+    email = result["data"][0]["email"]
+    identity_cache.invalidate(email)
+    identity_cache.remember(email, user_id, username)
     # create a new token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     try:
         access_token = create_jwt_token(
-            data={"sub": email}, expires_delta=access_token_expires
+            data={"sub": email, "user_id": user_id, "username": username},
+            expires_delta=access_token_expires,
         )
     except Exception as e:
         raise HTTPException(
@@ -61,11 +92,13 @@ class LoginRequest(BaseModel):
     password: str
 
 
-@router.post("/token")
+@router.post("/token", response_model=LoginResponse)
 async def login(
     login_request: LoginRequest,
+    background_tasks: BackgroundTasks,
     user_queries: UserQueries = Depends(get_user_queries),
     storj_client: StorjClient = Depends(get_storj_client),
+    password_hasher: PasswordHasher = Depends(get_password_hasher),
 ):
     email = login_request.email
     password = login_request.password
@@ -73,18 +106,27 @@ async def login(
     if not email or not password:
         raise HTTPException(status_code=400, detail="Email and password are required")
 
-    user_data = user_queries.get_user(email)
+    user_data = await user_queries.get_user(email)
     if user_data["error"]:
         raise HTTPException(status_code=400, detail="Error fetching user by email")
 
-    user_id = user_data["data"].data[0]["id"]
-    username = user_data["data"].data[0]["username"]
-    stored_password = user_data["data"].data[0]["password"]
-    if not user_queries.verify_password(password, stored_password):
+    user_id = user_data["data"][0]["id"]
+    username = user_data["data"][0]["username"]
+    stored_password = user_data["data"][0]["password"]
+    try:
+        valid = await password_hasher.verify(password, stored_password)
+    except PasswordHasherBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if password_hasher.needs_rehash(stored_password):
+        background_tasks.add_task(
+            upgrade_password_hash, password_hasher, user_queries, user_id, password
+        )
+    identity_cache.remember(email, user_id, username)
 
     try:
-        profile_data = await storj_client.get_user_profile_image()
+        profile_image = await storj_client.get_user_profile_image(user_id)
     except StorjException as storj_error:
         raise HTTPException(
             status_code=400, detail=f"Error loading profile image: {storj_error}"
@@ -94,29 +136,27 @@ async def login(
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     try:
         access_token = create_jwt_token(
-            data={"sub": email}, expires_delta=access_token_expires
+            data={"sub": email, "user_id": user_id, "username": username},
+            expires_delta=access_token_expires,
         )
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error creating JWT token: {str(e)}"
         )
 
-    return JSONResponse(
-        content={
-            "user_id": user_id,
-            "username": username,
-            "token": access_token,
-            "profile_image": profile_data,
-        },
-        status_code=200,
-    )
+    return {
+        "user_id": user_id,
+        "username": username,
+        "token": access_token,
+        "profile_image": profile_image_url(profile_image),
+    }
 
 
 class RefreshRequest(BaseModel):
     refresh_token: str
 
 
-@router.post("/refresh-token")
+@router.post("/refresh-token", response_model=TokenResponse)
 async def refresh_token(
     rt: RefreshRequest, user_queries: UserQueries = Depends(get_user_queries)
 ):
@@ -125,49 +165,150 @@ async def refresh_token(
     if decoded_data is None:
         raise HTTPException(status_code=401, detail="Invalid refresh token")
 
-    user_data = user_queries.get_user(decoded_data["sub"])
-    if user_data["error"]:
+    identity = await identity_cache.resolve(decoded_data, user_queries)
+    if identity is None:
         raise HTTPException(status_code=400, detail="Error fetching user by email")
 
-    user_id = user_data["data"].data[0]["id"]
-    username = user_data["data"].data[0]["username"]
+    user_id = identity["id"]
+    username = identity["username"]
 
     # Create a new access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_jwt_token(
-        data={"sub": decoded_data["sub"]}, expires_delta=access_token_expires
+        data={"sub": decoded_data["sub"], "user_id": user_id, "username": username},
+        expires_delta=access_token_expires,
     )
 
     return {"user_id": user_id, "username": username, "token": access_token}
 
 
-@router.post("/protected/upload-profile")
+@router.post("/protected/upload-profile", response_model=UploadResponse)
 async def upload_profile_image(
+    background_tasks: BackgroundTasks,
     profile_image: UploadFile = File(...),
     current_user: dict = Depends(get_current_user),
-    user_queries: UserQueries = Depends(get_user_queries),
+    identity: dict = Depends(get_current_identity),
     storj_client: StorjClient = Depends(get_storj_client),
+    image_pipeline: ImagePipeline = Depends(get_image_pipeline),
 ):
     try:
-        file_content = await profile_image.read()
-
-        user_info = user_queries.get_user(current_user.get("sub"))
-        if not user_info:
-            return JSONResponse(
-                status_code=400, content={"detail": "Error fetching user by email"}
-            )
-
-        user_id = user_info["data"].data[0]["id"]
+        user_id = identity["id"]
         uploaded = await storj_client.upload_user_profile(
-            user_id, profile_image.filename, file_content
+            user_id, profile_image.filename, profile_image
         )
-        if uploaded != "":
-            return JSONResponse(status_code=500, content={"detail": f"{uploaded}"})
+        if uploaded["error"]:
+            return JSONResponse(
+                status_code=500, content={"detail": f"{uploaded['error']}"}
+            )
+        identity_cache.invalidate(current_user.get("sub"))
+
+        # The worker processes read a copy on disk, so the upload never has
+        # to be held in memory; nothing is copied when they are all busy.
+        if not image_pipeline.busy():
+            background_tasks.add_task(
+                store_profile_image_derivatives,
+                image_pipeline,
+                storj_client,
+                user_id,
+                uploaded["data"]["version"],
+                await spool_upload(profile_image),
+            )
         return {"data": "image uploaded succesfully"}
+    except UploadTooLarge as e:
+        return JSONResponse(content={"detail": str(e)}, status_code=413)
     except Exception as e:
         return JSONResponse(content={"detail": str(e)}, status_code=500)
 
 
+@router.get("/protected/profile-image")
+async def get_profile_image(
+    request: Request,
+    size: Optional[str] = None,
+    identity: dict = Depends(get_current_identity),
+    storj_client: StorjClient = Depends(get_storj_client),
+):
+    if size is not None and size not in DERIVATIVE_NAMES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"size must be one of: {', '.join(DERIVATIVE_NAMES)}",
+        )
+
+    try:
+        profile_image = await storj_client.get_user_profile_image(identity["id"], size)
+    except StorjException as storj_error:
+        raise HTTPException(
+            status_code=400, detail=f"Error loading profile image: {storj_error}"
+        )
+    if not profile_image:
+        raise HTTPException(status_code=404, detail="No profile image")
+
+    etag = f'"{profile_image["version"]}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    # Versioned URLs change whenever the image does. The original stands in
+    # for a derivative that is not rendered yet, so it is only cached for
+    # good when it is the object asked for.
+    if (
+        profile_image["variant"] == size
+        and request.query_params.get("v") == profile_image["version"]
+    ):
+        headers["Cache-Control"] = "private, max-age=31536000, immutable"
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    if profile_image["size"] is not None:
+        headers["Content-Length"] = str(profile_image["size"])
+    return StreamingResponse(
+        storj_client.stream_object(identity["id"], profile_image),
+        media_type=profile_image["content_type"],
+        headers=headers,
+    )
+
+
+async def store_profile_image_derivatives(
+    image_pipeline: ImagePipeline,
+    storj_client: StorjClient,
+    user_id: str,
+    version: str,
+    image_path: str,
+):
+    # Rendered for the version that was uploaded, even if a newer upload has
+    # replaced it since; those derivatives are simply never asked for.
+    try:
+        derivatives = await image_pipeline.render(image_path)
+        if derivatives:
+            await storj_client.upload_user_profile_derivatives(
+                user_id, version, derivatives
+            )
+    except Exception as e:
+        print(f"Error creating profile image derivatives: {e}")
+    finally:
+        os.unlink(image_path)
+
+
+async def upgrade_password_hash(
+    password_hasher: PasswordHasher,
+    user_queries: UserQueries,
+    user_id: int,
+    password: str,
+):
+    # Legacy SHA-256 hashes (and hashes made with older cost parameters) are
+    # replaced the first time their owner logs in successfully.
+    try:
+        password_hash = await password_hasher.hash(password)
+        result = await user_queries.update_password_hash(user_id, password_hash)
+        if result["error"]:
+            print(f"Error upgrading password hash: {result['error']}")
+    except Exception as e:
+        print(f"Error upgrading password hash: {e}")
+
+
+def profile_image_url(profile_image: Optional[dict]) -> Optional[str]:
+    if not profile_image:
+        return None
+    return f"{PROFILE_IMAGE_PATH}?v={profile_image['version']}"
+
+
 def handle_error(error, error_message):
     if error:
         raise HTTPException(status_code=500, detail=f"{error_message}: {error}")
@@ -0,0 +1,218 @@
+"""Production entry point: ``python -m app.serve``.
+
+Binds the port once and runs WEB_CONCURRENCY uvicorn workers on it, each on
+uvloop with the httptools parser. WEB_CONCURRENCY defaults to the number of
+CPUs the process may run on: its CPU affinity, capped by the container's
+cgroup CPU quota (rounded up), rather than the CPUs of the whole host. A worker runs the app's startup, which
+warms up the backend pools, before it accepts connections. After
+MAX_REQUESTS requests, plus up to MAX_REQUESTS_JITTER so that workers do
+not all restart together, a worker finishes what it is handling and exits,
+and a fresh one takes its place. Workers that crash are replaced as well.
+
+With more than one worker, the caches that each process keeps of data that
+writes change are turned off unless configured explicitly, so that a write
+handled by one worker is seen by the next request whichever worker takes
+it. Response caching stays on when RESPONSE_CACHE_URL points at Redis.
+
+SIGTERM or SIGINT stops the workers gracefully, killing any still running
+after GRACEFUL_TIMEOUT seconds.
+"""
+import math
+import multiprocessing
+import os
+import random
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+import uvicorn
+
+HOST = os.environ.get("HOST", "0.0.0.0")
+PORT = int(os.environ.get("PORT", 8050))
+CGROUP_V2_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+CGROUP_V1_CPU_QUOTA = "/sys/fs/cgroup/cpu/cpu.cfs_quota_us"
+CGROUP_V1_CPU_PERIOD = "/sys/fs/cgroup/cpu/cpu.cfs_period_us"
+
+
+def cgroup_cpu_quota() -> Optional[float]:
+    """The CPUs a cgroup (v2, else v1) quota allows, or None without one."""
+    try:
+        with open(CGROUP_V2_CPU_MAX) as file:
+            quota, period = file.read().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(CGROUP_V1_CPU_QUOTA) as file:
+            quota = int(file.read())
+        with open(CGROUP_V1_CPU_PERIOD) as file:
+            period = int(file.read())
+    except (OSError, ValueError):
+        return None
+    # -1 means no quota.
+    return quota / period if quota > 0 and period > 0 else None
+
+
+def available_cpus() -> int:
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on macOS.
+        cpus = os.cpu_count() or 1
+    quota = cgroup_cpu_quota()
+    if quota is not None:
+        cpus = min(cpus, math.ceil(quota))
+    return max(1, cpus)
+
+
+CPU_COUNT = available_cpus()
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", CPU_COUNT))
+# 0 never restarts workers.
+MAX_REQUESTS = int(os.environ.get("MAX_REQUESTS", 0))
+MAX_REQUESTS_JITTER = int(os.environ.get("MAX_REQUESTS_JITTER", MAX_REQUESTS // 10))
+GRACEFUL_TIMEOUT = float(os.environ.get("GRACEFUL_TIMEOUT", 30.0))
+KEEPALIVE_TIMEOUT = int(os.environ.get("KEEPALIVE_TIMEOUT", 5))
+BACKLOG = int(os.environ.get("BACKLOG", 2048))
+# The default number of image rendering processes, shared by the workers
+# unless IMAGE_WORKERS sets a number per worker.
+DEFAULT_IMAGE_WORKERS = 2
+# A worker that exits sooner than this after starting is replaced only after
+# a pause, so a worker that cannot start does not spin the CPU.
+MIN_WORKER_UPTIME = 5.0
+RESPAWN_DELAY = 1.0
+
+
+def worker_config(max_requests: int = MAX_REQUESTS) -> uvicorn.Config:
+    return uvicorn.Config(
+        "app.main:app",
+        host=HOST,
+        port=PORT,
+        loop="uvloop",
+        http="httptools",
+        lifespan="on",
+        backlog=BACKLOG,
+        timeout_keep_alive=KEEPALIVE_TIMEOUT,
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
+        limit_max_requests=max_requests or None,
+        access_log=False,
+    )
+
+
+def run_worker(config: uvicorn.Config, sockets: List[socket.socket]):
+    uvicorn.Server(config).run(sockets=sockets)
+
+
+class Supervisor:
+    """Keeps ``workers`` worker processes serving on one shared socket."""
+
+    def __init__(self, workers: int = WEB_CONCURRENCY):
+        self.workers = max(1, workers)
+        self.context = multiprocessing.get_context("spawn")
+        self.processes: Dict[multiprocessing.process.BaseProcess, float] = {}
+        self.should_exit = threading.Event()
+        self.socket = None
+
+    def spawn(self):
+        max_requests = MAX_REQUESTS
+        if max_requests:
+            max_requests += random.randint(0, MAX_REQUESTS_JITTER)
+        process = self.context.Process(
+            target=run_worker,
+            kwargs={"config": worker_config(max_requests), "sockets": [self.socket]},
+        )
+        process.start()
+        self.processes[process] = time.monotonic()
+
+    def reap(self):
+        for process, started_at in list(self.processes.items()):
+            if process.is_alive():
+                continue
+            process.join()
+            del self.processes[process]
+            mark_process_dead(process.pid)
+            if self.should_exit.is_set():
+                continue
+            print(f"Worker {process.pid} exited ({process.exitcode}), replacing it")
+            if time.monotonic() - started_at < MIN_WORKER_UPTIME:
+                self.should_exit.wait(RESPAWN_DELAY)
+            self.spawn()
+
+    def handle_exit(self, signum, frame):
+        self.should_exit.set()
+
+    def run(self):
+        self.socket = worker_config().bind_socket()
+        signal.signal(signal.SIGTERM, self.handle_exit)
+        signal.signal(signal.SIGINT, self.handle_exit)
+        print(f"Starting {self.workers} workers on {HOST}:{PORT}")
+        for _ in range(self.workers):
+            self.spawn()
+
+        while not self.should_exit.wait(0.5):
+            self.reap()
+
+        for process in self.processes:
+            process.terminate()
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT
+        for process in self.processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                print(f"Worker {process.pid} did not stop in time, killing it")
+                process.kill()
+                process.join()
+        self.socket.close()
+
+
+def mark_process_dead(pid: int):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid)
+
+
+def configure_workers(workers: int):
+    """Defaults for settings that assume a single process.
+
+    Explicit settings are left alone.
+    """
+    # Share the CPU bound pools between the workers rather than giving each
+    # worker its own full-size pool.
+    os.environ.setdefault("PASSWORD_HASH_WORKERS", str(max(1, CPU_COUNT // workers)))
+    os.environ.setdefault(
+        "IMAGE_WORKERS", str(max(1, DEFAULT_IMAGE_WORKERS // workers))
+    )
+    if workers == 1:
+        return
+    # A write only invalidates the caches of the worker that handled it, so
+    # per-process caches of data that writes change are turned off; the
+    # others would keep serving what was there before. The response cache
+    # stays on when it is shared.
+    os.environ.setdefault("PROFILE_INDEX_TTL", "0")
+    os.environ.setdefault("IDENTITY_CACHE_TTL", "0")
+    shared = os.environ.get("RESPONSE_CACHE_URL", "") not in ("", "local://")
+    if not shared and "RESPONSE_CACHE_TTL" not in os.environ:
+        print("RESPONSE_CACHE_URL is not shared, response caching is off")
+        os.environ["RESPONSE_CACHE_TTL"] = "0"
+        os.environ.setdefault("RESPONSE_CACHE_STALE_TTL", "0")
+
+
+def main():
+    workers = max(1, WEB_CONCURRENCY)
+    metrics_dir = None
+    if workers > 1 and not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        # Set before any worker imports prometheus_client.
+        metrics_dir = tempfile.mkdtemp(prefix="prometheus-")
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+    configure_workers(workers)
+    try:
+        Supervisor(workers).run()
+    finally:
+        if metrics_dir:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
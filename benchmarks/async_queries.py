@@ -0,0 +1,78 @@
+"""Compare blocking and async PostgREST calls made from async handlers.
+
+The blocking variant reproduces the old data layer: a synchronous
+``.execute()`` inside an ``async def``, which serialises every call on the
+event loop. The async variant awaits ``TripQueries.get_user_trips`` so the
+calls overlap.
+
+    python -m benchmarks.async_queries --requests 200 --latency 0.02
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+from postgrest import SyncPostgrestClient
+
+from benchmarks.stub_postgrest import create_app, serve_in_thread
+
+STUB_KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.stub"
+
+
+async def blocking_calls(url: str, requests: int) -> float:
+    client = SyncPostgrestClient(f"{url}/rest/v1")
+
+    async def handler():
+        client.from_("trips").select("*").eq("user_id", 1).execute()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(handler() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    client.aclose()
+    return elapsed
+
+
+async def async_calls(requests: int) -> float:
+    from app.internal.supadb import SupabaseClient
+    from app.internal.trips import TripQueries
+
+    supabase_client = SupabaseClient()
+    queries = TripQueries(supabase_client)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(queries.get_user_trips(1) for _ in range(requests))
+    )
+    elapsed = time.perf_counter() - start
+    await supabase_client.aclose()
+    assert all(result["error"] is None for result in results)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--port", type=int, default=54321)
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    url = f"http://127.0.0.1:{args.port}"
+    os.environ["SUPABASE_URL"] = url
+    os.environ["SUPABASE_KEY"] = STUB_KEY
+    tables = {"trips": [{"id": 1, "user_id": 1, "title": "stub"}]}
+    server = serve_in_thread(create_app(args.latency, tables), args.port)
+
+    blocking = asyncio.run(blocking_calls(url, args.requests))
+    concurrent = asyncio.run(async_calls(args.requests))
+    server.should_exit = True
+
+    print(f"{args.requests} requests, {args.latency * 1000:.0f} ms backend latency")
+    print(f"blocking: {blocking:.3f}s ({args.requests / blocking:.0f} req/s)")
+    print(f"async:    {concurrent:.3f}s ({args.requests / concurrent:.0f} req/s)")
+    print(f"speedup:  {blocking / concurrent:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
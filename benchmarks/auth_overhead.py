@@ -0,0 +1,43 @@
+"""Per-request cost of authenticating a bearer token, cached and uncached.
+
+    python -m benchmarks.auth_overhead --iterations 20000
+"""
+import argparse
+import os
+import timeit
+from datetime import timedelta
+
+from jose import jwt
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+    from app.dependencies import (ALGORITHM, SECRET_KEY, create_jwt_token,
+                                  decode_jwt_token, verified_tokens)
+
+    token = create_jwt_token(
+        {"sub": "bench@example.com", "user_id": 1, "username": "bench"},
+        expires_delta=timedelta(minutes=15),
+    )
+
+    uncached = timeit.timeit(
+        lambda: jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]),
+        number=args.iterations,
+    )
+    verified_tokens.clear()
+    cached = timeit.timeit(lambda: decode_jwt_token(token), number=args.iterations)
+
+    uncached_us = uncached / args.iterations * 1e6
+    cached_us = cached / args.iterations * 1e6
+    print(f"{args.iterations} token checks")
+    print(f"uncached: {uncached_us:.1f} us/request")
+    print(f"cached:   {cached_us:.1f} us/request")
+    print(f"speedup:  {uncached_us / cached_us:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""Mixed-workload load test of the API against local backend stand-ins.
+
+Starts benchmarks.stub_postgrest and benchmarks.stub_app in their own
+processes, signs up ``--users`` users with a trip, a booking of each kind
+and a profile image each, then keeps ``--concurrency`` virtual users busy
+for ``--duration`` seconds. Each of them picks its next request from
+WORKLOAD by weight. Requests made during the first ``--warmup`` seconds are
+not counted.
+
+The report is JSON: the commit, the settings, and per endpoint the request
+count, throughput, status codes and p50/p95/p99 latency. Pass a report from
+another commit with ``--compare`` to print the change per endpoint.
+
+    python -m benchmarks.load_test --duration 20 --output after.json
+    python -m benchmarks.load_test --compare before.json --env WRITE_BATCHING=true
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+import httpx
+from PIL import Image
+
+API = "/api/v1"
+
+# name -> weight; the weights are roughly what the web client sends.
+WORKLOAD = {
+    "login": 5,
+    "list_trips": 20,
+    "trip_full": 10,
+    "list_itinerary": 10,
+    "list_hotel_bookings": 8,
+    "list_flight_bookings": 8,
+    "profile_image": 10,
+    "create_trip": 4,
+    "create_itinerary": 10,
+    "create_hotel_booking": 5,
+    "create_flight_booking": 5,
+    "refresh_token": 5,
+}
+
+# name -> (method, path); the path doubles as the endpoint's report label.
+REQUESTS = {
+    "login": ("POST", "/token"),
+    "refresh_token": ("POST", "/refresh-token"),
+    "list_trips": ("GET", "/protected/trips"),
+    "create_trip": ("POST", "/protected/trips"),
+    "trip_full": ("GET", "/protected/trips/{trip_id}/full"),
+    "profile_image": ("GET", "/protected/profile-image"),
+    "list_itinerary": ("GET", "/protected/{trip_id}/itinerary"),
+    "create_itinerary": ("POST", "/protected/{trip_id}/itinerary"),
+    "list_hotel_bookings": ("GET", "/protected/{trip_id}/hotel-bookings"),
+    "create_hotel_booking": ("POST", "/protected/{trip_id}/hotel-bookings"),
+    "list_flight_bookings": ("GET", "/protected/{trip_id}/flight-bookings"),
+    "create_flight_booking": ("POST", "/protected/{trip_id}/flight-bookings"),
+}
+
+BODIES = {
+    "create_trip": {
+        "title": "Trip",
+        "start_date": "2024-01-01",
+        "end_date": "2024-01-05",
+    },
+    "create_itinerary": {
+        "date": "2024-01-01",
+        "description": "Walking tour",
+        "location": "Old town",
+        "activity": "Sightseeing",
+    },
+    "create_hotel_booking": {
+        "hotel_name": "Grand",
+        "check_in_date": "2024-01-01",
+        "check_out_date": "2024-01-03",
+    },
+    "create_flight_booking": {
+        "airline": "KQ",
+        "flight_number": "100",
+        "departure_date": "2024-01-01",
+        "arrival_date": "2024-01-01",
+    },
+}
+
+
+class User:
+    def __init__(self, email: str, password: str, token: str, trip_id: int = None):
+        self.email = email
+        self.password = password
+        self.token = token
+        self.trip_id = trip_id
+
+
+def request_for(name: str, user: User):
+    """The report label, method, URL and httpx arguments for ``name``."""
+    method, path = REQUESTS[name]
+    url = API + path.format(trip_id=user.trip_id)
+    if name == "login":
+        kwargs = {"json": {"email": user.email, "password": user.password}}
+    elif name == "refresh_token":
+        kwargs = {"json": {"refresh_token": user.token}}
+    else:
+        kwargs = {"headers": {"Authorization": f"Bearer {user.token}"}}
+        if name in BODIES:
+            kwargs["json"] = BODIES[name]
+    return f"{method} {path}", method, url, kwargs
+
+
+def profile_png() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (256, 256), (200, 120, 40)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+async def request(client: httpx.AsyncClient, name: str, user: User) -> dict:
+    _, method, url, kwargs = request_for(name, user)
+    response = await client.request(method, url, **kwargs)
+    response.raise_for_status()
+    return response.json()
+
+
+async def sign_up(client: httpx.AsyncClient, index: int, image: bytes) -> User:
+    email, password = f"load{index}@example.com", f"password-{index}"
+    response = await client.post(
+        f"{API}/signup",
+        json={"username": f"load{index}", "email": email, "password": password},
+    )
+    response.raise_for_status()
+    user = User(email, password, response.json()["token"])
+
+    user.trip_id = (await request(client, "create_trip", user))["trip_id"]
+    for name in ("create_itinerary", "create_hotel_booking", "create_flight_booking"):
+        await request(client, name, user)
+    response = await client.post(
+        f"{API}/protected/upload-profile",
+        files={"profile_image": ("profile.png", image, "image/png")},
+        headers={"Authorization": f"Bearer {user.token}"},
+    )
+    response.raise_for_status()
+    return user
+
+
+async def virtual_user(
+    client: httpx.AsyncClient,
+    users: List[User],
+    measure_from: float,
+    stop_at: float,
+    samples: Dict[str, list],
+    statuses: Dict[str, Counter],
+):
+    names, weights = list(WORKLOAD), list(WORKLOAD.values())
+    while time.perf_counter() < stop_at:
+        user = random.choice(users)
+        name = random.choices(names, weights)[0]
+        label, method, url, kwargs = request_for(name, user)
+
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            await response.aread()
+            status = str(response.status_code)
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        elapsed = time.perf_counter() - start
+
+        if start >= measure_from:
+            samples[label].append(elapsed)
+            statuses[label][status] += 1
+
+
+def percentile(ordered: list, fraction: float) -> float:
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(latencies: list, statuses: Counter, seconds: float) -> dict:
+    ordered = sorted(latencies)
+    errors = sum(
+        count for status, count in statuses.items() if not status.startswith(("2", "3"))
+    )
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "throughput": round(len(ordered) / seconds, 2),
+        "statuses": dict(statuses),
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+async def run_load(args, base_url: str) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=args.timeout
+    ) as client:
+        image = profile_png()
+        users = await asyncio.gather(
+            *(sign_up(client, index, image) for index in range(args.users))
+        )
+
+        samples: Dict[str, list] = defaultdict(list)
+        statuses: Dict[str, Counter] = defaultdict(Counter)
+        start = time.perf_counter()
+        measure_from = start + args.warmup
+        stop_at = measure_from + args.duration
+        await asyncio.gather(
+            *(
+                virtual_user(client, users, measure_from, stop_at, samples, statuses)
+                for _ in range(args.concurrency)
+            )
+        )
+        seconds = time.perf_counter() - measure_from
+
+    endpoints = {
+        label: summarize(samples[label], statuses[label], seconds)
+        for label in sorted(samples)
+    }
+    every = [latency for latencies in samples.values() for latency in latencies]
+    total = summarize(every, sum(statuses.values(), Counter()), seconds)
+    return {"endpoints": endpoints, "total": total}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with status {process.returncode}")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def start_servers(args) -> List[subprocess.Popen]:
+    env = dict(os.environ)
+    for assignment in args.env:
+        name, _, value = assignment.partition("=")
+        env[name] = value
+
+    postgrest_url = f"http://127.0.0.1:{args.postgrest_port}"
+    postgrest = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.stub_postgrest"]
+        + ["--port", str(args.postgrest_port), "--latency", str(args.db_latency)],
+        env=env,
+    )
+    app = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.stub_app", "--port", str(args.port)]
+        + ["--postgrest-url", postgrest_url]
+        + ["--storage-latency", str(args.storage_latency)],
+        env=env,
+    )
+    try:
+        wait_until_up(f"{postgrest_url}/rest/v1/users", postgrest)
+        wait_until_up(f"http://127.0.0.1:{args.port}/metrics", app)
+    except RuntimeError:
+        stop_servers([app, postgrest])
+        raise
+    return [app, postgrest]
+
+
+def stop_servers(processes: List[subprocess.Popen]):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def print_comparison(before: dict, after: dict):
+    print(f"{before['commit']} -> {after['commit']}", file=sys.stderr)
+    rows = [("total", before["total"], after["total"])]
+    for label, stats in after["endpoints"].items():
+        if label in before["endpoints"]:
+            rows.append((label, before["endpoints"][label], stats))
+
+    for label, old, new in rows:
+        changes = []
+        for key in ("throughput", "p50_ms", "p95_ms", "p99_ms"):
+            change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            changes.append(f"{key} {old[key]:.1f} -> {new[key]:.1f} ({change:+.0f}%)")
+        print(f"{label:42} " + ", ".join(changes), file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--db-latency", type=float, default=0.005)
+    parser.add_argument("--storage-latency", type=float, default=0.02)
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--postgrest-port", type=int, default=54330)
+    parser.add_argument(
+        "--env",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="environment variable for the app, e.g. WRITE_BATCHING=true",
+    )
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="JSON report to compare against")
+    args = parser.parse_args()
+
+    processes = start_servers(args)
+    try:
+        results = asyncio.run(run_load(args, f"http://127.0.0.1:{args.port}"))
+    finally:
+        stop_servers(processes)
+
+    report = {
+        "commit": git_commit(),
+        "settings": {
+            name: getattr(args, name)
+            for name in (
+                "users",
+                "concurrency",
+                "duration",
+                "warmup",
+                "db_latency",
+                "storage_latency",
+                "env",
+            )
+        },
+        **results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
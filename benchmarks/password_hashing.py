@@ -0,0 +1,70 @@
+"""Login throughput of the password KDF, and event loop lag while it runs.
+
+Runs ``--logins`` concurrent verifications through ``PasswordHasher`` and
+reports logins per second overall and per worker core, next to the longest
+stall a ticker task saw on the event loop meanwhile.
+
+    python -m benchmarks.password_hashing --logins 200 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from app.internal.passwords import (PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_P,
+                                    PASSWORD_SCRYPT_R, PasswordHasher,
+                                    hash_password)
+
+
+async def ticker(stop: asyncio.Event, interval: float = 0.001) -> float:
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def logins(args) -> tuple:
+    params = (args.n, args.r, args.p)
+    hasher = PasswordHasher(args.workers, args.logins, *params)
+    stored = hash_password("correct horse battery staple", *params)
+
+    stop = asyncio.Event()
+    lag = asyncio.ensure_future(ticker(stop))
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(
+            hasher.verify("correct horse battery staple", stored)
+            for _ in range(args.logins)
+        )
+    )
+    elapsed = time.perf_counter() - start
+    stop.set()
+    hasher.close()
+    assert all(results)
+    return elapsed, await lag
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--n", type=int, default=PASSWORD_SCRYPT_N)
+    parser.add_argument("--r", type=int, default=PASSWORD_SCRYPT_R)
+    parser.add_argument("--p", type=int, default=PASSWORD_SCRYPT_P)
+    args = parser.parse_args()
+
+    elapsed, lag = asyncio.run(logins(args))
+    cores = min(args.workers, os.cpu_count() or 1)
+    rate = args.logins / elapsed
+
+    print(f"scrypt n={args.n} r={args.r} p={args.p}, {args.workers} workers")
+    print(
+        f"{args.logins} logins in {elapsed:.2f}s: {rate:.0f}/s, {rate / cores:.0f}/s/core"
+    )
+    print(f"worst event loop stall: {lag * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
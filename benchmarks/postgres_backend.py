@@ -0,0 +1,200 @@
+"""Compare the PostgREST and direct Postgres backends on the hot lookups.
+
+Needs a Postgres to connect to (``--dsn`` or DATABASE_URL). The tables are
+created in a ``travel_benchmark`` schema, which is dropped first, and
+filled with ``--users`` users with a trip of ``--itinerary`` items each.
+The same rows are loaded into the PostgREST stub.
+
+It first checks that both backends return the same pages, following the
+cursors to the end, then times ``--requests`` ``get_user`` and
+``get_trip_itineraries`` calls, ``--concurrency`` at a time, on each: PostgREST (the stub, so this is
+the client side cost of going over HTTP), Postgres without prepared
+statements, and Postgres with them.
+
+    python -m benchmarks.postgres_backend --dsn postgresql://localhost/postgres
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import time
+
+import asyncpg
+
+from benchmarks.async_queries import STUB_KEY
+from benchmarks.stub_postgrest import create_app, serve_in_thread
+
+SCHEMA = "travel_benchmark"
+TABLES = """
+CREATE TABLE users (
+    id bigserial PRIMARY KEY,
+    username text NOT NULL,
+    email text NOT NULL UNIQUE,
+    password text NOT NULL
+);
+CREATE TABLE trips (
+    id bigserial PRIMARY KEY,
+    user_id bigint NOT NULL REFERENCES users,
+    title text NOT NULL,
+    start_date date NOT NULL,
+    end_date date NOT NULL
+);
+CREATE INDEX ON trips (user_id, start_date, id);
+CREATE TABLE itinerary (
+    id bigserial PRIMARY KEY,
+    trip_id bigint NOT NULL REFERENCES trips,
+    date date NOT NULL,
+    description text,
+    location text,
+    activity text
+);
+CREATE INDEX ON itinerary (trip_id, date, id);
+"""
+
+
+async def create_schema(dsn: str):
+    connection = await asyncpg.connect(dsn)
+    try:
+        await connection.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await connection.execute(f"CREATE SCHEMA {SCHEMA}")
+        await connection.execute(f"SET search_path TO {SCHEMA}")
+        await connection.execute(TABLES)
+    finally:
+        await connection.close()
+
+
+async def seed(db, users: int, items: int) -> dict:
+    """Inserts the rows through ``db`` and returns them by table."""
+    tables = {"users": [], "trips": [], "itinerary": []}
+    for index in range(users):
+        user = {"username": f"user{index}", "email": f"user{index}@example.com"}
+        user["password"] = "not-a-real-hash"
+        (user,) = await db.insert("users", [user])
+        trip = {"user_id": user["id"], "title": "Trip"}
+        trip.update(start_date="2024-01-01", end_date="2024-01-09")
+        (trip,) = await db.insert("trips", [trip])
+        rows = [
+            {
+                "trip_id": trip["id"],
+                "date": f"2024-01-0{1 + position % 9}",
+                "description": f"item {position}",
+                "location": "somewhere",
+                "activity": "something",
+            }
+            for position in range(items)
+        ]
+        tables["users"].append(user)
+        tables["trips"].append(trip)
+        tables["itinerary"].extend(await db.insert("itinerary", rows))
+    return tables
+
+
+async def all_pages(queries, trip_id: int, limit: int) -> list:
+    from app.internal.itinerary import ITINERARY_COLUMNS, ITINERARY_PAGE_KEYS
+    from app.internal.pagination import Page
+
+    pages, cursor = [], None
+    while True:
+        page = Page(ITINERARY_COLUMNS, ITINERARY_PAGE_KEYS, limit, cursor)
+        result = await queries.get_trip_itineraries(str(trip_id), page)
+        assert result["error"] is None, result["error"]
+        pages.append(result["data"])
+        cursor = result["data"]["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+async def check_parity(postgrest, postgres, tables: dict):
+    from app.internal.itinerary import ItineraryQueries
+    from app.internal.users import UserQueries
+
+    for trip in tables["trips"][:3]:
+        expected = await all_pages(ItineraryQueries(postgrest), trip["id"], 3)
+        actual = await all_pages(ItineraryQueries(postgres), trip["id"], 3)
+        assert actual == expected, "itinerary pages differ"
+
+    email = tables["users"][0]["email"]
+    expected = await UserQueries(postgrest).get_user(email)
+    actual = await UserQueries(postgres).get_user(email)
+    assert actual == expected, "get_user differs"
+
+
+async def lookups(db, tables: dict, requests: int, concurrency: int) -> float:
+    from app.internal.itinerary import ItineraryQueries
+    from app.internal.users import UserQueries
+
+    users, itinerary = UserQueries(db), ItineraryQueries(db)
+
+    async def client(count: int):
+        for _ in range(count):
+            if random.random() < 0.5:
+                email = random.choice(tables["users"])["email"]
+                result = await users.get_user(email)
+            else:
+                trip = random.choice(tables["trips"])
+                result = await itinerary.get_trip_itineraries(str(trip["id"]))
+            assert result["error"] is None, result["error"]
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(requests // concurrency) for _ in range(concurrency)))
+    return time.perf_counter() - start
+
+
+async def compare(args) -> dict:
+    from app.internal.postgres import PostgresClient
+    from app.internal.supadb import SupabaseClient
+
+    await create_schema(args.dsn)
+    dsn = f"{args.dsn}{'&' if '?' in args.dsn else '?'}search_path={SCHEMA}"
+    prepared = PostgresClient(dsn, max_size=args.pool_size)
+    unprepared = PostgresClient(dsn, max_size=args.pool_size, statement_cache_size=0)
+    postgrest = SupabaseClient()
+
+    tables = await seed(prepared, args.users, args.itinerary)
+    for table, rows in tables.items():
+        args.stub_tables[table] = [dict(row) for row in rows]
+    await check_parity(postgrest, prepared, tables)
+
+    timings = {}
+    for name, db in (
+        ("postgrest", postgrest),
+        ("postgres", unprepared),
+        ("postgres, prepared", prepared),
+    ):
+        # The first round warms up the pools and the statement caches.
+        await lookups(db, tables, args.requests // 10, args.concurrency)
+        timings[name] = await lookups(db, tables, args.requests, args.concurrency)
+        await db.aclose()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dsn", default=os.environ.get("DATABASE_URL"))
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--itinerary", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--pool-size", type=int, default=10)
+    parser.add_argument("--port", type=int, default=54324)
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error("--dsn or DATABASE_URL is required")
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    os.environ["SUPABASE_URL"] = f"http://127.0.0.1:{args.port}"
+    os.environ["SUPABASE_KEY"] = STUB_KEY
+    args.stub_tables = {}
+    server = serve_in_thread(create_app(0.0, args.stub_tables), args.port)
+
+    timings = asyncio.run(compare(args))
+    server.should_exit = True
+
+    print(f"{args.requests} lookups, pages of up to {args.itinerary} rows")
+    for name, elapsed in timings.items():
+        print(f"{name + ':':20} {elapsed:.3f}s ({args.requests / elapsed:.0f} req/s)")
+
+
+if __name__ == "__main__":
+    main()
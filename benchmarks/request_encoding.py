@@ -0,0 +1,78 @@
+"""Per-request CPU spent parsing request bodies and encoding list responses.
+
+"before" is the old handler path: decode the body, ``json.loads`` it and
+``model_validate`` the dict; list endpoints returned the postgrest
+``APIResponse`` for ``jsonable_encoder`` and ``JSONResponse`` to encode.
+"after" is ``model_validate_json`` on the raw bytes and an
+``ORJSONResponse`` of the page.
+
+    python -m benchmarks.request_encoding --iterations 5000 --rows 50
+"""
+import argparse
+import json
+import time
+import timeit
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from postgrest.base_request_builder import APIResponse
+
+from app.internal.itinerary import Itinerary
+
+
+def per_request_us(fn, iterations: int) -> float:
+    elapsed = timeit.timeit(fn, number=iterations, timer=time.process_time)
+    return elapsed / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--rows", type=int, default=50)
+    args = parser.parse_args()
+
+    body = json.dumps(
+        {
+            "date": "2024-01-01",
+            "description": "Walk the old town",
+            "location": "Lisbon",
+            "activity": "sightseeing",
+        }
+    ).encode("utf-8")
+    rows = [
+        {
+            "id": i,
+            "trip_id": 1,
+            "date": "2024-01-01",
+            "description": "Walk the old town",
+            "location": "Lisbon",
+            "activity": "sightseeing",
+        }
+        for i in range(args.rows)
+    ]
+    page = {"data": rows, "next_cursor": None}
+    response = APIResponse(data=rows, count=None)
+
+    cases = {
+        "parse": (
+            lambda: Itinerary.model_validate(json.loads(body.decode("utf-8"))),
+            lambda: Itinerary.model_validate_json(body),
+        ),
+        "encode": (
+            lambda: JSONResponse(content=jsonable_encoder(response)).body,
+            lambda: ORJSONResponse(content=page).body,
+        ),
+    }
+
+    print(f"{args.iterations} iterations, {args.rows} rows per page (CPU time)")
+    for name, (before, after) in cases.items():
+        before_us = per_request_us(before, args.iterations)
+        after_us = per_request_us(after, args.iterations)
+        print(
+            f"{name}: before {before_us:.1f} us, after {after_us:.1f} us "
+            f"({before_us / after_us:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Serve app.main:app against local stand-ins for PostgREST and Storj.
+
+PostgREST is expected at ``--postgrest-url`` (see benchmarks.stub_postgrest);
+Storj is replaced in process by benchmarks.stub_storage, whose calls take
+``--storage-latency`` seconds each.
+
+    python -m benchmarks.stub_app --port 8001 --postgrest-url http://127.0.0.1:54330
+"""
+import argparse
+import logging
+import os
+
+import uvicorn
+
+from benchmarks.async_queries import STUB_KEY
+from benchmarks.stub_storage import StubProject
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--postgrest-url", default="http://127.0.0.1:54330")
+    parser.add_argument("--storage-latency", type=float, default=0.0)
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    os.environ["SUPABASE_URL"] = args.postgrest_url
+    os.environ["SUPABASE_KEY"] = STUB_KEY
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+
+    from app.internal.storj import StorjClient
+
+    project = StubProject(args.storage_latency)
+    StorjClient._get_storj_client = staticmethod(lambda: project)
+
+    uvicorn.run(
+        "app.main:app",
+        host="127.0.0.1",
+        port=args.port,
+        log_level="error",
+        access_log=False,
+    )
+
+
+if __name__ == "__main__":
+    main()
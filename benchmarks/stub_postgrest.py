@@ -0,0 +1,151 @@
+"""In-memory stand-in for the PostgREST API used by the benchmarks.
+
+Only the subset of PostgREST that the *Queries classes use is implemented:
+``select``, ``eq.``/``gt.``/``in.`` filters, ``or``/``and`` groups, ``order``,
+``limit``, inserts and updates. Every request sleeps for ``latency`` seconds to
+simulate the network round trip.
+
+It can also run on its own, e.g. for the load test:
+
+    python -m benchmarks.stub_postgrest --port 54330 --latency 0.005
+"""
+import argparse
+import asyncio
+import itertools
+import threading
+import time
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+
+def _value(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def _split(expressions: str) -> list:
+    parts, depth, start = [], 0, 0
+    for index, char in enumerate(expressions):
+        depth += char == "("
+        depth -= char == ")"
+        if char == "," and depth == 0:
+            parts.append(expressions[start:index])
+            start = index + 1
+    parts.append(expressions[start:])
+    return parts
+
+
+def _matches(row: dict, column: str, expression: str) -> bool:
+    if column in ("or", "and"):
+        results = []
+        for part in _split(expression[1:-1]):
+            name, _, rest = part.partition(".")
+            if part.startswith(("or(", "and(")):
+                name, _, rest = part.partition("(")
+                rest = f"({rest}"
+            results.append(_matches(row, name, rest))
+        return any(results) if column == "or" else all(results)
+
+    operator, _, value = expression.partition(".")
+    cell = row.get(column)
+    if operator == "eq":
+        return str(cell) == value
+    if operator == "gt":
+        return _value(cell) > _value(value)
+    if operator == "in":
+        return str(cell) in value.strip("()").split(",")
+    return True
+
+
+def _order(rows: list, order: str) -> list:
+    for column in reversed(order.split(",")):
+        name, _, direction = column.partition(".")
+        rows = sorted(
+            rows, key=lambda row: _value(row.get(name)), reverse=direction == "desc"
+        )
+    return rows
+
+
+def _filter(rows: list, params) -> list:
+    for column, expression in params.multi_items():
+        if column not in ("select", "order", "limit", "offset"):
+            rows = [row for row in rows if _matches(row, column, expression)]
+    return rows
+
+
+def create_app(latency: float = 0.0, tables: dict = None) -> Starlette:
+    tables = tables if tables is not None else {}
+    ids = itertools.count(1)
+
+    async def select(request: Request):
+        await asyncio.sleep(latency)
+        params = request.query_params
+        rows = _filter(tables.get(request.path_params["table"], []), params)
+        if "order" in params:
+            rows = _order(rows, params["order"])
+        if "limit" in params:
+            rows = rows[: int(params["limit"])]
+        if params.get("select", "*") != "*":
+            columns = params["select"].split(",")
+            rows = [{column: row.get(column) for column in columns} for row in rows]
+        return JSONResponse(rows)
+
+    async def insert(request: Request):
+        await asyncio.sleep(latency)
+        payload = await request.json()
+        if isinstance(payload, dict):
+            payload = [payload]
+        created = []
+        for row in payload:
+            row = {"id": next(ids), **row}
+            tables.setdefault(request.path_params["table"], []).append(row)
+            created.append(row)
+        return JSONResponse(created, status_code=201)
+
+    async def update(request: Request):
+        await asyncio.sleep(latency)
+        payload = await request.json()
+        rows = _filter(
+            tables.get(request.path_params["table"], []), request.query_params
+        )
+        for row in rows:
+            row.update(payload)
+        return JSONResponse(rows)
+
+    return Starlette(
+        routes=[
+            Route("/rest/v1/{table}", select, methods=["GET"]),
+            Route("/rest/v1/{table}", insert, methods=["POST"]),
+            Route("/rest/v1/{table}", update, methods=["PATCH"]),
+        ]
+    )
+
+
+def serve_in_thread(app, port: int) -> uvicorn.Server:
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="error")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=54330)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    uvicorn.run(
+        create_app(args.latency), host="127.0.0.1", port=args.port, log_level="error"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""In-memory stand-in for the Storj project used by the benchmarks.
+
+Implements the part of ``uplink_python.project.Project`` that StorjClient
+uses: bucket stats, listing, stat, uploads and downloads. Uplink calls are
+blocking and run in the threadpool, so every call blocks its thread for
+``latency`` seconds, the way a round trip to the satellite would.
+"""
+import threading
+import time
+
+from uplink_python.errors import ObjectNotFoundError
+
+
+class StubObject:
+    def __init__(self, key: str, created: int = 0, size: int = None, prefix=False):
+        self.key = key
+        self.created = created
+        self.size = size
+        self.prefix = prefix
+
+    def get_dict(self) -> dict:
+        return {
+            "key": self.key,
+            "is_prefix": self.prefix,
+            "system": {"created": self.created, "content_length": self.size},
+        }
+
+
+class StubDownload:
+    def __init__(self, project: "StubProject", data: bytes):
+        self.project = project
+        self.data = data
+        self.offset = 0
+
+    def file_size(self) -> int:
+        return len(self.data)
+
+    def read(self, size: int):
+        self.project.wait()
+        chunk = self.data[self.offset : self.offset + size]
+        self.offset += len(chunk)
+        return chunk, len(chunk)
+
+    def close(self):
+        pass
+
+
+class StubUpload:
+    def __init__(self, project: "StubProject", key: str):
+        self.project = project
+        self.key = key
+        self.chunks = []
+
+    def write(self, data: bytes, size: int) -> int:
+        self.project.wait()
+        self.chunks.append(bytes(data[:size]))
+        return size
+
+    def commit(self):
+        self.project.wait()
+        self.project.store(self.key, b"".join(self.chunks))
+
+    def info(self) -> StubObject:
+        return self.project.stat_object(None, self.key)
+
+    def abort(self):
+        self.chunks = []
+
+
+class StubProject:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.objects = {}
+        self._lock = threading.Lock()
+        self._created = 0
+
+    def wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def store(self, key: str, data: bytes):
+        with self._lock:
+            self._created += 1
+            self.objects[key] = (data, self._created)
+
+    def stat_bucket(self, bucket: str):
+        self.wait()
+
+    def stat_object(self, bucket: str, key: str) -> StubObject:
+        self.wait()
+        if key not in self.objects:
+            raise ObjectNotFoundError(key)
+        data, created = self.objects[key]
+        return StubObject(key, created, len(data))
+
+    def list_objects(self, bucket: str, options) -> list:
+        self.wait()
+        listed, prefixes = [], set()
+        for key, (data, created) in list(self.objects.items()):
+            if not key.startswith(options.prefix):
+                continue
+            rest = key[len(options.prefix) :]
+            if "/" in rest and not options.recursive:
+                prefix = f"{options.prefix}{rest.split('/')[0]}/"
+                if prefix not in prefixes:
+                    prefixes.add(prefix)
+                    listed.append(StubObject(prefix, prefix=True))
+            else:
+                listed.append(StubObject(key, created, len(data)))
+        return listed
+
+    def upload_object(self, bucket: str, key: str) -> StubUpload:
+        self.wait()
+        return StubUpload(self, key)
+
+    def download_object(self, bucket: str, key: str) -> StubDownload:
+        self.wait()
+        if key not in self.objects:
+            raise ObjectNotFoundError(key)
+        return StubDownload(self, self.objects[key][0])
+
+    def close(self):
+        pass
@@ -0,0 +1,63 @@
+"""Compare single-row inserts with coalesced inserts under a burst of writes.
+
+Both variants run ``ItineraryQueries.create_itinerary`` concurrently; the
+batched one turns on the data layer's write batcher so concurrent rows share
+multi-row statements.
+
+    python -m benchmarks.write_batching --requests 500 --latency 0.02
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+from benchmarks.async_queries import STUB_KEY
+from benchmarks.stub_postgrest import create_app, serve_in_thread
+
+
+async def burst(requests: int, write_batching: bool) -> float:
+    from app.internal.itinerary import Itinerary, ItineraryQueries
+    from app.internal.supadb import SupabaseClient
+
+    supabase_client = SupabaseClient(write_batching=write_batching)
+    queries = ItineraryQueries(supabase_client)
+    itinerary = Itinerary(
+        date="2024-01-01", description="stub", location="stub", activity="stub"
+    )
+
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(queries.create_itinerary(itinerary, 1) for _ in range(requests))
+    )
+    elapsed = time.perf_counter() - start
+    await supabase_client.aclose()
+    assert all(result["error"] is None for result in results)
+    assert len({result["data"]["id"] for result in results}) == requests
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--port", type=int, default=54323)
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    os.environ["SUPABASE_URL"] = f"http://127.0.0.1:{args.port}"
+    os.environ["SUPABASE_KEY"] = STUB_KEY
+    server = serve_in_thread(create_app(args.latency, {"itinerary": []}), args.port)
+
+    single = asyncio.run(burst(args.requests, write_batching=False))
+    batched = asyncio.run(burst(args.requests, write_batching=True))
+    server.should_exit = True
+
+    print(f"{args.requests} inserts, {args.latency * 1000:.0f} ms backend latency")
+    print(f"single-row: {single:.3f}s ({args.requests / single:.0f} rows/s)")
+    print(f"batched:    {batched:.3f}s ({args.requests / batched:.0f} rows/s)")
+    print(f"speedup:    {single / batched:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+import os
+
+# Read by app.dependencies when it is imported.
+os.environ.setdefault("SECRET_KEY", "test-secret")
@@ -0,0 +1,42 @@
+from fastapi import BackgroundTasks, FastAPI
+from fastapi.testclient import TestClient
+
+from app.internal.admission import AdmissionController, AdmissionMiddleware
+
+
+def test_background_tasks_do_not_hold_the_slot():
+    controller = AdmissionController()
+    limiter = controller.limiters["auth"]
+    seen = []
+
+    app = FastAPI()
+    app.add_middleware(AdmissionMiddleware, controller=controller)
+
+    @app.post("/api/v1/token")
+    async def token(background_tasks: BackgroundTasks):
+        seen.append(limiter.in_flight)
+        background_tasks.add_task(lambda: seen.append(limiter.in_flight))
+        return {}
+
+    response = TestClient(app).post("/api/v1/token")
+
+    assert response.status_code == 200
+    assert seen == [1, 0]
+    assert limiter.in_flight == 0
+
+
+def test_slot_is_released_when_the_app_fails():
+    controller = AdmissionController()
+    limiter = controller.limiters["auth"]
+
+    app = FastAPI()
+    app.add_middleware(AdmissionMiddleware, controller=controller)
+
+    @app.post("/api/v1/token")
+    async def token():
+        raise RuntimeError("boom")
+
+    response = TestClient(app, raise_server_exceptions=False).post("/api/v1/token")
+
+    assert response.status_code == 500
+    assert limiter.in_flight == 0
@@ -0,0 +1,98 @@
+import asyncio
+import mmap
+import os
+import threading
+
+from app.internal.blob_cache import BlobCache
+
+
+def test_memory_hit_and_miss(tmp_path):
+    async def main(cache):
+        await cache.set("a", b"aaa")
+        assert await cache.get("a") == b"aaa"
+        assert await cache.get("b") is None
+
+    cache = BlobCache(memory_bytes=10, disk_bytes=100, directory=str(tmp_path))
+    try:
+        asyncio.run(main(cache))
+        assert cache.stats()["memory_hits"] == 1
+        assert cache.stats()["misses"] == 1
+    finally:
+        cache.close()
+
+
+def test_evicted_entries_are_mapped_from_disk(tmp_path):
+    async def main(cache):
+        await cache.set("a", b"a" * 8)
+        await cache.set("b", b"b" * 8)
+        blob = await cache.get("a")
+        assert isinstance(blob, mmap.mmap)
+        assert blob[:] == b"a" * 8
+        blob.close()
+
+    cache = BlobCache(memory_bytes=10, disk_bytes=100, directory=str(tmp_path))
+    try:
+        asyncio.run(main(cache))
+        assert cache.stats()["disk_hits"] == 1
+        assert cache.stats()["disk_bytes"] == 8
+    finally:
+        cache.close()
+
+
+def test_disk_tier_is_bounded(tmp_path):
+    async def main(cache):
+        for key in "abcd":
+            await cache.set(key, key.encode() * 8)
+        assert await cache.get("a") is None
+
+    cache = BlobCache(memory_bytes=5, disk_bytes=20, directory=str(tmp_path))
+    try:
+        asyncio.run(main(cache))
+        assert cache.stats()["disk_bytes"] <= 20
+        assert len(os.listdir(cache.directory)) == 2
+    finally:
+        cache.close()
+
+
+def test_invalidated_while_spilling_is_not_kept(tmp_path):
+    async def main(cache):
+        spill = asyncio.ensure_future(cache.set("a", b"a" * 8))
+        # Let the write start on the thread pool.
+        await asyncio.sleep(0)
+        cache.invalidate_prefix("a")
+        await spill
+        assert await cache.get("a") is None
+
+    cache = BlobCache(memory_bytes=5, disk_bytes=100, directory=str(tmp_path))
+    try:
+        asyncio.run(main(cache))
+        assert cache.stats()["entries"] == 0
+        assert os.listdir(cache.directory) == []
+    finally:
+        cache.close()
+
+
+def test_disk_io_runs_off_the_event_loop(tmp_path, monkeypatch):
+    loop_thread = []
+
+    async def main(cache):
+        loop_thread.append(threading.get_ident())
+        await cache.set("a", b"a" * 8)
+        (await cache.get("a")).close()
+
+    io_threads = []
+    real_open = open
+
+    def tracking_open(*args, **kwargs):
+        io_threads.append(threading.get_ident())
+        return real_open(*args, **kwargs)
+
+    monkeypatch.setattr("builtins.open", tracking_open)
+    cache = BlobCache(memory_bytes=5, disk_bytes=100, directory=str(tmp_path))
+    try:
+        asyncio.run(main(cache))
+    finally:
+        cache.close()
+
+    assert len(io_threads) == 2
+    assert loop_thread[0] not in io_threads
@@ -0,0 +1,35 @@
+import time
+
+from fastapi import BackgroundTasks, FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from app.internal.metrics import MetricsMiddleware
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_background_tasks_are_not_part_of_the_request():
+    in_flight = []
+
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.post("/background")
+    async def background(background_tasks: BackgroundTasks):
+        def task():
+            in_flight.append(sample("http_requests_in_flight", method="POST"))
+            time.sleep(0.2)
+
+        background_tasks.add_task(task)
+        return {}
+
+    response = TestClient(app).post("/background")
+
+    assert response.status_code == 200
+    assert in_flight == [0.0]
+    labels = {"method": "POST", "route": "/background", "status": "200"}
+    assert sample("http_request_duration_seconds_count", **labels) == 1
+    assert sample("http_request_duration_seconds_sum", **labels) < 0.2
@@ -0,0 +1,145 @@
+import pytest
+from fastapi.testclient import TestClient
+from postgrest import AsyncPostgrestClient
+
+from app.dependencies import create_jwt_token, get_database, get_response_cache
+from app.internal.pagination import (MAX_PAGE_LIMIT, Page, decode_cursor,
+                                     encode_cursor)
+from app.internal.response_cache import ResponseCache
+from app.main import app
+
+COLUMNS = ("a", "b", "c", "title")
+
+
+def params_of(page: Page) -> dict:
+    query = AsyncPostgrestClient("http://postgrest").table("t").select("*")
+    return dict(page.apply(query).params)
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(["2024-01-01", 7])
+
+    assert decode_cursor(cursor, 2) == ["2024-01-01", 7]
+    assert "=" not in cursor
+
+
+def test_first_page_has_no_range():
+    assert params_of(Page(COLUMNS, ("a",), limit=10)) == {
+        "select": "*",
+        "order": "a",
+        "limit": "11",
+    }
+
+
+def test_one_key_cursor():
+    params = params_of(Page(COLUMNS, ("a",), limit=10, after=encode_cursor([5])))
+
+    assert params["a"] == "gt.5"
+    assert params["order"] == "a"
+
+
+def test_two_key_cursor():
+    page = Page(COLUMNS, ("a", "b"), after=encode_cursor(["2024-01-01", 5]))
+
+    assert params_of(page)["or"] == ("(a.gt.2024-01-01,and(a.eq.2024-01-01,b.gt.5))")
+
+
+def test_three_key_cursor():
+    page = Page(COLUMNS, ("a", "b", "c"), after=encode_cursor([1, 2, 3]))
+
+    params = params_of(page)
+
+    assert params["or"] == "(a.gt.1,and(a.eq.1,or(b.gt.2,and(b.eq.2,c.gt.3))))"
+    assert params["order"] == "a,b,c"
+
+
+@pytest.mark.parametrize("value", ["Paris, FR", "Rome (IT)", "12:30"])
+def test_cursor_values_with_filter_syntax_are_quoted(value):
+    page = Page(COLUMNS, ("title", "a"), after=encode_cursor([value, 1]))
+
+    assert params_of(page)["or"] == (
+        f'(title.gt."{value}",and(title.eq."{value}",a.gt.1))'
+    )
+
+
+def test_dots_need_no_quoting():
+    # Everything after the operator is the value.
+    page = Page(COLUMNS, ("title", "a"), after=encode_cursor(["St. Ives", 1]))
+
+    assert params_of(page)["or"] == "(title.gt.St. Ives,and(title.eq.St. Ives,a.gt.1))"
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "!!!",
+        "bm90IGpzb24",  # "not json"
+        encode_cursor({"a": 1}),
+        encode_cursor([1]),
+        encode_cursor([1, 2, 3]),
+        encode_cursor([{"a": 1}, 2]),
+        encode_cursor(['x",a.gt.0,title.eq."y', 1]),
+    ],
+)
+def test_tampered_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        Page(COLUMNS, ("title", "a"), after=cursor)
+
+
+@pytest.mark.parametrize(
+    "limit, expected", [(-5, 1), (0, 1), (1, 1), (20, 20), (10**6, MAX_PAGE_LIMIT)]
+)
+def test_limit_is_clamped(limit, expected):
+    page = Page(COLUMNS, ("a",), limit=limit)
+
+    assert page.limit == expected
+    assert params_of(page)["limit"] == str(expected + 1)
+
+
+def test_fields_always_include_the_sort_keys():
+    page = Page(COLUMNS, ("a", "b"), fields="title, b")
+
+    assert page.columns == ["title", "b", "a"]
+
+
+def test_unknown_fields_are_rejected():
+    with pytest.raises(ValueError, match="Unknown fields: password"):
+        Page(COLUMNS, ("a",), fields="title,password")
+
+
+def test_result_has_a_cursor_only_when_there_is_more():
+    page = Page(COLUMNS, ("a", "b"), limit=2)
+    rows = [{"a": 1, "b": 1}, {"a": 1, "b": 2}, {"a": 2, "b": 3}]
+
+    assert page.result(rows) == {
+        "data": rows[:2],
+        "next_cursor": encode_cursor([1, 2]),
+    }
+    assert page.result(rows[:2]) == {"data": rows[:2], "next_cursor": None}
+
+
+class UnusedDatabase:
+    async def select(self, table, columns, filters, page=None, limit=None):
+        raise AssertionError("invalid pages must not reach the database")
+
+
+def teardown_function():
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.parametrize(
+    "query",
+    ["after=!!!", f"after={encode_cursor([1])}", "fields=password"],
+)
+def test_invalid_page_is_a_400(query):
+    token = create_jwt_token({"sub": "a@example.com", "user_id": 1, "username": "a"})
+    app.dependency_overrides[get_database] = UnusedDatabase
+    app.dependency_overrides[get_response_cache] = ResponseCache
+
+    # No lifespan: the test replaces the state the route depends on.
+    response = TestClient(app).get(
+        f"/api/v1/protected/trips?{query}",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+
+    assert response.status_code == 400
@@ -0,0 +1,133 @@
+import asyncio
+import hashlib
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.dependencies import (get_database, get_password_hasher,
+                              get_storj_client)
+from app.internal.passwords import (PasswordHasher, PasswordHasherBusy,
+                                    hash_password, verify_password)
+from app.main import app
+
+# Cheap parameters; the defaults make every hash take tens of milliseconds.
+N, R, P = 2**4, 8, 1
+
+
+def legacy_hash(password: str) -> str:
+    return hashlib.sha256(password.encode("utf-8")).hexdigest()
+
+
+def test_hash_verifies_only_its_password():
+    stored = hash_password("secret", N, R, P)
+
+    assert stored.startswith(f"scrypt${N}${R}${P}$")
+    assert verify_password("secret", stored)
+    assert not verify_password("Secret", stored)
+    # Every hash gets its own salt.
+    assert hash_password("secret", N, R, P) != stored
+
+
+def test_legacy_hash_verifies():
+    assert verify_password("secret", legacy_hash("secret"))
+    assert not verify_password("other", legacy_hash("secret"))
+
+
+@pytest.mark.parametrize(
+    "stored",
+    [
+        "scrypt$",
+        "scrypt$16$8$1$c2FsdA",
+        "scrypt$sixteen$8$1$c2FsdA$a2V5",
+        "scrypt$16$8$1$!!!$a2V5",
+        "scrypt$15$8$1$c2FsdA$a2V5",
+        "scrypt$16$8$1$c2FsdA$a2V5$extra",
+    ],
+)
+def test_malformed_hash_does_not_verify(stored):
+    assert verify_password("secret", stored) is False
+
+
+def test_truncated_hash_does_not_verify():
+    stored = hash_password("secret", N, R, P)
+
+    assert verify_password("secret", stored[:-4]) is False
+
+
+def test_needs_rehash():
+    hasher = PasswordHasher(workers=1, n=N, r=R, p=P)
+    try:
+        assert not hasher.needs_rehash(hash_password("secret", N, R, P))
+        assert hasher.needs_rehash(legacy_hash("secret"))
+        assert hasher.needs_rehash(hash_password("secret", N * 2, R, P))
+        assert hasher.needs_rehash(hash_password("secret", N, R * 2, P))
+        assert hasher.needs_rehash(hash_password("secret", N, R, P + 1))
+    finally:
+        hasher.close()
+
+
+def test_hasher_is_busy_once_the_queue_is_full():
+    async def main():
+        hasher = PasswordHasher(workers=1, queue_size=1, n=N, r=R, p=P)
+        try:
+            first = asyncio.ensure_future(hasher.hash("first"))
+            # Let it take the only slot.
+            await asyncio.sleep(0)
+            with pytest.raises(PasswordHasherBusy):
+                await hasher.hash("second")
+            assert verify_password("first", await first)
+            # The slot is free again.
+            assert verify_password("third", await hasher.hash("third"))
+        finally:
+            hasher.close()
+
+    asyncio.run(main())
+
+
+class UsersDatabase:
+    def __init__(self, users):
+        self.users = users
+
+    async def select(self, table, columns, filters, page=None, limit=None):
+        return [dict(user) for user in self.users if user["email"] == filters["email"]]
+
+    async def update(self, table, values, filters):
+        rows = [user for user in self.users if user["id"] == filters["id"]]
+        for user in rows:
+            user.update(values)
+        return rows
+
+
+class NoProfileImages:
+    async def get_user_profile_image(self, user_id):
+        return None
+
+
+def teardown_function():
+    app.dependency_overrides.clear()
+
+
+def test_login_with_legacy_hash_upgrades_it():
+    user = {
+        "id": 1,
+        "username": "a",
+        "email": "a@example.com",
+        "password": legacy_hash("secret"),
+    }
+    hasher = PasswordHasher(workers=1, n=N, r=R, p=P)
+    app.dependency_overrides[get_database] = lambda: UsersDatabase([user])
+    app.dependency_overrides[get_storj_client] = NoProfileImages
+    app.dependency_overrides[get_password_hasher] = lambda: hasher
+
+    try:
+        # No lifespan: the test replaces the state the route depends on.
+        response = TestClient(app).post(
+            "/api/v1/token", json={"email": "a@example.com", "password": "secret"}
+        )
+    finally:
+        hasher.close()
+
+    assert response.status_code == 200
+    # The upgrade runs as a background task once the response is sent.
+    assert user["password"].startswith(f"scrypt${N}${R}${P}$")
+    assert verify_password("secret", user["password"])
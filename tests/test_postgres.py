@@ -0,0 +1,141 @@
+"""Runs against the Postgres at DATABASE_URL; skipped when it is not set.
+
+The tables are created in a ``travel_test`` schema, which is dropped first.
+"""
+import asyncio
+import os
+
+import pytest
+
+from app.internal.pagination import Page
+from app.internal.postgres import PostgresClient, asyncpg
+from app.internal.trips import TRIP_COLUMNS, TRIP_PAGE_KEYS, TripQueries
+from app.internal.users import UserQueries
+
+DATABASE_URL = os.environ.get("DATABASE_URL")
+SCHEMA = "travel_test"
+TABLES = """
+CREATE TABLE users (
+    id bigserial PRIMARY KEY,
+    username text NOT NULL,
+    email text NOT NULL UNIQUE,
+    password text NOT NULL
+);
+CREATE TABLE trips (
+    id bigserial PRIMARY KEY,
+    user_id bigint NOT NULL REFERENCES users,
+    title text NOT NULL,
+    start_date date NOT NULL,
+    end_date date NOT NULL
+);
+"""
+
+pytestmark = pytest.mark.skipif(
+    not DATABASE_URL or asyncpg is None, reason="needs DATABASE_URL and asyncpg"
+)
+
+
+async def create_schema():
+    connection = await asyncpg.connect(DATABASE_URL)
+    try:
+        await connection.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await connection.execute(f"CREATE SCHEMA {SCHEMA}")
+        await connection.execute(f"SET search_path TO {SCHEMA}")
+        await connection.execute(TABLES)
+    finally:
+        await connection.close()
+
+
+@pytest.fixture(params=[100, 0], ids=["prepared", "unprepared"])
+def run(request):
+    """Runs a test coroutine with a fresh schema and a client on it."""
+    separator = "&" if "?" in DATABASE_URL else "?"
+    dsn = f"{DATABASE_URL}{separator}search_path={SCHEMA}"
+
+    def run(test):
+        async def main():
+            await create_schema()
+            db = PostgresClient(dsn, statement_cache_size=request.param)
+            try:
+                await test(db)
+            finally:
+                await db.aclose()
+
+        asyncio.run(main())
+
+    return run
+
+
+async def add_user(db, name: str) -> dict:
+    row = {"username": name, "email": f"{name}@example.com", "password": "hash"}
+    return await db.insert_row("users", row)
+
+
+def test_insert_select_and_update(run):
+    async def test(db):
+        rows = await db.insert(
+            "users",
+            [
+                {"username": "a", "email": "a@example.com", "password": "x"},
+                {"username": "b", "email": "b@example.com", "password": "y"},
+            ],
+        )
+        assert [row["username"] for row in rows] == ["a", "b"]
+
+        # Path values arrive as strings and are converted to the column type.
+        user_id = str(rows[1]["id"])
+        assert await db.select("users", ["username"], {"id": user_id}) == [
+            {"username": "b"}
+        ]
+
+        updated = await db.update("users", {"password": "z"}, {"id": user_id})
+        assert updated[0]["password"] == "z"
+        assert await db.select("users", ["password"], {"id": user_id}) == [
+            {"password": "z"}
+        ]
+
+    run(test)
+
+
+def test_keyset_pages_cover_every_row_once(run):
+    async def test(db):
+        user = await add_user(db, "traveller")
+        trips = [
+            {
+                "user_id": user["id"],
+                "title": f"Trip {index}",
+                # Several trips share a start date, so ties are broken by id.
+                "start_date": f"2024-01-0{index % 3 + 1}",
+                "end_date": "2024-02-01",
+            }
+            for index in range(7)
+        ]
+        inserted = await db.insert("trips", trips)
+        expected = sorted(inserted, key=lambda row: (row["start_date"], row["id"]))
+
+        queries, seen, cursor = TripQueries(db), [], None
+        while True:
+            page = Page(TRIP_COLUMNS, TRIP_PAGE_KEYS, limit=3, after=cursor)
+            result = await queries.get_user_trips(str(user["id"]), page)
+            assert result["error"] is None
+            seen.extend(result["data"]["data"])
+            cursor = result["data"]["next_cursor"]
+            if cursor is None:
+                break
+
+        assert [row["id"] for row in seen] == [row["id"] for row in expected]
+
+    run(test)
+
+
+def test_get_user(run):
+    async def test(db):
+        user = await add_user(db, "someone")
+
+        result = await UserQueries(db).get_user("someone@example.com")
+
+        assert result == {"data": [user], "error": None}
+        missing = await UserQueries(db).get_user("nobody@example.com")
+        assert missing == {"data": [], "error": None}
+
+    run(test)
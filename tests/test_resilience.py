@@ -0,0 +1,78 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.dependencies import create_jwt_token, get_database, get_response_cache
+from app.internal.resilience import CircuitBreaker, guarded_call
+from app.internal.response_cache import ResponseCache
+from app.main import app
+
+
+class OpenCircuitDatabase:
+    """A database whose circuit breaker has just opened."""
+
+    def __init__(self):
+        self.breaker = CircuitBreaker("supabase", failure_threshold=1)
+        self.breaker.record_failure()
+
+    async def select(self, table, columns, filters, page=None, limit=None):
+        self.breaker.allow()
+
+
+class SlowDatabase:
+    """A database that never answers within the call timeout."""
+
+    def __init__(self):
+        self.breaker = CircuitBreaker("supabase")
+
+    async def select(self, table, columns, filters, page=None, limit=None):
+        return await guarded_call(self.breaker, lambda: asyncio.sleep(1), 0.01, ())
+
+
+def client_for(database) -> TestClient:
+    # No lifespan: the test replaces the state the routes depend on.
+    app.dependency_overrides[get_database] = lambda: database
+    app.dependency_overrides[get_response_cache] = ResponseCache
+    return TestClient(app)
+
+
+def teardown_function():
+    app.dependency_overrides.clear()
+
+
+def test_open_circuit_is_a_503_with_retry_after():
+    token = create_jwt_token({"sub": "a@example.com", "user_id": 1, "username": "a"})
+
+    response = client_for(OpenCircuitDatabase()).get(
+        "/api/v1/protected/trips", headers={"Authorization": f"Bearer {token}"}
+    )
+
+    assert response.status_code == 503
+    assert response.json() == {"detail": "supabase is unavailable, failing fast"}
+    assert 1 <= int(response.headers["Retry-After"]) <= 10
+
+
+def test_open_circuit_while_resolving_the_identity_is_a_503():
+    # Without user_id/username claims the identity is looked up in the database.
+    token = create_jwt_token({"sub": "b@example.com"})
+
+    response = client_for(OpenCircuitDatabase()).get(
+        "/api/v1/protected/trips", headers={"Authorization": f"Bearer {token}"}
+    )
+
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+
+
+def test_timeout_is_a_503_with_retry_after():
+    token = create_jwt_token({"sub": "c@example.com", "user_id": 1, "username": "c"})
+    database = SlowDatabase()
+
+    response = client_for(database).get(
+        "/api/v1/protected/trips", headers={"Authorization": f"Bearer {token}"}
+    )
+
+    assert response.status_code == 503
+    assert response.json() == {"detail": "supabase did not answer in time"}
+    assert "Retry-After" in response.headers
+    assert database.breaker.counters["failures"] > 0
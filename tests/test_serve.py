@@ -0,0 +1,59 @@
+import pytest
+
+from app import serve
+
+
+@pytest.fixture
+def cgroup(tmp_path, monkeypatch):
+    """Points the cgroup files at ``tmp_path``; none of them exist at first."""
+    for name in ("CGROUP_V2_CPU_MAX", "CGROUP_V1_CPU_QUOTA", "CGROUP_V1_CPU_PERIOD"):
+        monkeypatch.setattr(serve, name, str(tmp_path / name))
+    monkeypatch.setattr(serve.os, "sched_getaffinity", lambda pid: set(range(8)))
+
+    def write(name: str, content: str):
+        (tmp_path / name).write_text(content)
+
+    return write
+
+
+def test_no_quota_uses_the_affinity(cgroup):
+    assert serve.cgroup_cpu_quota() is None
+    assert serve.available_cpus() == 8
+
+
+def test_unlimited_v2_quota(cgroup):
+    cgroup("CGROUP_V2_CPU_MAX", "max 100000\n")
+
+    assert serve.cgroup_cpu_quota() is None
+    assert serve.available_cpus() == 8
+
+
+@pytest.mark.parametrize(
+    "cpu_max, cpus",
+    [("200000 100000\n", 2), ("150000 100000\n", 2), ("10000 100000\n", 1)],
+)
+def test_v2_quota_caps_the_cpus(cgroup, cpu_max, cpus):
+    cgroup("CGROUP_V2_CPU_MAX", cpu_max)
+
+    assert serve.available_cpus() == cpus
+
+
+def test_v1_quota_caps_the_cpus(cgroup):
+    cgroup("CGROUP_V1_CPU_QUOTA", "300000\n")
+    cgroup("CGROUP_V1_CPU_PERIOD", "100000\n")
+
+    assert serve.cgroup_cpu_quota() == 3
+    assert serve.available_cpus() == 3
+
+
+def test_unlimited_v1_quota(cgroup):
+    cgroup("CGROUP_V1_CPU_QUOTA", "-1\n")
+    cgroup("CGROUP_V1_CPU_PERIOD", "100000\n")
+
+    assert serve.available_cpus() == 8
+
+
+def test_quota_above_the_affinity_does_not_raise_it(cgroup):
+    cgroup("CGROUP_V2_CPU_MAX", "1600000 100000\n")
+
+    assert serve.available_cpus() == 8
@@ -0,0 +1,49 @@
+import asyncio
+
+import httpx
+import pytest
+from postgrest.exceptions import APIError
+
+from app.internal.resilience import (BackendUnavailable, CircuitBreaker,
+                                     guarded_call)
+from app.internal.supadb import (SUPABASE_TRANSIENT_ERRORS,
+                                 PooledPostgrestClient)
+
+
+def postgrest_answering(status_code: int) -> PooledPostgrestClient:
+    postgrest = PooledPostgrestClient("http://postgrest", limits=httpx.Limits())
+    postgrest.session._transport = httpx.MockTransport(
+        lambda request: httpx.Response(
+            status_code, json={"code": "XX000", "message": "failed"}
+        )
+    )
+    return postgrest
+
+
+def read_users(postgrest: PooledPostgrestClient, breaker: CircuitBreaker):
+    return guarded_call(
+        breaker,
+        postgrest.table("users").select("id").execute,
+        1.0,
+        SUPABASE_TRANSIENT_ERRORS,
+        idempotent=True,
+        retries=1,
+    )
+
+
+def test_server_error_is_retried_and_counts_against_the_breaker():
+    breaker = CircuitBreaker("supabase")
+
+    with pytest.raises(BackendUnavailable):
+        asyncio.run(read_users(postgrest_answering(503), breaker))
+
+    assert breaker.counters["failures"] == 2
+
+
+def test_client_error_is_an_answer():
+    breaker = CircuitBreaker("supabase")
+
+    with pytest.raises(APIError):
+        asyncio.run(read_users(postgrest_answering(400), breaker))
+
+    assert breaker.counters["failures"] == 0
@@ -0,0 +1,113 @@
+import asyncio
+import contextvars
+
+from postgrest.exceptions import APIError
+
+from app.internal.write_batcher import IncompleteInsert, WriteBatcher
+
+request_id: "contextvars.ContextVar[str]" = contextvars.ContextVar(
+    "request_id", default=""
+)
+
+
+class Insert:
+    def __init__(self, table, rows):
+        self.table = table
+        self.rows = rows
+
+
+class Table:
+    def __init__(self, name):
+        self.name = name
+
+    def insert(self, rows):
+        return Insert(self.name, rows)
+
+
+class FakePostgrest:
+    """Stores rows unless one of them is rejected, like one INSERT would."""
+
+    def __init__(self, returned=None):
+        self.returned = returned
+        self.statements = []
+        self.contexts = []
+
+    def table(self, name):
+        return Table(name)
+
+    async def execute(self, query):
+        self.statements.append([row["name"] for row in query.rows])
+        self.contexts.append(request_id.get())
+        if any(row["name"] == "bad" for row in query.rows):
+            raise APIError({"message": "rejected", "code": "23514"})
+        rows = [{"id": index, **row} for index, row in enumerate(query.rows)]
+        return type("Response", (), {"data": rows[: self.returned]})
+
+
+def insert_all(batcher, names):
+    async def insert(name):
+        request_id.set(name)
+        return await batcher.insert("trips", {"name": name})
+
+    async def main():
+        try:
+            return await asyncio.gather(
+                *(insert(name) for name in names), return_exceptions=True
+            )
+        finally:
+            await batcher.aclose()
+
+    return asyncio.run(main())
+
+
+def test_rows_share_one_statement():
+    postgrest = FakePostgrest()
+    batcher = WriteBatcher(postgrest, postgrest.execute, max_delay=0.01)
+
+    results = insert_all(batcher, ["a", "b", "c"])
+
+    assert [row["name"] for row in results] == ["a", "b", "c"]
+    assert postgrest.statements == [["a", "b", "c"]]
+    # The statement does not run in the context of any one request.
+    assert postgrest.contexts == [""]
+
+
+def test_rejected_batch_is_retried_row_by_row():
+    postgrest = FakePostgrest()
+    batcher = WriteBatcher(postgrest, postgrest.execute, max_delay=0.01)
+
+    ok, bad, other = insert_all(batcher, ["ok", "bad", "other"])
+
+    assert ok["name"] == "ok" and other["name"] == "other"
+    assert isinstance(bad, APIError)
+    assert postgrest.statements == [["ok", "bad", "other"], ["ok"], ["bad"], ["other"]]
+
+
+def test_rows_missing_from_the_response_fail():
+    postgrest = FakePostgrest(returned=1)
+    batcher = WriteBatcher(postgrest, postgrest.execute, max_delay=0.01)
+
+    first, second = insert_all(batcher, ["a", "b"])
+
+    assert first["name"] == "a"
+    assert isinstance(second, IncompleteInsert)
+    assert "returned 1 of 2 rows" in str(second)
+
+
+def test_full_batch_is_sent_without_waiting():
+    postgrest = FakePostgrest()
+    batcher = WriteBatcher(postgrest, postgrest.execute, max_delay=60, max_size=2)
+
+    async def main():
+        try:
+            return await asyncio.wait_for(
+                asyncio.gather(
+                    batcher.insert("trips", {"name": "a"}),
+                    batcher.insert("trips", {"name": "b"}),
+                ),
+                1,
+            )
+        finally:
+            await batcher.aclose()
+
+    assert [row["name"] for row in asyncio.run(main())] == ["a", "b"]